@@ -0,0 +1,102 @@
+import time
+
+class BarCloseScheduler:
+    """
+    Agenda o loop do robô pelo fechamento das velas em vez de intervalos fixos.
+
+    wait_for_bar_close() dorme até 'offset' segundos depois do próximo fechamento
+    de vela do timeframe e, enquanto espera, chama on_poll() a cada 'poll_interval'
+    segundos (por exemplo, para detectar posições fechadas). Se a vela que fechou
+    ainda não chegou ao terminal (bar_pending), wait_for_new_bar() espera pouco e o
+    loop a procura de novo, em vez de pular para o fechamento seguinte.
+
+    O relógio e a função de espera podem ser injetados, o que permite testar e
+    rodar o robô em tempo simulado.
+    """
+
+    def __init__(self, bar_seconds, offset=2.0, poll_interval=30.0, time_offset=0.0,
+                 clock=time.time, sleep=time.sleep):
+        self.bar_seconds = bar_seconds
+        self.offset = offset
+        self.poll_interval = poll_interval
+        # Diferença entre o horário do servidor (usado nas velas) e o relógio local
+        self.time_offset = time_offset
+        self.clock = clock
+        self.sleep = sleep
+        self.last_close = None # Fechamento de vela do último despertar
+        self.wakeups = 0
+        self.polls = 0
+        self.retries = 0
+        self.pending_retries = 0 # Tentativas seguidas pela mesma vela pendente
+
+    def now(self):
+        """Horário atual no fuso do servidor, em segundos desde a época."""
+        return self.clock() + self.time_offset
+
+    def next_bar_close(self, now=None):
+        """Horário (segundos desde a época) do fechamento da vela em formação."""
+        now = self.now() if now is None else now
+        return (now // self.bar_seconds + 1) * self.bar_seconds
+
+    def seconds_until_next_run(self, now=None):
+        """Quanto falta para o próximo despertar (fechamento da vela + offset)."""
+        now = self.now() if now is None else now
+        target = self.next_bar_close(now - self.offset) + self.offset
+        return max(0.0, target - now)
+
+    def wait_for_bar_close(self, on_poll=None):
+        """
+        Espera até logo depois do próximo fechamento de vela, chamando on_poll()
+        no intervalo. Retorna o horário do fechamento da vela que acabou de fechar.
+        """
+        target = self.next_bar_close(self.now() - self.offset) + self.offset
+        while True:
+            remaining = target - self.now()
+            if remaining <= 0:
+                break
+            if on_poll is None or remaining <= self.poll_interval:
+                self.sleep(remaining)
+                continue
+            self.sleep(self.poll_interval)
+            self.polls += 1
+            on_poll()
+        self.wakeups += 1
+        self.pending_retries = 0
+        self.last_close = target - self.offset
+        return self.last_close
+
+    def bar_pending(self, last_bar_time, bar_seconds=None):
+        """
+        True se a vela que fechou no último despertar ainda não chegou: a última vela
+        fechada recebida ('last_bar_time' = abertura, segundos desde a época) é anterior
+        a ela. O MT5 só dá a vela como fechada quando chega o primeiro tick da seguinte,
+        o que atrasa em sessões paradas e na reabertura diária. 'bar_seconds' é a
+        duração das velas do ativo, se for maior que a do agendador (vários timeframes).
+        """
+        if self.last_close is None:
+            return False
+        bar_seconds = self.bar_seconds if bar_seconds is None else bar_seconds
+        return last_bar_time + bar_seconds < self.last_close // bar_seconds * bar_seconds
+
+    def wait_for_new_bar(self, on_poll=None):
+        """
+        Espera antes de procurar de novo a vela pendente e chama on_poll() em seguida.
+        A primeira espera é de 'poll_interval' segundos e dobra a cada tentativa, sem
+        passar do próximo despertar: no fim de semana o robô não fica consultando o
+        terminal a cada poucos segundos até a reabertura. Se a espera chega ao próximo
+        despertar, retorna o horário da vela que fechou nele (como wait_for_bar_close);
+        senão, None.
+        """
+        close = self.next_bar_close(self.now() - self.offset)
+        remaining = close + self.offset - self.now()
+        delay = self.poll_interval * 2 ** min(self.pending_retries, 20)
+        self.sleep(min(delay, remaining))
+        self.retries += 1
+        self.pending_retries += 1
+        closed_at = None
+        if delay >= remaining:
+            self.wakeups += 1
+            self.last_close = closed_at = close
+        if on_poll is not None:
+            on_poll()
+        return closed_at
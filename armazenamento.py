@@ -0,0 +1,165 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from politica_dtypes import apply_policy
+
+# --- Formatos Suportados ---
+# O formato é escolhido pela extensão do arquivo. Parquet é o padrão do pipeline;
+# CSV continua disponível para importação/exportação.
+PARQUET, FEATHER, CSV = ".parquet", ".feather", ".csv"
+DEFAULT_FORMAT = PARQUET
+
+# Colunas OHLC guardadas em arrays .npy para leitura com memory-map
+OHLC_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'tick_volume']
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in (PARQUET, FEATHER, CSV):
+        raise ValueError(f"Formato de arquivo não suportado: '{path}'")
+    return ext
+
+def with_format(path, fmt=DEFAULT_FORMAT):
+    """Troca a extensão de um caminho (ex: 'dados.csv' -> 'dados.parquet')."""
+    return os.path.splitext(path)[0] + fmt
+
+def exists(path):
+    """Verifica se a tabela existe no formato pedido ou como CSV para importação."""
+    return os.path.exists(path) or os.path.exists(with_format(path, CSV))
+
+def _read(path, columns=None):
+    fmt = _format(path)
+    if fmt == PARQUET:
+        return pd.read_parquet(path, columns=columns)
+    if fmt == FEATHER:
+        return pd.read_feather(path, columns=columns)
+    header = pd.read_csv(path, nrows=0).columns
+    parse_dates = ['time'] if 'time' in header and (columns is None or 'time' in columns) else None
+    return pd.read_csv(path, usecols=columns, parse_dates=parse_dates)
+
+def import_csv(path):
+    """
+    Importa o CSV com o mesmo nome da tabela binária 'path' (ex: xauusd_h1_data.csv
+    para xauusd_h1_data.parquet) quando a tabela ainda não existe ou quando o CSV é
+    mais novo que ela (um CSV substituído não é ignorado). Retorna True se importou.
+    """
+    csv_path = with_format(path, CSV)
+    if os.path.splitext(path)[1].lower() not in (PARQUET, FEATHER) or not os.path.exists(csv_path):
+        return False
+    if os.path.exists(path):
+        if os.path.getmtime(csv_path) <= os.path.getmtime(path):
+            return False
+        print(f"'{csv_path}' é mais novo que '{path}': importando o CSV de novo.")
+    save_table(_read(csv_path), path)
+    return True
+
+def load_table(path, columns=None, policy=True):
+    """
+    Lê uma tabela carregando apenas as colunas pedidas, já nos tipos enxutos da
+    política de tipos (politica_dtypes.SCHEMA). A conversão perde precisão: quem
+    lê para regravar (append, exportação, partições) usa policy=False, que mantém
+    os tipos gravados.
+
+    Se houver um CSV com o mesmo nome e o arquivo binário ainda não existir, ou for
+    mais antigo que o CSV, o CSV é importado e salvo no formato binário (import_csv),
+    de modo que as próximas leituras já não precisam reinterpretar texto e datas.
+    Lança FileNotFoundError se nenhum dos dois existir.
+    """
+    import_csv(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    df = _read(path, columns)
+    df = df[columns] if columns is not None else df
+    return apply_policy(df) if policy else df
+
+def save_table(df, path):
+    """Salva a tabela no formato indicado pela extensão, sem o índice."""
+    fmt = _format(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if fmt == PARQUET:
+        df.to_parquet(path, index=False)
+    elif fmt == FEATHER:
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+def append_table(df, path):
+    """
+    Acrescenta linhas a uma tabela. Em CSV é um append de verdade; Parquet/Feather
+    não aceitam append, então a tabela inteira é lida e regravada: custo proporcional
+    ao tamanho do arquivo a cada chamada. Serve para gravações em lote e pouco
+    frequentes (ex: resultados do otimizador); para registros por trade, use o diário.
+    """
+    if _format(path) == CSV:
+        df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        return
+    if exists(path):
+        df = pd.concat([load_table(path, policy=False), df], ignore_index=True)
+    save_table(df, path)
+
+def export_csv(path, csv_path=None):
+    """
+    Exporta uma tabela binária para CSV. O CSV fica com a data de modificação da
+    tabela, para o import_csv não o tomar por uma versão mais nova.
+    """
+    csv_path = csv_path or with_format(path, CSV)
+    _read(path).to_csv(csv_path, index=False) # Sem import_csv: a tabela é a origem aqui
+    stat = os.stat(path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return csv_path
+
+# --- Arrays OHLC com memory-map ---
+def ohlc_cache_dir(path):
+    """Diretório do cache .npy de uma tabela (ex: 'xauusd_h1_data.parquet' -> 'xauusd_h1_data.npy/')."""
+    return os.path.splitext(path)[0] + ".npy"
+
+def save_ohlc_arrays(df, directory, columns=OHLC_COLUMNS):
+    """Salva cada coluna OHLC como um array .npy (o tempo em nanossegundos int64)."""
+    os.makedirs(directory, exist_ok=True)
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if col == 'time':
+            values = values.astype('datetime64[ns]').astype('int64')
+        np.save(os.path.join(directory, f"{col}.npy"), values.to_numpy())
+    with open(os.path.join(directory, "meta.json"), 'w') as f:
+        json.dump({'rows': len(df), 'columns': [c for c in columns if c in df.columns]}, f)
+
+def load_ohlc_arrays(path, columns=OHLC_COLUMNS):
+    """
+    Retorna um dict coluna -> array numpy somente-leitura mapeado em memória.
+    O cache .npy é (re)criado a partir da tabela quando não existe ou está
+    mais antigo que ela; depois disso a leitura é praticamente instantânea e
+    só as páginas realmente acessadas são carregadas.
+    """
+    directory = ohlc_cache_dir(path)
+    meta_file = os.path.join(directory, "meta.json")
+    source = path if os.path.exists(path) else with_format(path, CSV)
+    if not os.path.exists(meta_file) or os.path.getmtime(meta_file) < os.path.getmtime(source):
+        save_ohlc_arrays(load_table(path, policy=False), directory)
+
+    with open(meta_file) as f:
+        available = json.load(f)['columns']
+    return {col: np.load(os.path.join(directory, f"{col}.npy"), mmap_mode='r')
+            for col in columns if col in available}
+
+def load_ohlc_frame(path, columns=OHLC_COLUMNS):
+    """
+    DataFrame das colunas OHLC montado a partir do cache .npy (load_ohlc_arrays),
+    com a política de tipos aplicada. Para as etapas que só precisam das velas e
+    rodam várias vezes sobre o mesmo histórico (walk-forward, otimizador, backtest).
+    Lança KeyError se alguma coluna pedida não existir na tabela.
+    """
+    arrays = load_ohlc_arrays(path, columns)
+    missing = [col for col in columns if col not in arrays]
+    if missing:
+        raise KeyError(f"Colunas ausentes em '{path}': {missing}")
+    df = pd.DataFrame({col: arrays[col].astype('datetime64[ns]') if col == 'time' else np.array(arrays[col])
+                       for col in columns})
+    return apply_policy(df)
@@ -1,8 +1,53 @@
 import backtrader as bt
 import pandas as pd
 import joblib
+import argparse
 from datetime import datetime
-import talib as ta # Usado para padrões de vela, pois backtrader não tem todos
+
+from armazenamento import load_table
+from motor_features import compute_features, feature_set
+from inferencia_rapida import FlatForest, is_supported
+from backtest_vetorizado import SIGNAL_ATR_FACTOR, add_predictions
+import metricas
+
+# Colunas calculadas pelo motor_features que a estratégia lê como linhas extras do feed
+FEATURE_LINES = ('pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3',
+                 'ema50', 'ema200', 'atr14', 'engulfing', 'hammer')
+
+# --- FEED DE DADOS COM AS FEATURES PRÉ-CALCULADAS ---
+class FeaturesPandasData(bt.feeds.PandasData):
+    # Colunas *adicionais* além do OHLCV padrão
+    lines = FEATURE_LINES
+
+    # -1 = procurar a coluna com o mesmo nome no DataFrame
+    params = tuple((name, -1) for name in FEATURE_LINES) + (
+        ('volume', 'volume'), # Já renomeado 'tick_volume' para 'volume' no df
+        ('openinterest', -1), # Indica que não há 'openinterest'
+    )
+
+    def start(self):
+        super().start()
+        # O PandasData original lê cada valor com iloc a cada vela, o que domina o tempo
+        # do backtest; aqui as colunas viram arrays NumPy uma única vez
+        df = self.p.dataname
+        self._arrays = [(getattr(self.lines, field), df.iloc[:, col].to_numpy(dtype=float))
+                        for field, col in self._colmapping.items()
+                        if field != 'datetime' and col is not None]
+        self._dtnums = [bt.date2num(ts.to_pydatetime()) for ts in df.index]
+
+    def _load(self):
+        self._idx += 1
+        if self._idx >= len(self._dtnums):
+            return False
+        for line, values in self._arrays:
+            line[0] = values[self._idx]
+        self.lines.datetime[0] = self._dtnums[self._idx]
+        return True
+
+class PrecomputedPandasData(FeaturesPandasData):
+    # Sinal técnico e previsão da IA já calculados em lote para todas as velas
+    lines = ('signal', 'prediction')
+    params = (('signal', -1), ('prediction', -1))
 
 # --- CLASSE DA ESTRATÉGIA PARA BACKTRADER ---
 class EstrategiaIA(bt.Strategy):
@@ -10,15 +55,27 @@ class EstrategiaIA(bt.Strategy):
         ('ema_short', 50),
         ('ema_long', 200),
         ('atr_period', 14),
+        ('precomputed', False), # True = lê 'signal'/'prediction' do feed (ver build_feed)
     )
 
     def __init__(self):
         """Inicializa a estratégia, indicadores e o modelo de IA."""
-        print("--- Inicializando Estratégia para Backtest (Recalculando Indicadores) ---")
+        print("--- Inicializando Estratégia para Backtest (Features do motor_features) ---")
+        self.order = None
+        if self.p.precomputed:
+            # O modelo já rodou em lote sobre as velas com sinal; next() só lê as linhas
+            self.signal = self.datas[0].signal
+            self.prediction = self.datas[0].prediction
+            self.init_metrics()
+            return
+
         # Carregar o modelo de IA treinado
         try:
             self.model = joblib.load('modelo_ia_trade.joblib')
             self.features_order = self.model.feature_names_in_
+            # Inferência de uma linha sem montar DataFrame a cada sinal
+            self.forest = FlatForest(self.model) if is_supported(self.model) else None
+            self.feature_vector = self.forest.new_vector() if self.forest is not None else None
             print("Modelo de IA carregado com sucesso.")
         except FileNotFoundError:
             print("ERRO CRÍTICO: Arquivo 'modelo_ia_trade.joblib' não encontrado!")
@@ -31,23 +88,20 @@ class EstrategiaIA(bt.Strategy):
         self.datalow = self.datas[0].low
         self.datavolume = self.datas[0].volume
 
-        # --- Indicadores Backtrader ---
-        self.ema50 = bt.indicators.EMA(self.datas[0], period=self.p.ema_short)
-        self.ema200 = bt.indicators.EMA(self.datas[0], period=self.p.ema_long)
-        self.atr14 = bt.indicators.ATR(self.datas[0], period=self.p.atr_period)
-
-        # --- Variáveis para cálculo de Pivot Points (diário) ---
-        # Inicializando variáveis para armazenar os valores dos pivot points
-        self.pivot_val = 0
-        self.r1_val = 0
-        self.s1_val = 0
-        self.r2_val = 0
-        self.s2_val = 0
-        self.r3_val = 0
-        self.s3_val = 0
-
-        self.order = None
-        
+        # --- Features pré-calculadas pelo motor_features (mesmas do treino e do robô) ---
+        # Os períodos de EMA/ATR dos params são aplicados ao montar o feed (ver build_feed)
+        self.ema50 = self.datas[0].ema50
+        self.ema200 = self.datas[0].ema200
+        self.atr14 = self.datas[0].atr14
+        self.engulfing = self.datas[0].engulfing
+        self.hammer = self.datas[0].hammer
+        self.pivot = self.datas[0].pivot
+        self.r1, self.s1 = self.datas[0].r1, self.datas[0].s1
+        self.r2, self.s2 = self.datas[0].r2, self.datas[0].s2
+        self.r3, self.s3 = self.datas[0].r3, self.datas[0].s3
+        self.init_metrics()
+
+    def init_metrics(self):
         # Variáveis para cálculo de métricas personalizadas
         self.trades = []
         self.won_trades = 0
@@ -94,154 +148,137 @@ class EstrategiaIA(bt.Strategy):
 
     def next(self):
         """Lógica principal da estratégia, executada a cada vela."""
-        if self.order or self.model is None:
+        if self.order:
             return
 
+        if self.p.precomputed:
+            # Sinal e previsão já calculados em lote (ver build_feed): só leitura das linhas
+            signal = int(self.signal[0])
+            prediction = self.prediction[0]
+        else:
+            if self.model is None:
+                return
+            signal, prediction = self.evaluate_bar()
+
+        # Se a IA prever sucesso (1), envia a ordem
+        if signal != 0 and prediction == 1:
+            # Fechar posições opostas, se houver
+            if self.position.size > 0 and signal == -1:  # Temos uma posição comprada e o sinal é de venda
+                print(f'{self.datas[0].datetime.date(0)}: Fechando posição comprada')
+                self.close()  # Fechar a posição comprada
+            elif self.position.size < 0 and signal == 1:  # Temos uma posição vendida e o sinal é de compra
+                print(f'{self.datas[0].datetime.date(0)}: Fechando posição vendida')
+                self.close()  # Fechar a posição vendida
+
+            # Abrir nova posição, se não houver posição ou se a posição for na mesma direção
+            if (self.position.size == 0) or (self.position.size > 0 and signal == 1) or (self.position.size < 0 and signal == -1):
+                if signal == 1:
+                    self.order = self.buy()
+                elif signal == -1:
+                    self.order = self.sell()
+
+    def evaluate_bar(self):
+        """Calcula o sinal da vela atual e, se houver sinal, consulta a IA. Retorna (sinal, previsão)."""
         # Garante que temos dados suficientes para todos os indicadores
         if len(self.dataopen) < max(self.p.ema_long, self.p.atr_period, 2): # 2 para pivots
-            return
+            return 0, 0
 
-        # --- Cálculo de Padrões de Vela (usando TA-Lib diretamente) ---
-        # backtrader tem alguns, mas TA-Lib é mais completo e já estamos usando
-        # É importante passar arrays numpy para o TA-Lib
-        import numpy as np
-        open_arr = np.array(self.dataopen.get(size=max(self.p.ema_long, self.p.atr_period, 2)))
-        high_arr = np.array(self.datahigh.get(size=max(self.p.ema_long, self.p.atr_period, 2)))
-        low_arr = np.array(self.datalow.get(size=max(self.p.ema_long, self.p.atr_period, 2)))
-        close_arr = np.array(self.dataclose.get(size=max(self.p.ema_long, self.p.atr_period, 2)))
-
-        engulfing = ta.CDLENGULFING(open_arr, high_arr, low_arr, close_arr)[-1]
-        hammer = ta.CDLHAMMER(open_arr, high_arr, low_arr, close_arr)[-1]
-
-        # --- Cálculo de Pivot Points (diário) ---
-        # Aqui calculamos os pivot points diretamente
-        # Para simplificar, vamos assumir que os dados são de 1 hora e calcular os pivots diários
-        # com base nos dados das últimas 24 horas (24 velas de 1 hora)
-        if len(self.dataopen) >= 24:
-            daily_high = max(self.datahigh.get(size=24))
-            daily_low = min(self.datalow.get(size=24))
-            daily_close = self.dataclose[0]
-            
-            self.pivot_val = (daily_high + daily_low + daily_close) / 3
-            self.r1_val = 2 * self.pivot_val - daily_low
-            self.s1_val = 2 * self.pivot_val - daily_high
-            self.r2_val = self.pivot_val + (daily_high - daily_low)
-            self.s2_val = self.pivot_val - (daily_high - daily_low)
-            self.r3_val = daily_high + 2 * (self.pivot_val - daily_low)
-            self.s3_val = daily_low - 2 * (daily_high - self.pivot_val)
-        else:
-            # Se não tivermos dados suficientes, definimos os pivots como 0
-            self.pivot_val = 0
-            self.r1_val = 0
-            self.s1_val = 0
-            self.r2_val = 0
-            self.s2_val = 0
-            self.r3_val = 0
-            self.s3_val = 0
+        engulfing = self.engulfing[0]
+        hammer = self.hammer[0]
 
         signal = 0
         atr_val = self.atr14[0]
 
-        # --- Features de Tempo e Sessão ---
+        # --- Features de Tempo ---
         current_datetime = self.datas[0].datetime.datetime(0)
         current_hour = current_datetime.hour
         current_day_of_week = current_datetime.weekday()
-        session_asia = 1 if 0 <= current_hour <= 8 else 0
-        session_london = 1 if 7 <= current_hour <= 16 else 0
-        session_ny = 1 if 12 <= current_hour <= 21 else 0
 
         # --- Condições de Compra ---
         if (self.ema50[0] > self.ema200[0] and
            (engulfing > 0 or hammer > 0) and
-           ((abs(self.datalow[0] - self.s1_val) < atr_val * 0.7) or 
-            (abs(self.datalow[0] - self.s2_val) < atr_val * 0.7))):
+           ((abs(self.datalow[0] - self.s1[0]) < atr_val * SIGNAL_ATR_FACTOR) or
+            (abs(self.datalow[0] - self.s2[0]) < atr_val * SIGNAL_ATR_FACTOR))):
             signal = 1
 
         # --- Condições de Venda ---
         elif (self.ema50[0] < self.ema200[0] and
               engulfing < 0 and
-              ((abs(self.datahigh[0] - self.r1_val) < atr_val * 0.7) or 
-               (abs(self.datahigh[0] - self.r2_val) < atr_val * 0.7))):
+              ((abs(self.datahigh[0] - self.r1[0]) < atr_val * SIGNAL_ATR_FACTOR) or
+               (abs(self.datahigh[0] - self.r2[0]) < atr_val * SIGNAL_ATR_FACTOR))):
             signal = -1
 
+        if signal == 0:
+            return 0, 0
+
         # --- Se um sinal técnico foi gerado, consultar a IA ---
-        if signal != 0:
-            current_candle_data = {
-                'open': self.dataopen[0],
-                'high': self.datahigh[0],
-                'low': self.datalow[0],
-                'close': self.dataclose[0],
-                'real_volume': 0,  # Adicionando real_volume com valor 0
-                's1': self.s1_val, 's2': self.s2_val, 's3': self.s3_val,
-                'r1': self.r1_val, 'r2': self.r2_val, 'r3': self.r3_val,
-                'pivot': self.pivot_val,
-                'ema50': self.ema50[0],
-                'ema200': self.ema200[0],
-                'atr14': self.atr14[0],
-                'engulfing': engulfing,
-                'hammer': hammer,
-                'hour': current_hour,
-                'day_of_week': current_day_of_week,
-                'signal': signal,  # Adicionando signal
-            }
+        current_candle_data = {
+            'open': self.dataopen[0],
+            'high': self.datahigh[0],
+            'low': self.datalow[0],
+            'close': self.dataclose[0],
+            'real_volume': 0,  # Adicionando real_volume com valor 0
+            's1': self.s1[0], 's2': self.s2[0], 's3': self.s3[0],
+            'r1': self.r1[0], 'r2': self.r2[0], 'r3': self.r3[0],
+            'pivot': self.pivot[0],
+            'ema50': self.ema50[0],
+            'ema200': self.ema200[0],
+            'atr14': self.atr14[0],
+            'engulfing': engulfing,
+            'hammer': hammer,
+            'hour': current_hour,
+            'day_of_week': current_day_of_week,
+            'signal': signal,  # Adicionando signal
+        }
+        if self.forest is not None:
+            prediction, _ = self.forest.predict_one(
+                self.forest.fill_vector(self.feature_vector, current_candle_data))
+        else:
             features_df = pd.DataFrame([current_candle_data])[self.features_order]
-            
             prediction = self.model.predict(features_df)[0]
-
-            # Se a IA prever sucesso (1), envia a ordem
-            if prediction == 1:
-                # Fechar posições opostas, se houver
-                if self.position.size > 0 and signal == -1:  # Temos uma posição comprada e o sinal é de venda
-                    print(f'{self.datas[0].datetime.date(0)}: Fechando posição comprada')
-                    self.close()  # Fechar a posição comprada
-                elif self.position.size < 0 and signal == 1:  # Temos uma posição vendida e o sinal é de compra
-                    print(f'{self.datas[0].datetime.date(0)}: Fechando posição vendida')
-                    self.close()  # Fechar a posição vendida
-                
-                # Abrir nova posição, se não houver posição ou se a posição for na mesma direção
-                if (self.position.size == 0) or (self.position.size > 0 and signal == 1) or (self.position.size < 0 and signal == -1):
-                    if signal == 1:
-                        self.order = self.buy()
-                    elif signal == -1:
-                        self.order = self.sell()
+        return signal, prediction
+
+def build_feed(df, ema_short=EstrategiaIA.params.ema_short, ema_long=EstrategiaIA.params.ema_long,
+               atr_period=EstrategiaIA.params.atr_period, model=None):
+    """
+    Calcula as features com o motor_features e monta o feed do backtrader.
+    Com um modelo, também pré-calcula sinal e previsão (modo precomputed da estratégia).
+    """
+    with metricas.stage('backtest.features'):
+        df = compute_features(df, feature_set(ema_short, ema_long, atr_period))
+    feed_class = FeaturesPandasData
+    if model is not None:
+        with metricas.stage('backtest.predictions'):
+            df = add_predictions(df, model)
+        feed_class = PrecomputedPandasData
+    df = df.rename(columns={'tick_volume': 'volume'}).set_index('time')
+    return feed_class(dataname=df)
 
 # --- FUNÇÃO PRINCIPAL PARA EXECUTAR O BACKTEST ---
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backtest da estratégia com IA.")
+    parser.add_argument("--por-vela", action="store_true",
+                        help="Calcula o sinal e consulta a IA dentro de next(), vela a vela (modo original).")
+    args = parser.parse_args()
+
     cerebro = bt.Cerebro()
 
-    # Carregar os dados brutos
-    df = pd.read_csv('dados_com_indicadores.csv', parse_dates=['time'], index_col='time')
-    
-    # Renomear 'tick_volume' para 'volume' para compatibilidade com Backtrader
-    df.rename(columns={'tick_volume': 'volume'}, inplace=True)
-
-    # Definir o feed de dados PandasData com uma subclasse explícita
-    class CustomPandasData(bt.feeds.PandasData):
-        # Apenas as colunas *adicionais* que não são OHLCV padrão
-        lines = (
-            # 'real_volume', # Removido
-        )
-
-        # Mapeamento de colunas padrão do Backtrader para os nomes no seu DataFrame
-        # 'datetime' é tratado por index_col='time'
-        # 'open', 'high', 'low', 'close' são assumidos como padrão
-        volume = 'volume' # Já renomeado 'tick_volume' para 'volume' no df
-        openinterest = -1 # Indica que não há 'openinterest'
-        
-        # Garantir que o volume seja tratado como uma série numérica
-        def _load(self):
-            ret = super()._load()
-            if ret:
-                # Certifique-se de que o volume é numérico
-                self.lines.volume[0] = float(self.lines.volume[0])
-            return ret
-
-    # Adicionar os dados ao Cerebro usando o feed personalizado
-    data = CustomPandasData(dataname=df)
+    # Carregar os dados brutos e calcular as features com o motor compartilhado
+    model = None
+    if not args.por_vela:
+        # Modo pré-calculado: sinal e previsão da IA em lote antes do backtest
+        try:
+            model = joblib.load('modelo_ia_trade.joblib')
+        except FileNotFoundError:
+            print("ERRO CRÍTICO: Arquivo 'modelo_ia_trade.joblib' não encontrado!")
+            raise SystemExit(1)
+    data = build_feed(load_table('dados_com_indicadores.parquet',
+                                 columns=['time', 'open', 'high', 'low', 'close', 'tick_volume']),
+                      model=model)
     cerebro.adddata(data)
 
     # Adicionar a estratégia
-    cerebro.addstrategy(EstrategiaIA)
+    cerebro.addstrategy(EstrategiaIA, precomputed=not args.por_vela)
 
     # Configurações do Broker
     cerebro.broker.setcash(10000.0) # Saldo inicial
@@ -257,7 +294,8 @@ if __name__ == '__main__':
 
     print("--- Iniciando Backtest da Estratégia ---")
     # Executar o backtest
-    results = cerebro.run()
+    with metricas.stage('backtest.run'):
+        results = cerebro.run()
     strat = results[0]
 
     # Imprimir os resultados
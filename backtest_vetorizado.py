@@ -0,0 +1,415 @@
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from armazenamento import load_ohlc_frame
+from motor_features import compute_features, compute_signal
+from inferencia_rapida import FlatForest, is_supported
+import metricas
+
+# --- Arquivos ---
+INPUT_FILE = "dados_com_indicadores.parquet"
+MODEL_FILE = "modelo_ia_trade.joblib"
+
+# --- Parâmetros do Sinal (mesmos do robo_trader.py) ---
+SIGNAL_ATR_FACTOR = 0.7 # Distância máxima até o nível, em múltiplos do ATR
+SIGNAL_LEVELS = (1, 2)  # Níveis de suporte/resistência usados (S1/R1 e S2/R2)
+
+# --- Parâmetros do Broker (mesmos do backtest_estrategia.py) ---
+INITIAL_CASH = 10000.0
+COMMISSION = 0.0002 # 0.02% do valor negociado, em cada execução
+STAKE = 1           # Tamanho fixo de cada ordem
+
+# --- Parâmetros das Métricas (padrões dos analisadores do backtrader) ---
+RISK_FREE_RATE = 0.01 # Taxa livre de risco anual do SharpeRatio
+TRADING_DAYS = 252    # Dias por ano usados pelo Returns para anualizar (rnorm)
+
+def add_predictions(df, model, atr_factor=SIGNAL_ATR_FACTOR, levels=SIGNAL_LEVELS, forest=None):
+    """
+    Calcula o sinal de todas as velas de uma vez e roda o modelo em lote só nas
+    velas com sinal. Adiciona as colunas 'signal' e 'prediction' (0 nas demais).
+    'forest' permite reaproveitar um FlatForest já montado entre várias chamadas.
+    """
+    df['signal'] = compute_signal(df, atr_factor=atr_factor, levels=levels)
+    features_order = list(model.feature_names_in_)
+    candidates = (df['signal'] != 0) & df[features_order].notna().all(axis=1)
+
+    prediction = pd.Series(0, index=df.index, dtype='int64')
+    if candidates.any():
+        X = df.loc[candidates, features_order]
+        if forest is not None or is_supported(model):
+            forest = forest or FlatForest(model)
+            prediction[candidates] = forest.predict(X.to_numpy())
+        else:
+            prediction[candidates] = model.predict(X)
+    df['prediction'] = prediction
+    return df
+
+# --- Execução de Ordens ---
+def _execute(cash, size, price, position, avg_price, commission, pseudo=False):
+    """
+    Executa uma ordem de 'size' ao preço 'price' como o BackBroker do backtrader
+    (ações, shortcash=True, comissão percentual absoluta). Retorna o novo caixa, a
+    nova posição, o novo preço médio, o PnL realizado, a comissão paga e se a parte
+    de abertura foi executada (False = caixa insuficiente).
+
+    Com pseudo=True reproduz a checagem feita na submissão da ordem, que não
+    realiza PnL e usa o próprio preço da ordem como preço médio.
+    """
+    new_position = position + size
+    if new_position == 0:
+        opened, closed = 0, size
+        new_avg = 0.0
+    elif position == 0:
+        opened, closed = size, 0
+        new_avg = price
+    elif (position > 0) == (size > 0): # Aumenta a posição (preço médio ponderado)
+        opened, closed = size, 0
+        new_avg = (avg_price * position + size * price) / new_position
+    elif (new_position > 0) == (position > 0): # Reduz a posição
+        opened, closed = 0, size
+        new_avg = avg_price
+    else: # Inverte a posição
+        opened, closed = new_position, -position
+        new_avg = price
+
+    orig_price = price if pseudo else avg_price
+    pnl = 0.0 if pseudo else -closed * (price - orig_price)
+    paid = 0.0
+    if closed:
+        cash += -closed * orig_price + pnl
+        closed_comm = abs(closed) * commission * price
+        cash -= closed_comm
+        paid += closed_comm
+    filled = True
+    if opened:
+        opened_cash = cash - opened * price - abs(opened) * commission * price
+        if pseudo:
+            return opened_cash, None, None, 0.0, 0.0, opened_cash >= 0.0
+        if opened_cash < 0.0:
+            # Sem caixa para abrir: só a parte de fechamento (se houver) é executada
+            filled = False
+            new_position, new_avg = position + closed, (avg_price if position + closed else 0.0)
+        else:
+            paid += abs(opened) * commission * price
+            cash = opened_cash
+    return cash, new_position, new_avg, pnl, paid, filled
+
+def _levels(esquema, side, entry, i, arrays):
+    """Níveis de alvo e stop de uma entrada (mesmos esquemas do matriz_rotulos.py)."""
+    if esquema['tipo'] == 'pivot':
+        if side == 1:
+            return arrays[f"r{esquema['alvo']}"][i], arrays[f"s{esquema['stop']}"][i]
+        return arrays[f"s{esquema['alvo']}"][i], arrays[f"r{esquema['stop']}"][i]
+
+    atr = arrays['atr14'][i]
+    if esquema['tipo'] == 'atr':
+        return entry + side * esquema['alvo'] * atr, entry - side * esquema['stop'] * atr
+
+    if esquema['tipo'] == 'rr':
+        stop_loss = arrays['low'][i] - atr if side == 1 else arrays['high'][i] + atr
+        return entry + (entry - stop_loss) * esquema['rr'], stop_loss
+
+    raise ValueError(f"Tipo de esquema desconhecido: {esquema['tipo']}")
+
+def _first_exit(arrays, start, end, side, take_profit, stop_loss):
+    """
+    Primeira vela em [start, end] que atinge o stop ou o alvo, com o preço de saída.
+    O stop tem prioridade quando os dois são atingidos na mesma vela (conservador) e,
+    se a vela abrir além do nível, a saída é na abertura.
+    """
+    if start > end:
+        return None
+    low, high, open_ = (arrays[c][start:end + 1] for c in ('low', 'high', 'open'))
+    if side == 1:
+        stop_hit, target_hit = low <= stop_loss, high >= take_profit
+    else:
+        stop_hit, target_hit = high >= stop_loss, low <= take_profit
+    hits = stop_hit | target_hit
+    if not hits.any():
+        return None
+    k = int(hits.argmax())
+    bar_open = open_[k]
+    if stop_hit[k]:
+        gapped = bar_open <= stop_loss if side == 1 else bar_open >= stop_loss
+        return start + k, (bar_open if gapped else stop_loss), 'stop'
+    gapped = bar_open >= take_profit if side == 1 else bar_open <= take_profit
+    return start + k, (bar_open if gapped else take_profit), 'alvo'
+
+# --- Motor do Backtest ---
+def run_backtest(df, cash=INITIAL_CASH, stake=STAKE, commission=COMMISSION, esquema=None):
+    """
+    Backtest da EstrategiaIA sem o loop de eventos do backtrader.
+
+    Lê as colunas 'signal' e 'prediction' (ver add_predictions) e só visita as velas
+    com sinal aprovado pela IA, com as mesmas regras da estratégia: ordem a mercado
+    executada na abertura da vela seguinte, novas entradas na direção da posição
+    (piramidação) e fechamento, sem reabrir na mesma vela, quando o sinal é oposto.
+    A curva de patrimônio é montada de forma vetorizada a partir das execuções.
+
+    'esquema' (opcional, mesmo formato do matriz_rotulos.ESQUEMAS) adiciona stop e
+    alvo, definidos na abertura da posição e checados contra a máxima/mínima das
+    velas. Sem esquema, os resultados são os mesmos do backtest_estrategia.py.
+
+    Retorna um dict com 'trades' (DataFrame), 'equity' (Series) e 'metrics'.
+    """
+    columns = ['open', 'high', 'low', 'close', 'atr14'] + [f'{s}{n}' for s in 'rs' for n in (1, 2, 3)]
+    arrays = {c: df[c].to_numpy(dtype=float) for c in columns if c in df.columns}
+    times = pd.DatetimeIndex(df['time'])
+    opens, closes = arrays['open'], arrays['close']
+    n = len(df)
+    initial_cash = cash
+
+    approved = (df['signal'].to_numpy() != 0) & (df['prediction'].to_numpy() == 1)
+    decisions = np.flatnonzero(approved[:n - 1]) # Ordem na última vela nunca é executada
+    signals = df['signal'].to_numpy()
+
+    position, avg_price = 0, 0.0
+    trade = None
+    trades = []
+    changes = [] # (vela, caixa, posição, preço médio) após cada execução
+    levels = None # (alvo, stop) da posição aberta
+    checked = 0   # Primeira vela ainda não verificada para stop/alvo
+
+    def fill(bar, size, price, reason):
+        nonlocal cash, position, avg_price, trade
+        old_position = position
+        cash, position, avg_price, pnl, paid, filled = _execute(cash, size, price, position, avg_price, commission)
+        if not filled and position == old_position:
+            return False
+        if trade is None:
+            trade = {'entry_time': times[bar], 'side': 1 if position > 0 else -1, 'entry_price': price,
+                     'max_size': 0, 'pnl': 0.0, 'commission': 0.0}
+        trade['pnl'] += pnl
+        trade['commission'] += paid
+        trade['max_size'] = max(trade['max_size'], abs(position))
+        if position == 0:
+            trade.update(exit_time=times[bar], exit_price=price, reason=reason,
+                         pnlcomm=trade['pnl'] - trade['commission'])
+            trades.append(trade)
+            trade = None
+        changes.append((bar, cash, position, avg_price))
+        return True
+
+    def check_exits(until):
+        nonlocal checked, levels
+        if levels is not None and position != 0:
+            hit = _first_exit(arrays, checked, until, 1 if position > 0 else -1, *levels)
+            if hit is not None:
+                bar, price, reason = hit
+                fill(bar, -position, price, reason)
+                levels = None
+        checked = max(checked, until + 1)
+
+    for i in decisions:
+        check_exits(i)
+        side = signals[i]
+        exec_bar = i + 1
+        if position != 0 and (position > 0) != (side > 0):
+            size = -position # Sinal oposto: apenas fecha a posição
+        else:
+            size = side * stake
+        # Checagem de caixa na submissão (ao preço de fechamento da vela do sinal)
+        if not _execute(cash, size, closes[i], position, avg_price, commission, pseudo=True)[5]:
+            continue
+        was_flat = position == 0
+        if fill(exec_bar, size, opens[exec_bar], 'sinal') and esquema is not None:
+            if position == 0:
+                levels = None
+            elif was_flat:
+                levels = _levels(esquema, side, opens[exec_bar], i, arrays)
+                checked = exec_bar
+    check_exits(n - 1)
+
+    # --- Curva de patrimônio (valor da conta a cada vela, como o broker) ---
+    state = np.searchsorted([c[0] for c in changes], np.arange(n), side='right')
+    history = np.array([(initial_cash, 0, 0.0)] + [c[1:] for c in changes], dtype=float)
+    cash_curve, size_curve, _ = history[state].T
+    values = cash_curve + size_curve * closes # Caixa + posição a mercado (comprada ou vendida)
+    equity = pd.Series(values, index=times, name='valor')
+
+    trades = pd.DataFrame(trades, columns=['entry_time', 'exit_time', 'side', 'max_size', 'entry_price',
+                                           'exit_price', 'pnl', 'commission', 'pnlcomm', 'reason'])
+    return {'trades': trades, 'equity': equity, 'metrics': compute_metrics(equity, trades, initial_cash)}
+
+# --- Métricas ---
+def _std(values):
+    """Desvio padrão populacional, como o mathsupport.standarddev do backtrader."""
+    avg = sum(values) / len(values)
+    return math.sqrt(sum((v - avg) ** 2 for v in values) / len(values))
+
+def compute_metrics(equity, trades, initial_cash=INITIAL_CASH):
+    """
+    Métricas do backtest_estrategia.py calculadas a partir da curva de patrimônio e
+    da lista de trades, com as mesmas definições dos analisadores do backtrader:
+    SharpeRatio (retornos anuais, taxa livre de risco de 1%), DrawDown, Returns
+    (rnorm anualizado por dia de negociação), Calmar, SQN e as métricas por trade.
+    """
+    values = equity.to_numpy()
+    final_value = float(values[-1]) if len(values) else initial_cash
+    metrics = {'initial_value': initial_cash, 'final_value': final_value,
+               'total_return': (final_value - initial_cash) / initial_cash}
+
+    # Sharpe: retorno de cada ano sobre o valor no fim do ano anterior
+    years = equity.index.year.to_numpy()
+    year_end = np.flatnonzero(np.r_[years[1:] != years[:-1], True]) if len(years) else np.array([], dtype=int)
+    year_values = values[year_end]
+    starts = np.r_[initial_cash, year_values[:-1]]
+    rate = pow(1.0 + RISK_FREE_RATE, 1.0 / 1) - 1.0
+    excess = [float(v / s - 1.0) - rate for v, s in zip(year_values, starts)]
+    try:
+        metrics['sharpe'] = (sum(excess) / len(excess)) / _std(excess) if excess else None
+    except ZeroDivisionError:
+        metrics['sharpe'] = None
+
+    # Drawdown em relação ao pico do patrimônio
+    peak = np.maximum.accumulate(values)
+    moneydown = peak - values
+    metrics['max_moneydown'] = float(moneydown.max(initial=0.0))
+    metrics['max_drawdown'] = float((100.0 * moneydown / peak).max(initial=0.0))
+
+    # Retorno anualizado: log-retorno médio por dia com dados, anualizado
+    days = len(np.unique(equity.index.normalize())) if len(values) else 1
+    ratio = final_value / initial_cash
+    ravg = (math.log(ratio) if ratio >= 0 else float('-inf')) / days
+    metrics['rnorm'] = math.expm1(ravg * TRADING_DAYS) if ravg > float('-inf') else ravg
+    max_dd = abs(metrics['max_drawdown'] / 100)
+    metrics['calmar'] = metrics['rnorm'] / max_dd if max_dd != 0 else 0
+
+    # Métricas por trade (PnL com comissão)
+    pnl = trades['pnlcomm'].tolist()
+    won = [p for p in pnl if p > 0]
+    lost = [abs(p) for p in pnl if p <= 0]
+    if len(pnl) > 1:
+        try:
+            metrics['sqn'] = math.sqrt(len(pnl)) * (sum(pnl) / len(pnl)) / _std(pnl)
+        except ZeroDivisionError:
+            metrics['sqn'] = None
+    else:
+        metrics['sqn'] = 0
+    metrics['total_trades'] = len(pnl)
+    metrics['won_trades'] = len(won)
+    metrics['lost_trades'] = len(lost)
+    metrics['win_rate'] = len(won) / len(pnl) * 100 if pnl else 0
+    metrics['avg_won'] = sum(won) / len(won) if won else 0
+    metrics['avg_lost'] = sum(lost) / len(lost) if lost else 0
+    metrics['payoff_ratio'] = metrics['avg_won'] / metrics['avg_lost'] if metrics['avg_lost'] != 0 else 0
+    metrics['profit_factor'] = sum(won) / sum(lost) if lost and sum(lost) != 0 else 0
+    metrics['average_trade'] = sum(pnl) / len(pnl) if pnl else 0
+    win_rate = metrics['win_rate']
+    metrics['expectancy'] = (win_rate / 100) * metrics['payoff_ratio'] - (1 - win_rate / 100) if win_rate != 0 else 0
+    return metrics
+
+def print_metrics(metrics):
+    """Imprime as métricas no mesmo formato do backtest_estrategia.py."""
+    print(f"Valor Inicial do Portfólio: {metrics['initial_value']:.2f}")
+    print(f"Valor Final do Portfólio: {metrics['final_value']:.2f}")
+    print(f"Retorno Total: {metrics['total_return'] * 100:.2f}%")
+    print(f"Sharpe Ratio: {metrics['sharpe'] if metrics['sharpe'] is not None else 'N/A'}")
+    print(f"Drawdown Máximo: {metrics['max_drawdown']:.2f}%")
+    print(f"Drawdown Máximo em Valor: {metrics['max_moneydown']:.2f}")
+    print(f"Calmar Ratio: {metrics['calmar']:.2f}")
+    print(f"SQN: {metrics['sqn']}")
+    print(f"Total de Trades: {metrics['total_trades']}")
+    print(f"Trades Vencedores: {metrics['won_trades']}")
+    print(f"Trades Perdedores: {metrics['lost_trades']}")
+    if metrics['total_trades'] > 0:
+        print(f"Percentual de Acerto: {metrics['win_rate']:.2f}%")
+        print(f"Média de Lucro por Trade: {metrics['avg_won']:.2f}")
+        print(f"Média de Perda por Trade: {metrics['avg_lost']:.2f}")
+        print(f"Payoff Ratio: {metrics['payoff_ratio']:.2f}")
+        print(f"Fator de Lucro: {metrics['profit_factor']:.2f}")
+        print(f"Lucro Médio por Trade: {metrics['average_trade']:.2f}")
+        print(f"Expectativa Matemática: {metrics['expectancy']:.2f}")
+    else:
+        print("Nenhum trade foi fechado.")
+
+# --- Conferência com o backtrader ---
+def run_backtrader(df):
+    """Roda a EstrategiaIA (modo pré-calculado) no backtrader com o mesmo broker."""
+    import backtrader as bt
+    from backtest_estrategia import EstrategiaIA, PrecomputedPandasData
+
+    cerebro = bt.Cerebro()
+    cerebro.adddata(PrecomputedPandasData(dataname=df.rename(columns={'tick_volume': 'volume'}).set_index('time')))
+    cerebro.addstrategy(EstrategiaIA, precomputed=True)
+    cerebro.broker.setcash(INITIAL_CASH)
+    cerebro.broker.setcommission(commission=COMMISSION)
+    cerebro.addsizer(bt.sizers.FixedSize, stake=STAKE)
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe_ratio')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+    cerebro.addanalyzer(bt.analyzers.SQN, _name='sqn')
+    strat = cerebro.run()[0]
+
+    drawdown = strat.analyzers.drawdown.get_analysis()
+    rnorm = strat.analyzers.returns.get_analysis().get('rnorm', 0)
+    max_dd = abs(drawdown.max.drawdown / 100)
+    return strat.trades, {
+        'final_value': cerebro.broker.getvalue(),
+        'sharpe': strat.analyzers.sharpe_ratio.get_analysis().get('sharperatio'),
+        'max_drawdown': drawdown.max.drawdown,
+        'max_moneydown': drawdown.max.moneydown,
+        'rnorm': rnorm,
+        'calmar': rnorm / max_dd if max_dd != 0 else 0,
+        'sqn': strat.analyzers.sqn.get_analysis().get('sqn'),
+    }
+
+def cross_check(df, result, rtol=1e-9):
+    """Compara trades e métricas do motor vetorizado com os do backtrader."""
+    print("\n--- Conferência com o backtrader ---")
+    start = time.perf_counter()
+    bt_trades, bt_metrics = run_backtrader(df)
+    print(f"Backtrader: {time.perf_counter() - start:.2f}s")
+
+    ok = np.allclose(result['trades']['pnlcomm'].to_numpy(), np.array(bt_trades), rtol=rtol) \
+        if len(bt_trades) == len(result['trades']) else False
+    print(f"{'Lista de trades (PnL com comissão)':<36} {'OK' if ok else 'DIVERGENTE'} "
+          f"({len(result['trades'])} x {len(bt_trades)})")
+    for name, expected in bt_metrics.items():
+        value = result['metrics'][name]
+        same = (value is None and expected is None) or (
+            value is not None and expected is not None and math.isclose(value, expected, rel_tol=rtol, abs_tol=1e-9))
+        ok &= same
+        print(f"{name:<36} {'OK' if same else 'DIVERGENTE'} ({value} x {expected})")
+    if not ok:
+        raise AssertionError("O motor vetorizado diverge do backtrader!")
+    print("Trades e métricas idênticos aos do backtrader.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest vetorizado da estratégia com IA.")
+    parser.add_argument("--conferir", action="store_true", help="Roda também o backtrader e compara os resultados.")
+    parser.add_argument("--esquema", default=None,
+                        help="Esquema de stop/alvo do matriz_rotulos.ESQUEMAS (ex: rr1.5). Padrão: sem stop/alvo.")
+    args = parser.parse_args()
+
+    esquema = None
+    if args.esquema:
+        from matriz_rotulos import ESQUEMAS
+        esquema = next((e for e in ESQUEMAS if e['nome'] == args.esquema), None)
+        if esquema is None:
+            raise SystemExit(f"Esquema desconhecido: {args.esquema}")
+
+    print(f"Carregando dados de {INPUT_FILE} e modelo '{MODEL_FILE}'...")
+    with metricas.stage('backtest.features'):
+        df = compute_features(load_ohlc_frame(INPUT_FILE))
+    with metricas.stage('backtest.predictions'):
+        df = add_predictions(df, joblib.load(MODEL_FILE))
+
+    start = time.perf_counter()
+    with metricas.stage('backtest.run'):
+        result = run_backtest(df, esquema=esquema)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n--- Resultados do Backtest Vetorizado ({len(df)} velas em {elapsed * 1000:.1f} ms) ---")
+    print_metrics(result['metrics'])
+
+    if args.conferir:
+        if esquema is not None:
+            print("\nA conferência com o backtrader só vale sem stop/alvo (a EstrategiaIA não usa).")
+        else:
+            cross_check(df, result)
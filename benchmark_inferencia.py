@@ -0,0 +1,65 @@
+import time
+import joblib
+import numpy as np
+import pandas as pd
+
+from armazenamento import load_table
+from motor_features import compute_features
+from gerador_de_sinais import compute_signals
+from inferencia_rapida import FlatForest
+
+# --- Arquivos ---
+INPUT_FILE = "xauusd_h1_data.parquet"
+MODEL_FILE = "modelo_ia_trade.joblib"
+
+# --- Parâmetros do Benchmark ---
+AMOSTRAS = 500 # Quantas previsões de uma linha são cronometradas em cada caminho
+
+def time_per_call(func, rows):
+    """Tempo médio (em microssegundos) de uma chamada de func por linha."""
+    start = time.perf_counter()
+    for row in rows:
+        func(row)
+    return (time.perf_counter() - start) / len(rows) * 1e6
+
+def run_benchmark():
+    """Compara a inferência de uma linha do sklearn com a floresta achatada."""
+    print(f"Carregando modelo '{MODEL_FILE}' e dados de {INPUT_FILE}...")
+    model = joblib.load(MODEL_FILE)
+    forest = FlatForest(model)
+    features_order = forest.feature_names
+
+    df = compute_signals(compute_features(load_table(INPUT_FILE, columns=['time', 'open', 'high', 'low', 'close'])))
+    X = df[features_order].dropna().to_numpy()
+
+    # --- Conferência: mesmas classes e probabilidades do sklearn em todas as linhas ---
+    expected = model.predict_proba(X)
+    if not np.array_equal(expected, forest.predict_proba(X)):
+        raise AssertionError("predict_proba em lote diverge do sklearn!")
+    for row, proba in zip(X[-AMOSTRAS:], expected[-AMOSTRAS:]):
+        prediction, probability = forest.predict_one(row)
+        if not np.array_equal(probability, proba) or prediction != model.classes_[np.argmax(proba)]:
+            raise AssertionError("predict_one diverge do sklearn!")
+    print(f"{len(X)} linhas conferidas: probabilidades idênticas às do sklearn.")
+
+    # --- Latência de uma linha ---
+    rows = [dict(zip(features_order, row)) for row in X[-AMOSTRAS:]]
+    vector = forest.new_vector()
+
+    def sklearn_path(features):
+        features_df = pd.DataFrame([features])[features_order]
+        return model.predict(features_df)[0], model.predict_proba(features_df)[0]
+
+    def flat_path(features):
+        return forest.predict_one(forest.fill_vector(vector, features))
+
+    sklearn_us = time_per_call(sklearn_path, rows)
+    flat_us = time_per_call(flat_path, rows)
+
+    print(f"\n{'Caminho':<30} {'µs/previsão':>12}")
+    print(f"{'sklearn (DataFrame)':<30} {sklearn_us:>12.0f}")
+    print(f"{'FlatForest.predict_one':<30} {flat_us:>12.0f}")
+    print(f"\nGanho: {sklearn_us / flat_us:.0f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
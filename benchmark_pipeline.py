@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from motor_features import FEATURES, MODEL_FEATURES, PATTERN_FEATURES, compute_features
+from gerador_de_sinais import compute_signals, get_trade_outcomes
+from matriz_rotulos import build_label_matrix
+from treinamento_ia import MODEL_FAMILY, build_model
+from backtest_vetorizado import add_predictions, run_backtest
+
+# --- Arquivos ---
+BASELINE_FILE = "benchmark_base.json"
+
+# --- Dados Sintéticos ---
+BASE_BARS = 29445          # Velas do xauusd_h1_data.csv (escala 1x)
+SCALES = [1, 10, 100]
+SEED = 42
+START_PRICE = 1950.0
+START_TIME = "1750-01-01"  # 100x = ~470 anos de velas H1: começa cedo para caber no datetime64[ns]
+HOURLY_VOL = 0.0013        # Desvio padrão do retorno por vela
+VOL_PERSISTENCE = 200      # Meia-vida (velas) dos regimes de volatilidade
+LEVEL_HALFLIFE = 6000      # Meia-vida (velas) da reversão do preço ao seu nível médio
+
+# --- Execução ---
+REPEATS = 3                # Medições de tempo por etapa na escala 1x (vale a menor); 1 nas demais
+BACKTRADER_MAX_SCALE = 1   # O backtest do backtrader (loop de eventos) só roda até esta escala
+TIME_THRESHOLD = 0.25      # Regressão: tempo 25% acima da base...
+MEMORY_THRESHOLD = 0.25    # ...ou pico de memória 25% acima da base
+MIN_DELTA_SECONDS = 0.05   # Diferenças menores que estas são ruído de medição
+MIN_DELTA_MB = 1.0
+
+def synthetic_bars(n_bars, seed=SEED):
+    """
+    Velas H1 sintéticas reprodutíveis (mesma semente = mesmos dados), no formato do
+    xauusd_h1_data.csv: só dias úteis, volatilidade maior nas sessões de Londres e
+    Nova York, regimes de volatilidade persistentes e preço que volta ao nível médio.
+    """
+    rng = np.random.default_rng(seed)
+    days = int(n_bars / 24 * 7 / 5) + 14
+    times = pd.date_range(START_TIME, periods=days * 24, freq='h')
+    times = times[times.dayofweek < 5][:n_bars]
+
+    hour = times.hour.to_numpy()
+    session = np.where((hour >= 8) & (hour < 17), 1.5, 1.0) * np.where((hour >= 13) & (hour < 22), 1.4, 1.0)
+    regime = np.exp(pd.Series(rng.standard_normal(n_bars)).ewm(halflife=VOL_PERSISTENCE).mean().to_numpy() * 6)
+    sigma = HOURLY_VOL * session * regime / regime.mean()
+    returns = rng.standard_normal(n_bars) * sigma
+
+    walk = np.cumsum(returns)
+    log_close = np.log(START_PRICE) + walk - pd.Series(walk).ewm(halflife=LEVEL_HALFLIFE).mean().to_numpy()
+    close = np.exp(log_close)
+    gap = rng.standard_normal(n_bars) * sigma * 0.05
+    open_ = np.concatenate([[START_PRICE], close[:-1]]) * np.exp(gap)
+    wick = np.abs(rng.standard_normal((2, n_bars))) * sigma * 0.4
+    high = np.maximum(open_, close) * np.exp(wick[0])
+    low = np.minimum(open_, close) * np.exp(-wick[1])
+    tick_volume = (2000 * sigma / HOURLY_VOL * rng.lognormal(0, 0.3, n_bars)).astype(np.int64)
+
+    return pd.DataFrame({
+        'time': times, 'open': open_.round(2), 'high': high.round(2), 'low': low.round(2),
+        'close': close.round(2), 'tick_volume': tick_volume, 'real_volume': np.zeros(n_bars, dtype=np.int64),
+    })
+
+# --- Etapas do Pipeline ---
+# Cada etapa recebe o contexto (resultados das anteriores) e devolve o que acrescenta a ele
+def stage_features(ctx):
+    return {'df': compute_features(ctx['bars'], FEATURES + PATTERN_FEATURES)} # Como o calcula_indicadores
+
+def stage_signals(ctx):
+    df = compute_signals(ctx['df'])
+    df['target'] = get_trade_outcomes(df)
+    return {'df': df}
+
+def stage_label_matrix(ctx):
+    df = ctx['df']
+    return {'labels': build_label_matrix(df, np.flatnonzero(df['signal'] != 0))}
+
+def stage_train(ctx):
+    df = ctx['df']
+    dataset = df.loc[df['target'].notna(), MODEL_FEATURES + ['target']]
+    model = build_model(MODEL_FAMILY)
+    model.fit(dataset[MODEL_FEATURES], dataset['target'].astype(int))
+    model.feature_names_in_ = MODEL_FEATURES
+    return {'model': model}
+
+def stage_backtest(ctx):
+    df = add_predictions(ctx['df'], ctx['model'])
+    return {'backtest': run_backtest(df)}
+
+def stage_backtrader(ctx):
+    from backtest_vetorizado import run_backtrader
+    with contextlib.redirect_stdout(io.StringIO()): # A EstrategiaIA imprime cada ordem
+        return {'backtrader': run_backtrader(ctx['df'])}
+
+STAGES = [
+    ('features', stage_features),
+    ('sinais_rotulos', stage_signals),
+    ('matriz_rotulos', stage_label_matrix),
+    ('treino', stage_train),
+    ('backtest_vetorizado', stage_backtest),
+    ('backtest_backtrader', stage_backtrader),
+]
+
+def measure(func, ctx, repeats):
+    """
+    Roda a etapa 'repeats' vezes para o tempo (vale a menor medição) e mais uma com
+    o tracemalloc para o pico de memória alocada por ela. Retorna (saída, s, MB).
+    """
+    seconds = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = func(ctx)
+        seconds = min(seconds, time.perf_counter() - start)
+    del output # A execução medida pelo tracemalloc não divide o pico com a anterior
+    tracemalloc.start()
+    try:
+        output = func(ctx)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return output, seconds, peak / 2**20
+
+def run_benchmark(scales=SCALES, seed=SEED, repeats=REPEATS, backtrader_max_scale=BACKTRADER_MAX_SCALE):
+    """Mede todas as etapas em cada escala. Retorna {'1x': {etapa: {'seconds', 'peak_mb', 'bars'}}}."""
+    results = {}
+    for scale in scales:
+        n_bars = BASE_BARS * scale
+        ctx = {'bars': synthetic_bars(n_bars, seed)}
+        results[f"{scale}x"] = stage_results = {}
+        for name, func in STAGES:
+            if name == 'backtest_backtrader' and scale > backtrader_max_scale:
+                continue
+            output, seconds, peak_mb = measure(func, ctx, repeats if scale == 1 else 1)
+            ctx.update(output)
+            stage_results[name] = {'seconds': seconds, 'peak_mb': peak_mb, 'bars': n_bars}
+            print(f"{scale:>6}x {n_bars:>10} {name:<22}{seconds:>10.3f}{peak_mb:>12.1f}")
+    return results
+
+def compare(results, baseline, time_threshold=TIME_THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    """Lista as regressões (tempo ou memória acima da base além do limite) de 'results'."""
+    regressions = []
+    for scale, stages in results.items():
+        for name, current in stages.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None:
+                continue
+            if (current['seconds'] > base['seconds'] * (1 + time_threshold)
+                    and current['seconds'] - base['seconds'] > MIN_DELTA_SECONDS):
+                regressions.append(f"{scale} {name}: tempo {base['seconds']:.3f}s -> {current['seconds']:.3f}s")
+            if (current['peak_mb'] > base['peak_mb'] * (1 + memory_threshold)
+                    and current['peak_mb'] - base['peak_mb'] > MIN_DELTA_MB):
+                regressions.append(f"{scale} {name}: memória {base['peak_mb']:.1f} MB -> {current['peak_mb']:.1f} MB")
+    return regressions
+
+def print_comparison(results, baseline):
+    print(f"\n{'Escala':>7} {'Etapa':<22}{'Tempo':>10}{'Base':>10}{'Var.':>8}{'Pico MB':>10}{'Base':>10}{'Var.':>8}")
+    for scale, stages in results.items():
+        for name, current in stages.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None:
+                print(f"{scale:>7} {name:<22}{current['seconds']:>10.3f}{'-':>10}{'':>8}{current['peak_mb']:>10.1f}{'-':>10}")
+                continue
+            print(f"{scale:>7} {name:<22}{current['seconds']:>10.3f}{base['seconds']:>10.3f}"
+                  f"{current['seconds'] / base['seconds'] - 1:>+8.0%}{current['peak_mb']:>10.1f}"
+                  f"{base['peak_mb']:>10.1f}{current['peak_mb'] / base['peak_mb'] - 1:>+8.0%}")
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_baseline(results, seed, path=BASELINE_FILE):
+    baseline = {
+        'created': datetime.now().isoformat(timespec='seconds'), 'seed': seed,
+        'python': platform.python_version(), 'machine': platform.platform(), 'processor': platform.processor(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de tempo e memória das etapas do pipeline em dados sintéticos.")
+    parser.add_argument("--escalas", type=int, nargs='+', default=SCALES,
+                        help=f"Tamanhos dos dados em múltiplos de {BASE_BARS} velas.")
+    parser.add_argument("--semente", type=int, default=SEED, help="Semente dos dados sintéticos.")
+    parser.add_argument("--repeticoes", type=int, default=REPEATS, help="Medições de tempo por etapa na escala 1x.")
+    parser.add_argument("--backtrader-ate", type=int, default=BACKTRADER_MAX_SCALE,
+                        help="Maior escala em que o backtest do backtrader é medido.")
+    parser.add_argument("--base", default=BASELINE_FILE, help="Arquivo JSON com a base de comparação.")
+    parser.add_argument("--salvar-base", action="store_true", help="Grava os resultados como a nova base.")
+    parser.add_argument("--limite", type=float, default=TIME_THRESHOLD,
+                        help="Aumento relativo de tempo/memória considerado regressão.")
+    args = parser.parse_args()
+
+    print(f"{'Escala':>7} {'Velas':>10} {'Etapa':<22}{'Tempo (s)':>10}{'Pico (MB)':>12}")
+    results = run_benchmark(args.escalas, args.semente, args.repeticoes, args.backtrader_ate)
+
+    if args.salvar_base:
+        save_baseline(results, args.semente, args.base)
+        print(f"\nBase salva em {args.base}.")
+        raise SystemExit(0)
+
+    baseline = load_baseline(args.base)
+    if baseline is None:
+        print(f"\nSem base em {args.base}. Grave uma com --salvar-base.")
+        raise SystemExit(0)
+    if baseline.get('seed') != args.semente:
+        print(f"\nAtenção: a base foi gravada com a semente {baseline.get('seed')}.")
+    print_comparison(results, baseline['results'])
+    regressions = compare(results, baseline['results'], args.limite, args.limite)
+    if regressions:
+        print(f"\n{len(regressions)} regressão(ões) acima de {args.limite:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+    print(f"\nNenhuma regressão acima de {args.limite:.0%} em relação a {args.base} ({baseline['created']}).")
@@ -0,0 +1,48 @@
+import time
+import numpy as np
+import pandas as pd
+
+from armazenamento import load_table
+from motor_features import compute_features
+from gerador_de_sinais import compute_signals, get_trade_outcome, get_trade_outcomes
+
+# --- Arquivos ---
+INPUT_FILE = "xauusd_h1_data.parquet"
+
+# --- Parâmetros do Benchmark ---
+# Quantas vezes o histórico é repetido para simular mais anos/símbolos
+REPETICOES = [1, 10, 100]
+
+def label_with_loop(df):
+    """Rotulagem original, um sinal por vez com iterrows()."""
+    signal_indices = df[df['signal'] != 0].index
+    return [get_trade_outcome(df, i, df.at[i, 'signal']) for i in signal_indices]
+
+def run_benchmark():
+    """Compara a rotulagem com loop e a vetorizada no histórico repetido 1x, 10x e 100x."""
+    print(f"Lendo dados de {INPUT_FILE}...")
+    base = compute_signals(compute_features(load_table(INPUT_FILE, columns=['time', 'open', 'high', 'low', 'close'])))
+
+    print(f"\n{'Repetições':>10} {'Barras':>10} {'Sinais':>8} {'Loop (s)':>10} {'Vetorizado (s)':>15} {'Ganho':>8}")
+    for reps in REPETICOES:
+        df = pd.concat([base] * reps, ignore_index=True)
+        signal_indices = df[df['signal'] != 0].index
+
+        start = time.perf_counter()
+        expected = np.array(label_with_loop(df), dtype=float)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        outcomes = get_trade_outcomes(df)
+        vector_time = time.perf_counter() - start
+
+        if not np.array_equal(expected, outcomes[signal_indices], equal_nan=True):
+            raise AssertionError(f"Resultados divergentes com {reps} repetições!")
+
+        print(f"{reps:>10} {len(df):>10} {len(signal_indices):>8} {loop_time:>10.3f} "
+              f"{vector_time:>15.4f} {loop_time / vector_time:>7.0f}x")
+
+    print("\nOs resultados da versão vetorizada são idênticos aos do loop original.")
+
+if __name__ == "__main__":
+    run_benchmark()
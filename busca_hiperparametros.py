@@ -0,0 +1,198 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from armazenamento import save_table
+from backtest_vetorizado import run_backtest
+from validacao_walk_forward import CACHE_DIR, MODE, TEST_MONTHS, TRAIN_MONTHS, prepare_folds, train_fold
+from treinamento_ia import TARGET_COLUMN, train_model
+
+# --- Arquivos ---
+RESULTS_FILE = "busca_hiperparametros.parquet" # Pontuação de cada candidato em cada rodada
+
+# --- Espaço de Busca ---
+# Valores sorteados para cada hiperparâmetro, por família de modelo (ver MODEL_FAMILIES)
+SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': [100, 150, 200, 300],
+        'max_depth': [4, 6, 8, 10, None],
+        'min_samples_leaf': [1, 2, 4, 8],
+        'max_features': ['sqrt', 0.5, 1.0],
+        'class_weight': ['balanced', 'balanced_subsample', None],
+    },
+    'gradient_boosting': {
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_iter': [100, 200, 300],
+        'max_depth': [2, 3, 4, None],
+        'min_samples_leaf': [5, 10, 20],
+        'l2_regularization': [0.0, 0.1, 1.0],
+        'class_weight': ['balanced', None],
+    },
+}
+
+# --- Parâmetros da Busca ---
+N_CANDIDATES = 27   # Candidatos sorteados na primeira rodada
+ETA = 3             # A cada rodada fica 1/ETA dos candidatos, avaliados em ETA vezes mais folds
+MIN_FOLDS = 2       # Folds (os mais recentes) avaliados na primeira rodada
+TIME_BUDGET = 1800  # Segundos; ao estourar, a busca para e usa a última rodada completa
+OBJECTIVE = 'sqn'   # Métrica do backtest fora da amostra a maximizar
+OBJECTIVES = ['sqn', 'sharpe', 'calmar', 'profit_factor', 'expectancy', 'total_return']
+MAX_WORKERS = os.cpu_count() or 1
+
+def sample_candidates(count, space=SEARCH_SPACE, seed=42):
+    """Sorteia 'count' candidatos distintos, alternando entre as famílias de modelo."""
+    rng = random.Random(seed)
+    families = list(space)
+    candidates, seen = [], set()
+    for attempt in range(count * 50):
+        if len(candidates) == count:
+            break
+        family = families[len(candidates) % len(families)]
+        params = {name: rng.choice(values) for name, values in space[family].items()}
+        params['random_state'] = 42
+        key = (family, json.dumps(params, sort_keys=True))
+        if key not in seen:
+            seen.add(key)
+            candidates.append({'id': len(candidates), 'family': family, 'params': params})
+    return candidates
+
+def rung_schedule(n_candidates, n_folds, eta=ETA, min_folds=MIN_FOLDS):
+    """
+    Rodadas do successive halving como pares (candidatos, folds): a cada rodada
+    ficam ceil(n/eta) candidatos e os folds se multiplicam por eta, até a última
+    rodada usar todos os folds.
+    """
+    rungs = []
+    folds = min(min_folds, n_folds)
+    while True:
+        rungs.append((n_candidates, folds))
+        if folds >= n_folds or n_candidates == 1:
+            return rungs
+        n_candidates = math.ceil(n_candidates / eta)
+        folds = min(folds * eta, n_folds)
+
+# --- Worker ---
+def _init_worker():
+    # Um thread por processo: o paralelismo vem do pool (evita disputa de núcleos no OpenMP/BLAS)
+    threadpool_limits(limits=1)
+
+def score_candidate(bars, specs, results, objective=OBJECTIVE):
+    """
+    Backtest fora da amostra dos folds em 'specs' (consecutivos) com as previsões do
+    candidato. Retorna a pontuação (-inf se a métrica não existir, ex.: poucos trades),
+    as métricas do backtest e a acurácia média nos folds.
+    """
+    start, end = specs[0]['test_start'], specs[-1]['test_end']
+    prediction = np.zeros(len(bars), dtype=np.int64)
+    for spec in specs:
+        result = results[spec['fold']]
+        prediction[result['test_rows']] = result['predictions']
+    window = bars.iloc[start:end].assign(prediction=prediction[start:end])
+    metrics = run_backtest(window)['metrics']
+    value = metrics.get(objective)
+    score = -math.inf if value is None or (isinstance(value, float) and math.isnan(value)) else float(value)
+    accuracy = np.nanmean([results[spec['fold']]['accuracy'] for spec in specs])
+    return score, metrics, accuracy
+
+# --- Busca ---
+def run_search(n_candidates=N_CANDIDATES, eta=ETA, time_budget=TIME_BUDGET, objective=OBJECTIVE,
+               max_workers=MAX_WORKERS, seed=42, train_months=TRAIN_MONTHS, test_months=TEST_MONTHS,
+               mode=MODE, cache_dir=CACHE_DIR):
+    """
+    Successive halving sobre os folds walk-forward: todos os candidatos são
+    avaliados nos folds mais recentes, os melhores pelo objetivo de trading seguem
+    para mais folds. Cada par (candidato, fold) é treinado uma única vez em um
+    processo do pool, que abre as matrizes do fold com memory-map. Retorna o
+    vencedor (ou None) e a tabela com a pontuação de cada rodada.
+    """
+    bars, specs = prepare_folds(train_months, test_months, mode, cache_dir)
+    if not specs:
+        print("Histórico curto demais para a configuração de folds escolhida.")
+        return None, pd.DataFrame()
+
+    candidates = sample_candidates(n_candidates, seed=seed)
+    rungs = rung_schedule(len(candidates), len(specs), eta)
+    print(f"{len(candidates)} candidatos; rodadas (candidatos, folds): {rungs}; "
+          f"objetivo '{objective}'; limite de {time_budget}s com {max_workers} processo(s).")
+
+    deadline = time.perf_counter() + time_budget
+    fold_results = {c['id']: {} for c in candidates} # Previsões já treinadas, reaproveitadas entre rodadas
+    alive, best, rows = candidates, None, []
+    pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+    timed_out = False
+    try:
+        for rung, (keep, n_folds) in enumerate(rungs):
+            alive = alive[:keep]
+            rung_specs = specs[-n_folds:] # Os folds mais recentes (janela de teste contínua)
+            tasks = {pool.submit(train_fold, dict(spec, family=c['family'], params=c['params'])): c['id']
+                     for c in alive for spec in rung_specs if spec['fold'] not in fold_results[c['id']]}
+            timeout = max(deadline - time.perf_counter(), 0)
+            done, pending = wait(tasks, timeout=timeout)
+            if pending:
+                timed_out = True
+                print(f"Limite de tempo atingido na rodada {rung}; "
+                      + ("usando a última rodada completa." if best else "nenhuma rodada foi completada."))
+                break
+            for future in done:
+                result = future.result()
+                fold_results[tasks[future]][result['fold']] = result
+
+            scored = []
+            for c in alive:
+                score, metrics, accuracy = score_candidate(bars, rung_specs, fold_results[c['id']], objective)
+                scored.append((score, accuracy, c))
+                rows.append({'rung': rung, 'id': c['id'], 'family': c['family'],
+                             'params': json.dumps(c['params'], sort_keys=True), 'folds': n_folds,
+                             'score': score, 'accuracy': accuracy, 'total_trades': metrics['total_trades'],
+                             'total_return': metrics['total_return'], 'max_drawdown': metrics['max_drawdown']})
+            # Empate no objetivo (ex.: -inf por falta de trades) é decidido pela acurácia
+            scored.sort(key=lambda item: (item[0], np.nan_to_num(item[1], nan=-1.0)), reverse=True)
+            alive = [c for _, _, c in scored]
+            best = dict(scored[0][2], score=scored[0][0], accuracy=scored[0][1], folds=n_folds, rung=rung)
+            print(f"Rodada {rung}: {len(scored)} candidatos em {n_folds} folds; melhor "
+                  f"#{best['id']} ({best['family']}) {objective} = {best['score']:.4f}")
+    finally:
+        # No limite de tempo, as tarefas na fila são canceladas e a busca retorna sem
+        # esperar as que já estão rodando (elas terminam em segundo plano e o processo
+        # só sai depois delas). Fora isso, espera os processos normalmente
+        pool.shutdown(wait=not timed_out, cancel_futures=True)
+
+    return best, pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca de hiperparâmetros do modelo de IA (successive halving).")
+    parser.add_argument("--candidatos", type=int, default=N_CANDIDATES, help="Candidatos na primeira rodada.")
+    parser.add_argument("--eta", type=int, default=ETA, help="Fator de corte entre as rodadas.")
+    parser.add_argument("--tempo", type=float, default=TIME_BUDGET, help="Limite de tempo da busca, em segundos. O resultado sai no limite; "
+                        "treinos já em andamento terminam antes de o processo encerrar.")
+    parser.add_argument("--objetivo", default=OBJECTIVE, choices=OBJECTIVES,
+                        help="Métrica do backtest fora da amostra a maximizar.")
+    parser.add_argument("--processos", type=int, default=MAX_WORKERS, help="Número de processos.")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do sorteio dos candidatos.")
+    parser.add_argument("--sem-salvar", action="store_true", help="Só mostra o vencedor, sem treinar o modelo final.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    best, table = run_search(args.candidatos, args.eta, args.tempo, args.objetivo, args.processos, args.semente)
+    if best is None:
+        raise SystemExit(1)
+    save_table(table, RESULTS_FILE)
+    print(f"\nBusca concluída em {time.perf_counter() - start:.1f}s; rodadas salvas em {RESULTS_FILE}.")
+    print(f"Vencedor: #{best['id']} {best['family']} {best['params']}")
+    print(f"{args.objetivo} fora da amostra ({best['folds']} folds): {best['score']:.4f} | "
+          f"acurácia média: {best['accuracy']:.2%}")
+
+    if not args.sem_salvar:
+        # Modelo final: mesmos hiperparâmetros, treinado com todos os dados (simulados + reais)
+        train_model(TARGET_COLUMN, best['family'], best['params'], info={'search': {
+            'objective': args.objetivo, 'score': best['score'], 'folds': best['folds'],
+            'oos_accuracy': best['accuracy'], 'candidates': len(table['id'].unique()),
+        }})
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Mesmo formato de registro retornado pelo MetaTrader5.copy_rates_*
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+# Quantas velas são pedidas em uma atualização normal: a vela em formação,
+# a que acabou de fechar e a última já guardada (para conferir a sobreposição)
+DELTA_BARS = 3
+
+class BarRingBuffer:
+    """
+    Cache de tamanho fixo das últimas velas fechadas de um símbolo, guardadas em um
+    array estruturado do NumPy usado como buffer circular.
+
+    A cada refresh() só as velas mais novas que a última guardada são pedidas ao
+    terminal. A vela ainda em formação (posição 0 no MT5) fica separada em
+    'forming' e só entra no buffer depois de fechar. Se a última vela guardada não
+    aparece na resposta, ou mudou, o cache é ressincronizado por completo.
+    """
+
+    def __init__(self, terminal, symbol, timeframe, capacity=300):
+        self.terminal = terminal
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=RATES_DTYPE)
+        self._start = 0
+        self._size = 0
+        self.forming = None
+        self.resyncs = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_time(self):
+        """Horário (segundos desde a época) da última vela fechada guardada, ou None."""
+        if self._size == 0:
+            return None
+        return int(self._data[(self._start + self._size - 1) % self.capacity]['time'])
+
+    def _fetch(self, count):
+        rates = self.terminal.copy_rates_from_pos(self.symbol, self.timeframe, 0, count)
+        if rates is None or len(rates) == 0:
+            return None
+        return np.asarray(rates).astype(RATES_DTYPE, copy=False)
+
+    def _append(self, bars):
+        """Acrescenta velas fechadas, descartando as mais antigas quando o buffer enche."""
+        bars = bars[-self.capacity:]
+        n = len(bars)
+        end = self._start + self._size
+        positions = (end + np.arange(n)) % self.capacity
+        self._data[positions] = bars
+        overflow = max(0, self._size + n - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self.capacity, self._size + n)
+
+    def resync(self):
+        """Descarta o cache e recarrega 'capacity' velas fechadas do terminal."""
+        rates = self._fetch(self.capacity + 1)
+        self._start = self._size = 0
+        self.forming = None
+        self.resyncs += 1
+        if rates is None:
+            return 0
+        self._append(rates[:-1])
+        self.forming = rates[-1].copy()
+        return len(rates) - 1
+
+    def refresh(self):
+        """
+        Atualiza o cache pedindo ao terminal apenas as velas novas.
+        Retorna o número de velas que fecharam desde a última atualização.
+        """
+        last_time = self.last_time
+        if last_time is None:
+            return self.resync()
+
+        count = DELTA_BARS
+        while True:
+            rates = self._fetch(count)
+            if rates is None:
+                return 0
+            closed, forming = rates[:-1], rates[-1]
+            if len(closed) and closed['time'][0] <= last_time:
+                break
+            if count > self.capacity:
+                # A última vela guardada não aparece mais no histórico: buraco nos dados
+                return self.resync()
+            count *= 4 # Várias velas fecharam desde a última atualização (ex: robô parado)
+
+        # Confere a sobreposição: a última vela guardada deve continuar igual
+        overlap = closed[closed['time'] == last_time]
+        stored = self._data[(self._start + self._size - 1) % self.capacity]
+        if len(overlap) == 0 or any(overlap[0][f] != stored[f] for f in ('open', 'high', 'low', 'close')):
+            return self.resync()
+
+        new_bars = closed[closed['time'] > last_time]
+        if len(new_bars):
+            self._append(new_bars)
+        self.forming = forming.copy()
+        return len(new_bars)
+
+    def closed(self, count=None):
+        """As últimas 'count' velas fechadas (todas por padrão), em ordem cronológica."""
+        count = self._size if count is None else min(count, self._size)
+        first = self._start + self._size - count
+        return self._data[np.arange(first, first + count) % self.capacity]
@@ -1,35 +1,39 @@
-import pandas as pd
+from armazenamento import load_table, save_table
+from motor_features import FEATURES, PATTERN_FEATURES, compute_features
 
 # --- Arquivos ---
-INPUT_FILE = "xauusd_h1_data.csv"
-OUTPUT_FILE = "dados_com_indicadores.csv"
+INPUT_FILE = "xauusd_h1_data.parquet"
+OUTPUT_FILE = "dados_com_indicadores.parquet"
 
 def calculate_indicators():
     """
-    Lê os dados brutos e salva apenas as colunas OHLCV e tick_volume em um novo arquivo CSV.
+    Lê os dados brutos, calcula as features com o motor de features compartilhado
+    (pivots, EMAs, ATR, padrões de vela, hora e sessões) e salva em um novo arquivo.
     """
     print(f"Lendo dados de {INPUT_FILE}...")
     try:
-        df = pd.read_csv(INPUT_FILE, parse_dates=['time'])
+        df = load_table(INPUT_FILE, columns=['time', 'open', 'high', 'low', 'close', 'tick_volume', 'real_volume'])
     except FileNotFoundError:
         print(f"Erro: Arquivo '{INPUT_FILE}' não encontrado.")
         print("Por favor, execute o script 'coleta_dados.py' primeiro.")
         return
 
-    print("Preparando dados brutos para backtest...")
+    print("Calculando features...")
 
-    # Seleciona apenas as colunas necessárias para o backtest (OHLCV + tick_volume)
-    df_output = df[['time', 'open', 'high', 'low', 'close', 'tick_volume']]
+    # Remove quaisquer linhas com valores NaN nos dados brutos
+    df = df.dropna().reset_index(drop=True)
 
-    # Remove quaisquer linhas com valores NaN
-    df_output.dropna(inplace=True)
+    # As primeiras velas (e as segundas-feiras, sem pivots do dia anterior) ficam
+    # com NaN nas features; elas são mantidas para o backtest ter o histórico completo.
+    # As máscaras de padrões de vela (cdl_bull/cdl_bear) ficam disponíveis para as regras de sinal
+    df_output = compute_features(df, FEATURES + PATTERN_FEATURES)
 
     # --- Salvando o resultado ---
     try:
-        df_output.to_csv(OUTPUT_FILE, index=False)
+        save_table(df_output, OUTPUT_FILE)
         print(f"\nSucesso! {len(df_output)} registros processados e salvos em: {OUTPUT_FILE}")
     except Exception as e:
-        print(f"Ocorreu um erro ao salvar o arquivo CSV: {e}")
+        print(f"Ocorreu um erro ao salvar o arquivo: {e}")
 
 if __name__ == "__main__":
     calculate_indicators()
\ No newline at end of file
@@ -1,20 +1,44 @@
 import MetaTrader5 as mt5
 import pandas as pd
+import argparse
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+from armazenamento import load_table, save_table, export_csv
+
 # --- Parâmetros ---
 SYMBOL = "XAUUSD"
 TIMEFRAME = mt5.TIMEFRAME_H1
 YEARS_OF_DATA = 5
 
 # --- Nome do Arquivo de Saída ---
-# --- Nome do Arquivo de Saída ---
-OUTPUT_FILE = f"xauusd_h1_data.csv"
+OUTPUT_FILE = f"xauusd_h1_data.parquet"
+
+# --- Armazenamento Incremental (particionado por mês) ---
+# Estrutura: dados_mercado/<SÍMBOLO>/<TIMEFRAME>/<AAAA-MM>.parquet
+STORE_DIR = "dados_mercado"
+TIMEFRAMES = {
+    'M1': (mt5.TIMEFRAME_M1, timedelta(minutes=1)),
+    'M5': (mt5.TIMEFRAME_M5, timedelta(minutes=5)),
+    'M15': (mt5.TIMEFRAME_M15, timedelta(minutes=15)),
+    'H1': (mt5.TIMEFRAME_H1, timedelta(hours=1)),
+    'H4': (mt5.TIMEFRAME_H4, timedelta(hours=4)),
+    'D1': (mt5.TIMEFRAME_D1, timedelta(days=1)),
+}
+# Buracos: tempo sem barras (descontados sábados e domingos) maior que GAP_BARS
+# velas do timeframe ou que MIN_GAP, o que for maior (a pausa diária do ouro é de ~1h)
+GAP_BARS = 3
+MIN_GAP = timedelta(hours=2)
+# Tamanho de cada bloco baixado em paralelo e número de blocos simultâneos
+CHUNK_DAYS = 90
+MAX_WORKERS = 4
 
 def collect_data():
     """
     Conecta ao MetaTrader 5, baixa o histórico de preços para um símbolo
-    e o salva em um arquivo CSV.
+    e o salva no armazenamento do pipeline (Parquet).
     """
     print("Iniciando processo de coleta de dados...")
 
@@ -52,13 +76,234 @@ def collect_data():
     # Remove a coluna 'spread' se ela existir, pois geralmente não é útil para análise de backtest
     if 'spread' in df.columns:
         df = df.drop(columns=['spread'])
-        
-    # Salva em um arquivo CSV
+
+    # Salva no formato binário colunar
     try:
-        df.to_csv(OUTPUT_FILE, index=False)
+        save_table(df, OUTPUT_FILE)
         print(f"\nSucesso! {len(df)} registros de dados foram salvos em: {OUTPUT_FILE}")
     except Exception as e:
-        print(f"Ocorreu um erro ao salvar o arquivo CSV: {e}")
+        print(f"Ocorreu um erro ao salvar o arquivo: {e}")
+
+# --- COLETA INCREMENTAL ---
+class OverlapError(Exception):
+    """A última barra armazenada não voltou igual na resposta do terminal: as barras novas não são gravadas."""
+
+def partition_dir(symbol, timeframe_name, store_dir=STORE_DIR):
+    """Diretório das partições mensais de um símbolo/timeframe."""
+    return os.path.join(store_dir, symbol, timeframe_name)
+
+def list_partitions(symbol, timeframe_name, store_dir=STORE_DIR):
+    """Lista os arquivos de partição em ordem cronológica."""
+    return sorted(glob.glob(os.path.join(partition_dir(symbol, timeframe_name, store_dir), "*.parquet")))
+
+def last_stored_bar(symbol, timeframe_name, store_dir=STORE_DIR):
+    """Retorna a última barra armazenada (lendo só a última partição) ou None."""
+    partitions = list_partitions(symbol, timeframe_name, store_dir)
+    if not partitions:
+        return None
+    bars = load_table(partitions[-1], columns=['time', 'open', 'high', 'low', 'close'], policy=False)
+    return bars.loc[bars['time'].idxmax()] if len(bars) else None
+
+def overlap_confirmed(df, last_bar):
+    """A última barra armazenada veio na resposta com os mesmos preços."""
+    if df.empty:
+        return False
+    overlap = df[df['time'] == last_bar['time']]
+    return len(overlap) > 0 and all(overlap[c].iloc[0] == last_bar[c] for c in ('open', 'high', 'low', 'close'))
+
+def fetch_range(symbol, timeframe, start_date, end_date, chunk_days=CHUNK_DAYS, max_workers=MAX_WORKERS):
+    """
+    Baixa as barras entre start_date e end_date. Períodos longos são divididos em
+    blocos de chunk_days dias, baixados em paralelo e depois unidos sem duplicatas.
+    """
+    chunks = []
+    chunk_start = start_date
+    while chunk_start < end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+
+    def fetch(chunk):
+        rates = mt5.copy_rates_range(symbol, timeframe, chunk[0], chunk[1])
+        return pd.DataFrame(rates) if rates is not None and len(rates) else None
+
+    if len(chunks) > 1 and max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(fetch, chunks))
+    else:
+        frames = [fetch(chunk) for chunk in chunks]
+
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+
+    # Os limites dos blocos são inclusivos, então a mesma barra pode vir duas vezes
+    df = pd.concat(frames, ignore_index=True).drop_duplicates(subset='time', keep='last')
+    df['time'] = pd.to_datetime(df['time'], unit='s')
+    return df.sort_values('time').reset_index(drop=True)
+
+def gap_threshold(bar_length):
+    """Maior intervalo sem barras aceito em um timeframe (ver GAP_BARS e MIN_GAP)."""
+    return max(GAP_BARS * bar_length, MIN_GAP)
+
+def weekday_time(start, end):
+    """Tempo entre start e end sem contar sábados e domingos."""
+    total = end - start
+    day = start.normalize()
+    while day < end:
+        if day.dayofweek >= 5:
+            total -= min(end, day + pd.Timedelta(days=1)) - max(start, day)
+        day += pd.Timedelta(days=1)
+    return total
+
+def find_gaps(times, bar_length=timedelta(hours=1)):
+    """
+    Retorna os pares (antes, depois) de barras consecutivas com um buraco entre
+    elas: tempo sem barras, fora o fim de semana, acima de gap_threshold(bar_length).
+    """
+    times = pd.Series(times).reset_index(drop=True)
+    threshold = gap_threshold(bar_length)
+    missing = times.diff() - bar_length # Tempo sem barras entre uma vela e a seguinte
+    candidates = missing[missing > threshold].index
+    return [(times[i - 1], times[i]) for i in candidates
+            if weekday_time(times[i - 1] + bar_length, times[i]) > threshold]
+
+def append_partitions(df, symbol, timeframe_name, store_dir=STORE_DIR):
+    """
+    Acrescenta as barras às partições mensais. Apenas as partições dos meses
+    presentes em df são lidas e regravadas (normalmente só o mês corrente).
+    """
+    directory = partition_dir(symbol, timeframe_name, store_dir)
+    os.makedirs(directory, exist_ok=True)
+    for month, part in df.groupby(df['time'].dt.strftime('%Y-%m')):
+        path = os.path.join(directory, f"{month}.parquet")
+        if os.path.exists(path):
+            part = pd.concat([load_table(path, policy=False), part], ignore_index=True)
+            part = part.drop_duplicates(subset='time', keep='last').sort_values('time')
+        save_table(part, path)
+
+def update_store(symbol=SYMBOL, timeframe_name='H1', store_dir=STORE_DIR,
+                 chunk_days=CHUNK_DAYS, max_workers=MAX_WORKERS, now=None):
+    """
+    Atualiza o armazenamento particionado de forma incremental: busca apenas as
+    barras mais novas que a última armazenada, confere a sobreposição e os buracos,
+    e grava somente as barras fechadas.
+    Se a última barra armazenada não vier igual na resposta, busca de novo uma vez;
+    se ainda não vier, lança OverlapError sem gravar nada.
+    Retorna o número de barras novas acrescentadas.
+    """
+    timeframe, bar_length = TIMEFRAMES[timeframe_name]
+    now = now or datetime.now()
+    last_bar = last_stored_bar(symbol, timeframe_name, store_dir)
+    last_time = None if last_bar is None else last_bar['time']
+
+    if last_time is None:
+        start_date = now - timedelta(days=365 * YEARS_OF_DATA)
+        print(f"Nenhum dado armazenado para {symbol} {timeframe_name}. Baixando desde {start_date.date()}...")
+    else:
+        # Começa na última barra armazenada para verificar a sobreposição
+        start_date = last_time.to_pydatetime()
+        print(f"Última barra armazenada de {symbol} {timeframe_name}: {last_time}. Buscando barras novas...")
+
+    df = fetch_range(symbol, timeframe, start_date, now, chunk_days, max_workers)
+    if last_bar is not None and not overlap_confirmed(df, last_bar):
+        print(f"Aviso: a barra {last_time} não veio igual na resposta; buscando de novo...")
+        df = fetch_range(symbol, timeframe, start_date, now, chunk_days, max_workers=1)
+        if not overlap_confirmed(df, last_bar):
+            raise OverlapError(
+                f"{symbol} {timeframe_name}: a barra armazenada {last_time} não confere com o terminal "
+                f"(histórico alterado ou resposta incompleta). Nada foi gravado; apague a partição "
+                f"{os.path.basename(list_partitions(symbol, timeframe_name, store_dir)[-1])} para baixá-la de novo.")
+    if df.empty:
+        print(f"Nenhuma barra retornada para {symbol} {timeframe_name}.")
+        return 0
+
+    # A barra ainda em formação não é armazenada. Ela é a última da resposta: as barras
+    # vêm no horário do servidor, que pode estar atrás do relógio local, então 'now' não
+    # serve para separá-la. Se o mercado estiver fechado, a última barra só fica para a
+    # próxima execução (que a busca a partir da última armazenada)
+    df = df.iloc[:-1]
+    if 'spread' in df.columns:
+        df = df.drop(columns=['spread'])
+
+    if last_time is not None:
+        df = df[df['time'] > last_time]
+
+    # Buracos nas barras novas e entre a última armazenada e a primeira nova
+    times = df['time'] if last_time is None else pd.concat([pd.Series([last_time]), df['time']])
+    for before, after in find_gaps(times, bar_length):
+        print(f"Aviso: buraco nos dados entre {before} e {after}.")
+
+    if df.empty:
+        print(f"{symbol} {timeframe_name} já está atualizado.")
+        return 0
+
+    append_partitions(df, symbol, timeframe_name, store_dir)
+    print(f"{len(df)} barras novas de {symbol} {timeframe_name} salvas em {partition_dir(symbol, timeframe_name, store_dir)}")
+    return len(df)
+
+def load_store(symbol=SYMBOL, timeframe_name='H1', store_dir=STORE_DIR, start=None, end=None, policy=True):
+    """
+    Lê as partições (opcionalmente só as do intervalo start/end) em um único DataFrame.
+    policy=False mantém os tipos gravados (para regravar os dados, ver load_table).
+    """
+    partitions = list_partitions(symbol, timeframe_name, store_dir)
+    if start is not None:
+        partitions = [p for p in partitions if os.path.basename(p)[:7] >= pd.Timestamp(start).strftime('%Y-%m')]
+    if end is not None:
+        partitions = [p for p in partitions if os.path.basename(p)[:7] <= pd.Timestamp(end).strftime('%Y-%m')]
+    if not partitions:
+        return pd.DataFrame()
+    df = pd.concat([load_table(p, policy=policy) for p in partitions], ignore_index=True)
+    if start is not None:
+        df = df[df['time'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['time'] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+def collect_incremental(symbols, timeframe_name='H1', consolidate=False):
+    """Atualiza o armazenamento incremental de cada símbolo em uma única conexão."""
+    print("Iniciando coleta incremental de dados...")
+    if not mt5.initialize():
+        print("Falha na inicialização do MetaTrader 5. Verifique se o terminal está aberto.")
+        mt5.shutdown()
+        return
+
+    failed = []
+    try:
+        for symbol in symbols:
+            try:
+                update_store(symbol, timeframe_name)
+            except OverlapError as e:
+                print(f"ERRO: {e}")
+                failed.append(symbol)
+    finally:
+        mt5.shutdown()
+        print("Conexão com o MetaTrader 5 encerrada.")
+    if failed:
+        raise SystemExit(f"Coleta interrompida para: {', '.join(failed)}.")
+
+    if consolidate:
+        df = load_store(symbols[0], timeframe_name, policy=False)
+        save_table(df, OUTPUT_FILE)
+        print(f"{len(df)} registros consolidados em: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    collect_data()
+    parser = argparse.ArgumentParser(description="Coleta de dados históricos do MetaTrader 5.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Baixa só as barras novas e grava em partições mensais.")
+    parser.add_argument("--simbolos", nargs="+", default=[SYMBOL])
+    parser.add_argument("--timeframe", default="H1", choices=sorted(TIMEFRAMES))
+    parser.add_argument("--consolidar", action="store_true",
+                        help=f"No modo incremental, grava o primeiro símbolo em {OUTPUT_FILE} para as próximas etapas.")
+    parser.add_argument("--exportar-csv", action="store_true",
+                        help=f"Exporta também {OUTPUT_FILE} em CSV.")
+    args = parser.parse_args()
+
+    if args.incremental:
+        collect_incremental(args.simbolos, args.timeframe, args.consolidar)
+    else:
+        collect_data()
+
+    if args.exportar_csv and os.path.exists(OUTPUT_FILE):
+        print(f"Exportado para: {export_csv(OUTPUT_FILE)}")
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from armazenamento import exists, load_table, save_table
+
+# --- Arquivos ---
+JOURNAL_FILE = "diario_trades.db"
+# Arquivos usados antes do diário (importados uma única vez por migrate())
+LEGACY_OPEN_TRADES_FILE = "trades_abertos.json"
+LEGACY_HISTORY_FILE = "historico_trades_executados.parquet"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS open_trades (
+    ticket     INTEGER PRIMARY KEY,
+    symbol     TEXT,
+    opened_at  TEXT,
+    features   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS closed_trades (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket     INTEGER UNIQUE,
+    symbol     TEXT,
+    opened_at  TEXT,
+    closed_at  TEXT,
+    profit     REAL,
+    target     INTEGER NOT NULL,
+    features   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL
+);
+"""
+
+def server_time(epoch):
+    """
+    Horário de opened_at/closed_at: segundos desde a época no horário do servidor MT5
+    (o mesmo dos deals e das velas), em ISO com fuso UTC, como o MT5 os interpreta.
+    """
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat(timespec='seconds')
+
+def _now():
+    # Só para quem não informa o horário: relógio local, sem a diferença para o servidor
+    return server_time(time.time())
+
+class TradeJournal:
+    """
+    Diário transacional do robô em SQLite (modo WAL): trades abertos (por ticket),
+    trades fechados com as features e o resultado, e o cursor do processamento de
+    deals. Cada abertura/fechamento é uma transação curta, então uma queda no meio
+    da escrita nunca deixa o estado corrompido. A conexão só é aberta no primeiro uso.
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL") # Seguro com WAL; o fsync fica para o checkpoint
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --- Trades Abertos ---
+    def add_open_trade(self, ticket, features, symbol=None, opened_at=None):
+        """
+        Registra (ou substitui) o trade aberto 'ticket' com as features usadas pela IA.
+        'opened_at' vem de server_time() com o relógio do robô (o virtual, no replay).
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO open_trades (ticket, symbol, opened_at, features) VALUES (?, ?, ?, ?)",
+                (int(ticket), symbol, opened_at or _now(), json.dumps(features, default=float)))
+
+    def get_open_trade(self, ticket):
+        """Features do trade aberto 'ticket' (None se não estiver aberto)."""
+        row = self.conn.execute("SELECT features FROM open_trades WHERE ticket = ?", (int(ticket),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def open_trades(self):
+        """Todos os trades abertos, como {ticket: features}."""
+        return {ticket: json.loads(features) for ticket, features in
+                self.conn.execute("SELECT ticket, features FROM open_trades ORDER BY ticket")}
+
+    def has_open_trades(self):
+        return self.conn.execute("SELECT EXISTS (SELECT 1 FROM open_trades)").fetchone()[0] == 1
+
+    def close_trade(self, ticket, target, profit=None, closed_at=None, cursor=None):
+        """
+        Move o trade 'ticket' de aberto para fechado com o resultado ('target': 1 =
+        lucro, 0 = prejuízo/breakeven) e, na mesma transação, avança o cursor de
+        deals se informado. Retorna False se o ticket não estava aberto.
+        """
+        with self.conn:
+            row = self.conn.execute("SELECT symbol, opened_at, features FROM open_trades WHERE ticket = ?",
+                                    (int(ticket),)).fetchone()
+            if row is None:
+                return False
+            self.conn.execute(
+                "INSERT OR IGNORE INTO closed_trades (ticket, symbol, opened_at, closed_at, profit, target, features) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (int(ticket), row[0], row[1], closed_at or _now(), profit, int(target), row[2]))
+            self.conn.execute("DELETE FROM open_trades WHERE ticket = ?", (int(ticket),))
+            if cursor is not None:
+                self._set_state('deal_cursor', cursor)
+        return True
+
+    # --- Cursor de Deals ---
+    def _set_state(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def get_state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_state(self, key, value):
+        with self.conn:
+            self._set_state(key, value)
+
+    def get_cursor(self):
+        """Último deal processado (o formato é definido por quem processa os deals); None no início."""
+        return self.get_state('deal_cursor')
+
+    def set_cursor(self, cursor):
+        self.set_state('deal_cursor', cursor)
+
+    # --- Histórico ---
+    def closed_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM closed_trades").fetchone()[0]
+
+    def history_frame(self, after_id=0):
+        """
+        Trades fechados na ordem de fechamento, uma coluna por feature mais 'target'
+        (o mesmo formato do antigo historico_trades_executados), pronto para o treino.
+        O índice é o id do trade em closed_trades; after_id filtra só os posteriores.
+        """
+        rows = self.conn.execute("SELECT id, features, target FROM closed_trades WHERE id > ? ORDER BY id",
+                                 (int(after_id),)).fetchall()
+        df = pd.DataFrame([json.loads(features) for _, features, _ in rows],
+                          index=pd.Index([id_ for id_, _, _ in rows], name='id', dtype='int64'))
+        df['target'] = [target for _, _, target in rows]
+        return df
+
+    # --- Migração ---
+    def migrate(self, open_trades_file=LEGACY_OPEN_TRADES_FILE, history_file=LEGACY_HISTORY_FILE):
+        """
+        Importa, uma única vez, o trades_abertos.json e o histórico de trades
+        (Parquet/CSV) para o diário. Os arquivos antigos não são alterados.
+        Retorna (trades abertos importados, trades fechados importados).
+        """
+        if self.get_state('migrated_at') is not None:
+            return 0, 0
+
+        open_trades = {}
+        if os.path.exists(open_trades_file):
+            try:
+                with open(open_trades_file, 'r') as f:
+                    open_trades = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Aviso: '{open_trades_file}' está corrompido; trades abertos não importados.")
+        history = load_table(history_file, policy=False) if exists(history_file) else pd.DataFrame()
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO open_trades (ticket, opened_at, features) VALUES (?, ?, ?)",
+                [(int(ticket), None, json.dumps(features)) for ticket, features in open_trades.items()])
+            # O histórico antigo não guardava o ticket: as linhas entram sem ele, na ordem do arquivo
+            features = history.drop(columns=['target'], errors='ignore')
+            self.conn.executemany(
+                "INSERT INTO closed_trades (target, features) VALUES (?, ?)",
+                [(int(target), json.dumps(row, default=str)) for target, row in
+                 zip(history.get('target', []), features.to_dict(orient='records'))])
+            self._set_state('migrated_at', _now())
+        return len(open_trades), len(history)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diário de trades do robô (SQLite).")
+    parser.add_argument("--migrar", action="store_true",
+                        help=f"Importa {LEGACY_OPEN_TRADES_FILE} e {LEGACY_HISTORY_FILE} para o diário.")
+    parser.add_argument("--exportar", default=None, help="Exporta os trades fechados para uma tabela (.parquet/.csv).")
+    args = parser.parse_args()
+
+    journal = TradeJournal()
+    if args.migrar:
+        n_open, n_closed = journal.migrate()
+        print(f"Migração: {n_open} trade(s) aberto(s) e {n_closed} trade(s) fechado(s) importados.")
+    if args.exportar:
+        save_table(journal.history_frame(), args.exportar)
+        print(f"Histórico exportado para {args.exportar}.")
+    print(f"{JOURNAL_FILE}: {len(journal.open_trades())} trade(s) aberto(s), "
+          f"{journal.closed_count()} trade(s) fechado(s), cursor de deals: {journal.get_cursor()}")
+    journal.close()
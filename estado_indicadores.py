@@ -0,0 +1,250 @@
+import json
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import talib as ta
+
+from motor_features import FEATURES, SESSIONS, compute_features
+from padroes_candle import PATTERN_WINDOW, scan_patterns
+
+# Quantas velas são mantidas para os padrões de vela do TA-Lib
+# (o CDLHAMMER precisa de 11: médias de 10 velas + a vela atual; a família
+# completa do padroes_candle, PATTERN_WINDOW)
+CANDLE_WINDOW = max(16, PATTERN_WINDOW)
+
+# Colunas comparadas com o cálculo em lote (motor_features)
+CHECK_COLUMNS = ['pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3', 'ema50', 'ema200', 'atr14',
+                 'engulfing', 'hammer', 'hour', 'day_of_week', 'cdl_bull', 'cdl_bear'] + list(SESSIONS)
+
+def _field(bar, name, default):
+    """Lê um campo de dict, linha de DataFrame ou registro numpy, com valor padrão."""
+    try:
+        return bar[name]
+    except (KeyError, ValueError, IndexError):
+        return default
+
+def _to_timestamp(value):
+    """Aceita segundos desde a época (formato do MT5) ou datetime."""
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return pd.Timestamp(int(value), unit='s')
+    return pd.Timestamp(value)
+
+class IndicatorState:
+    """
+    Estado incremental dos indicadores do robô: EMAs, ATR, pivots do dia anterior,
+    padrões de vela e sessões. Cada vela fechada é aplicada com update() em tempo
+    constante, reproduzindo os valores do motor_features (TA-Lib) sobre o mesmo histórico.
+    """
+
+    def __init__(self, features=FEATURES):
+        self.ema_periods = {name: p['period'] for name, kind, p in features if kind == 'ema'}
+        self.atr_periods = {name: p['period'] for name, kind, p in features if kind == 'atr'}
+        self.patterns = {name: p['function'] for name, kind, p in features if kind == 'cdl'}
+        self.pattern_bits = any(kind == 'cdl_bits' for _, kind, _ in features)
+
+        self.last_time = None
+        self.count = 0
+        self.prev_close = None
+        # EMA: valor atual ou, durante o aquecimento, a soma das primeiras velas
+        self.ema = {name: None for name in self.ema_periods}
+        self.ema_seed = {name: 0.0 for name in self.ema_periods}
+        # ATR: valor atual ou, durante o aquecimento, a soma dos primeiros True Ranges
+        self.atr = {name: None for name in self.atr_periods}
+        self.atr_seed = {name: 0.0 for name in self.atr_periods}
+        # Dia corrente e dia anterior (data, máxima, mínima, fechamento)
+        self.day = None
+        self.prev_day = None
+        self.candles = deque(maxlen=CANDLE_WINDOW)
+        self.values = {}
+
+    # --- Atualização ---
+    def update(self, bar):
+        """
+        Aplica uma vela fechada (dict, linha de DataFrame ou registro do MT5 com
+        time/open/high/low/close) e retorna o dict de features dessa vela.
+        Velas com horário igual ou anterior à última aplicada são ignoradas.
+        """
+        time = _to_timestamp(bar['time'])
+        if self.last_time is not None and time <= self.last_time:
+            return self.values
+        o, h, l, c = (float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close']))
+
+        self._update_pivots(time, h, l, c)
+        self._update_ema(c)
+        self._update_atr(h, l, c)
+        self.candles.append((o, h, l, c))
+
+        self.count += 1
+        self.prev_close = c
+        self.last_time = time
+        self.values = self._snapshot(bar, time, o, h, l, c)
+        return self.values
+
+    def _update_ema(self, close):
+        # Mesmo cálculo do TA-Lib: semente = média simples das primeiras 'period' velas
+        for name, period in self.ema_periods.items():
+            if self.ema[name] is not None:
+                k = 2.0 / (period + 1)
+                self.ema[name] = ((close - self.ema[name]) * k) + self.ema[name]
+            else:
+                self.ema_seed[name] += close
+                if self.count + 1 == period:
+                    self.ema[name] = self.ema_seed[name] / period
+
+    def _update_atr(self, high, low, close):
+        if self.prev_close is None:
+            return # o primeiro True Range precisa do fechamento anterior
+        true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        # Mesmo cálculo do TA-Lib: média simples dos primeiros TRs e depois suavização de Wilder
+        for name, period in self.atr_periods.items():
+            if self.atr[name] is not None:
+                self.atr[name] = (self.atr[name] * (period - 1) + true_range) / period
+            else:
+                self.atr_seed[name] += true_range
+                if self.count == period:
+                    self.atr[name] = self.atr_seed[name] / period
+
+    def _update_pivots(self, time, high, low, close):
+        date = time.normalize()
+        if self.day is None or date != self.day[0]:
+            # Virada de dia: o dia corrente passa a ser o "dia anterior"
+            self.prev_day = self.day
+            self.day = [date, high, low, close]
+        else:
+            self.day[1] = max(self.day[1], high)
+            self.day[2] = min(self.day[2], low)
+            self.day[3] = close
+
+    def _pivots(self):
+        # Só vale se o dia anterior de calendário teve negociação (mesma regra do motor_features)
+        if self.prev_day is None or self.prev_day[0] != self.day[0] - pd.Timedelta(days=1):
+            return {name: np.nan for name in ('pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3')}
+        _, prev_high, prev_low, prev_close = self.prev_day
+        pivot = (prev_high + prev_low + prev_close) / 3
+        return {
+            'pivot': pivot,
+            'r1': 2 * pivot - prev_low,
+            's1': 2 * pivot - prev_high,
+            'r2': pivot + (prev_high - prev_low),
+            's2': pivot - (prev_high - prev_low),
+            'r3': prev_high + 2 * (pivot - prev_low),
+            's3': prev_low - 2 * (prev_high - prev_low),
+        }
+
+    def _patterns(self):
+        arrays = np.array(self.candles, dtype=float).T
+        values = {name: int(getattr(ta, function)(*arrays)[-1])
+                  for name, function in self.patterns.items()}
+        if self.pattern_bits:
+            bullish, bearish = scan_patterns(*arrays)
+            values['cdl_bull'], values['cdl_bear'] = int(bullish[-1]), int(bearish[-1])
+        return values
+
+    def _snapshot(self, bar, time, o, h, l, c):
+        hour = time.hour
+        values = {
+            'time': bar['time'], 'open': o, 'high': h, 'low': l, 'close': c,
+            'real_volume': float(_field(bar, 'real_volume', 0.0)),
+        }
+        values.update(self._pivots())
+        values.update({name: np.nan if v is None else v for name, v in self.ema.items()})
+        values.update({name: np.nan if v is None else v for name, v in self.atr.items()})
+        values.update(self._patterns())
+        values['hour'] = hour
+        values['day_of_week'] = time.dayofweek
+        for session, (start, end) in SESSIONS.items():
+            values[session] = int(start <= hour <= end)
+        return values
+
+    @property
+    def ready(self):
+        """Verdadeiro quando todas as features da última vela estão definidas."""
+        return bool(self.values) and not any(
+            isinstance(v, float) and np.isnan(v) for v in self.values.values())
+
+    # --- Aquecimento e verificação ---
+    def warm_up(self, df):
+        """Aplica um histórico de velas fechadas (DataFrame) em ordem cronológica."""
+        for bar in df[['time', 'open', 'high', 'low', 'close']].to_dict('records'):
+            self.update(bar)
+        return self.values
+
+    # --- Persistência ---
+    def to_dict(self):
+        return {
+            'ema_periods': self.ema_periods, 'atr_periods': self.atr_periods, 'patterns': self.patterns,
+            'pattern_bits': self.pattern_bits,
+            'last_time': None if self.last_time is None else self.last_time.isoformat(),
+            'count': self.count, 'prev_close': self.prev_close,
+            'ema': self.ema, 'ema_seed': self.ema_seed, 'atr': self.atr, 'atr_seed': self.atr_seed,
+            'day': None if self.day is None else [self.day[0].isoformat()] + self.day[1:],
+            'prev_day': None if self.prev_day is None else [self.prev_day[0].isoformat()] + self.prev_day[1:],
+            'candles': list(self.candles),
+            'values': {k: (v.isoformat() if isinstance(v, pd.Timestamp) else
+                           None if isinstance(v, float) and np.isnan(v) else
+                           v.item() if isinstance(v, np.generic) else v)
+                       for k, v in self.values.items()},
+        }
+
+    def save(self, path):
+        """Grava o estado em JSON (de forma atômica), para retomar sem recalcular o histórico."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Carrega um estado salvo com save(). Retorna None se o arquivo não existir."""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        state = cls(features=[])
+        state.ema_periods, state.atr_periods, state.patterns = data['ema_periods'], data['atr_periods'], data['patterns']
+        state.pattern_bits = data.get('pattern_bits', False)
+        state.last_time = None if data['last_time'] is None else pd.Timestamp(data['last_time'])
+        state.count, state.prev_close = data['count'], data['prev_close']
+        state.ema, state.ema_seed, state.atr, state.atr_seed = data['ema'], data['ema_seed'], data['atr'], data['atr_seed']
+        state.day = None if data['day'] is None else [pd.Timestamp(data['day'][0])] + data['day'][1:]
+        state.prev_day = None if data['prev_day'] is None else [pd.Timestamp(data['prev_day'][0])] + data['prev_day'][1:]
+        state.candles = deque([tuple(c) for c in data['candles']], maxlen=CANDLE_WINDOW)
+        state.values = {k: np.nan if v is None else v for k, v in data['values'].items()}
+        return state
+
+def verify_against_batch(df, features=FEATURES, rtol=1e-9):
+    """
+    Aplica o histórico vela a vela e compara cada linha com o cálculo em lote do
+    motor_features. Retorna um dict coluna -> número de linhas divergentes
+    (vazio quando os dois caminhos concordam).
+    """
+    batch = compute_features(df, features)
+    state = IndicatorState(features)
+    rows = [state.update(bar) for bar in df[['time', 'open', 'high', 'low', 'close']].to_dict('records')]
+    incremental = pd.DataFrame(rows, index=df.index)
+
+    mismatches = {}
+    for col in CHECK_COLUMNS:
+        if col not in batch.columns:
+            continue
+        if batch[col].dtype == np.uint64: # Máscaras de padrões: comparação exata (não cabem em float)
+            diff = int((batch[col].to_numpy() != incremental[col].to_numpy(dtype=np.uint64)).sum())
+        else:
+            a = batch[col].to_numpy(dtype=float)
+            b = incremental[col].to_numpy(dtype=float)
+            diff = int((~np.isclose(a, b, rtol=rtol, atol=0, equal_nan=True)).sum())
+        if diff:
+            mismatches[col] = diff
+    return mismatches
+
+if __name__ == "__main__":
+    from armazenamento import load_table
+    df = load_table("xauusd_h1_data.parquet", columns=['time', 'open', 'high', 'low', 'close'])
+    print(f"Comparando o estado incremental com o cálculo em lote em {len(df)} velas...")
+    mismatches = verify_against_batch(df)
+    if mismatches:
+        print(f"Divergências encontradas: {mismatches}")
+    else:
+        print("O estado incremental reproduz o cálculo em lote em todas as velas.")
@@ -1,15 +1,25 @@
 import pandas as pd
 import numpy as np
-import talib as ta
+import metricas
+from armazenamento import load_table, save_table
+from matriz_rotulos import build_label_matrix, add_signal_side_labels
+from motor_features import MODEL_FEATURES, compute_features, compute_signal, output_columns
 
 # --- Arquivos ---
-INPUT_FILE = "dados_com_indicadores.csv"
-OUTPUT_FILE = "dataset_final_para_ia.csv"
+INPUT_FILE = "dados_com_indicadores.parquet"
+OUTPUT_FILE = "dataset_final_para_ia.parquet"
+# Dataset colunar com todas as colunas de rótulo (horizontes x esquemas x lados)
+LABEL_MATRIX_FILE = "dataset_rotulos_ia.parquet"
 
 # --- Parâmetros da Simulação ---
 # Quantas velas no futuro olhamos para ver se o trade deu certo/errado
 LOOK_FORWARD_BARS = 24 # 24 horas
 
+# --- Parâmetros do Sinal ---
+# Distância máxima (em ATRs) até um nível de suporte/resistência e níveis considerados
+SIGNAL_ATR_FACTOR = 0.5
+SIGNAL_LEVELS = (1, 2, 3)
+
 def get_trade_outcome(df, index, signal):
     """
     Verifica o resultado de um trade iniciado em um determinado índice.
@@ -44,83 +54,124 @@ def get_trade_outcome(df, index, signal):
             
     return np.nan # Trade não resolvido
 
+def get_trade_outcomes(df, look_forward_bars=LOOK_FORWARD_BARS):
+    """
+    Versão vetorizada de get_trade_outcome: calcula o resultado de todos os
+    sinais de uma vez, usando janelas deslizantes sobre os arrays de máxima e mínima.
+    Segue exatamente as mesmas regras (alvo no R1/S1, sinal inválido se a entrada
+    já passou do alvo ou do stop, np.nan se não resolvido).
+    Retorna um array alinhado com df, com np.nan nas linhas sem sinal.
+    """
+    signal = df['signal'].to_numpy()
+    close = df['close'].to_numpy(dtype=float)
+    r1 = df['r1'].to_numpy(dtype=float)
+    s1 = df['s1'].to_numpy(dtype=float)
+    outcomes = np.full(len(df), np.nan)
+
+    idx = np.flatnonzero(signal != 0)
+    if len(idx) == 0 or look_forward_bars <= 0:
+        return outcomes
+
+    # Completa o final dos arrays com NaN para que toda janela tenha o mesmo tamanho.
+    # Comparações com NaN são sempre falsas, então as barras inexistentes nunca "batem".
+    pad = np.full(look_forward_bars, np.nan)
+    high = np.concatenate([df['high'].to_numpy(dtype=float), pad])
+    low = np.concatenate([df['low'].to_numpy(dtype=float), pad])
+    # A janela da barra i começa em i + 1 (a vela seguinte ao sinal)
+    high_win = np.lib.stride_tricks.sliding_window_view(high[1:], look_forward_bars)[idx]
+    low_win = np.lib.stride_tricks.sliding_window_view(low[1:], look_forward_bars)[idx]
+
+    is_buy = signal[idx] == 1
+    entry = close[idx]
+    take_profit = np.where(is_buy, r1[idx], s1[idx])
+    stop_loss = np.where(is_buy, s1[idx], r1[idx])
+
+    with np.errstate(invalid='ignore'):
+        # Se o preço já passou do alvo ou do stop, o sinal é inválido
+        invalid = np.where(is_buy,
+                           (entry >= take_profit) | (entry <= stop_loss),
+                           (entry <= take_profit) | (entry >= stop_loss))
+        tp_hit = np.where(is_buy[:, None],
+                          high_win >= take_profit[:, None],
+                          low_win <= take_profit[:, None])
+        sl_hit = np.where(is_buy[:, None],
+                          low_win <= stop_loss[:, None],
+                          high_win >= stop_loss[:, None])
+
+    # Primeira vela em que o alvo/stop foi atingido (look_forward_bars = nunca)
+    first_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), look_forward_bars)
+    first_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), look_forward_bars)
+
+    # Na mesma vela o alvo é verificado antes do stop, como no loop original
+    result = np.where(first_tp <= first_sl, 1.0, 0.0)
+    result[(first_tp == look_forward_bars) & (first_sl == look_forward_bars)] = np.nan
+    result[invalid] = np.nan
+    outcomes[idx] = result
+    return outcomes
+
+def compute_signals(df):
+    """
+    Adiciona ao DataFrame (já com as features do motor_features) a coluna 'signal'
+    da estratégia base (1 = compra, -1 = venda, 0 = sem sinal).
+    """
+    df['signal'] = compute_signal(df, atr_factor=SIGNAL_ATR_FACTOR, levels=SIGNAL_LEVELS)
+    return df
+
 def generate_signals():
     """
     Gera o dataset final com sinais de trading e o resultado (target) para a IA.
     """
     print(f"Lendo dados de {INPUT_FILE}...")
     try:
-        df = pd.read_csv(INPUT_FILE, parse_dates=['time'])
+        with metricas.stage('sinais.load'):
+            df = load_table(INPUT_FILE)
     except FileNotFoundError:
         print(f"Erro: Arquivo '{INPUT_FILE}' não encontrado.")
         return
 
-    print("Gerando sinais da estratégia base...")
+    # Garante as features do motor compartilhado mesmo para arquivos antigos só com OHLCV
+    if not set(output_columns()).issubset(df.columns):
+        with metricas.stage('sinais.features'):
+            df = compute_features(df)
 
-    # --- 1. Identificar Padrões de Vela ---
-    df['engulfing'] = ta.CDLENGULFING(df['open'], df['high'], df['low'], df['close'])
-    df['hammer'] = ta.CDLHAMMER(df['open'], df['high'], df['low'], df['close'])
-    # Adicione outros padrões se desejar (ex: CDLMORNINGSTAR, CDLEVENINGSTAR)
-
-    # --- 2. Definir Condições de Confluência ---
-    atr = df['atr14']
-    
-    # Condições de Compra
-    buy_trend = df['ema50'] > df['ema200']
-    buy_candle = (df['engulfing'] > 0) | (df['hammer'] > 0)
-    # Preço próximo a um suporte (S1, S2, ou S3)
-    buy_near_support = (abs(df['low'] - df['s1']) < atr * 0.5) | \
-                       (abs(df['low'] - df['s2']) < atr * 0.5) | \
-                       (abs(df['low'] - df['s3']) < atr * 0.5)
-
-    # Condições de Venda
-    sell_trend = df['ema50'] < df['ema200']
-    sell_candle = (df['engulfing'] < 0) # Engolfo de baixa
-    # Preço próximo a uma resistência (R1, R2, ou R3)
-    sell_near_resistance = (abs(df['high'] - df['r1']) < atr * 0.5) | \
-                         (abs(df['high'] - df['r2']) < atr * 0.5) | \
-                         (abs(df['high'] - df['r3']) < atr * 0.5)
-
-    # --- 3. Criar a coluna de Sinais ---
-    df['signal'] = 0
-    df.loc[buy_trend & buy_candle & buy_near_support, 'signal'] = 1
-    df.loc[sell_trend & sell_candle & sell_near_resistance, 'signal'] = -1
+    print("Gerando sinais da estratégia base...")
+    with metricas.stage('sinais.signals'):
+        compute_signals(df)
 
     # --- 4. Calcular o Resultado (Target) para cada Sinal ---
     print("Calculando resultado dos trades (target para a IA)...")
-    signal_indices = df[df['signal'] != 0].index
-    outcomes = [get_trade_outcome(df, i, df.at[i, 'signal']) for i in signal_indices]
-    df.loc[signal_indices, 'target'] = outcomes
+    with metricas.stage('sinais.outcomes'):
+        df['target'] = get_trade_outcomes(df)
 
-    # --- 5. Preparar o Dataset Final ---
+    # Colunas que a IA usará como features, mais o resultado que ela deve prever
+    feature_columns = MODEL_FEATURES + ['target']
+
+    # --- 5. Matriz de Rótulos (vários horizontes e esquemas de alvo/stop) ---
+    print("Calculando a matriz de rótulos para todos os horizontes e esquemas...")
+    signal_df = df[df['signal'] != 0]
+    with metricas.stage('sinais.labels'):
+        labels = build_label_matrix(df, np.flatnonzero(df['signal'] != 0))
+        labels = add_signal_side_labels(labels, signal_df['signal'])
+    matrix_df = pd.concat([signal_df[['time'] + feature_columns], labels], axis=1)
+
+    # --- 6. Preparar o Dataset Final ---
     # Filtramos apenas os momentos em que houve um sinal e o resultado foi definido
     final_df = df[df['target'].notna()].copy()
     final_df['target'] = final_df['target'].astype(int)
-
-    # Adicionar features de tempo, que podem ser úteis para a IA
-    final_df['hour'] = final_df['time'].dt.hour
-    final_df['day_of_week'] = final_df['time'].dt.dayofweek
-
-    # Selecionar colunas que a IA usará como features
-    feature_columns = [
-        'open', 'high', 'low', 'close', 'real_volume', # Dados do preço
-        'pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3', # Níveis de Pivot
-        'ema50', 'ema200', 'atr14', # Indicadores
-        'engulfing', 'hammer', # Sinais de vela
-        'hour', 'day_of_week', # Features de tempo
-        'signal', # O sinal que a estratégia deu
-        'target' # O resultado que a IA deve prever
-    ]
     final_df = final_df[feature_columns]
 
     print(f"Foram encontrados {len(final_df)} sinais de trade válidos.")
 
     # --- Salvando o resultado ---
     try:
-        final_df.to_csv(OUTPUT_FILE, index=False)
+        with metricas.stage('sinais.save_dataset'):
+            save_table(final_df, OUTPUT_FILE)
         print(f"\nSucesso! Dataset final para IA salvo em: {OUTPUT_FILE}")
+        with metricas.stage('sinais.save_labels'):
+            save_table(matrix_df, LABEL_MATRIX_FILE)
+        print(f"Matriz com {len(labels.columns)} colunas de rótulo salva em: {LABEL_MATRIX_FILE}")
     except Exception as e:
-        print(f"Ocorreu um erro ao salvar o arquivo CSV: {e}")
+        print(f"Ocorreu um erro ao salvar o dataset: {e}")
 
 if __name__ == "__main__":
     generate_signals()
@@ -0,0 +1,99 @@
+import numpy as np
+
+class FlatForest:
+    """
+    Versão "achatada" de um RandomForestClassifier do scikit-learn para inferência
+    de baixa latência.
+
+    Os nós de todas as árvores são copiados para arrays NumPy contínuos (feature,
+    threshold, filho da esquerda/direita e probabilidades da folha). Todas as árvores
+    descem juntas, um nível por iteração, e a classe e as probabilidades saem de uma
+    única travessia, sem a validação de entrada do sklearn.
+
+    As probabilidades reproduzem model.predict_proba (o valor de entrada é convertido
+    para float32, como o sklearn faz). As features não podem ter NaN.
+    """
+
+    def __init__(self, model):
+        trees = [est.tree_ for est in model.estimators_]
+        self.classes_ = np.asarray(model.classes_)
+        self.feature_names = list(model.feature_names_in_)
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        self.n_trees = len(trees)
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            leaf = left == -1
+            own = np.arange(n)
+            # Nas folhas os dois filhos apontam para a própria folha: ela "fica parada"
+            lefts.append(np.where(leaf, own, left) + offset)
+            rights.append(np.where(leaf, own, right) + offset)
+            features.append(np.where(leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(tree.threshold.astype(np.float64))
+            # Desde o sklearn 1.4 o value dos classificadores já guarda a fração de
+            # cada classe na folha, exatamente o que DecisionTreeClassifier.predict_proba retorna
+            values.append(tree.value[:, 0, :len(self.classes_)].astype(np.float64))
+            roots.append(offset)
+            offset += n
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.int64)
+
+    # --- Vetor de features ---
+    def new_vector(self):
+        """Vetor de features pré-alocado, na ordem de feature_names_in_."""
+        return np.zeros(len(self.feature_names), dtype=np.float64)
+
+    def fill_vector(self, vector, values):
+        """Preenche o vetor a partir de um dict nome -> valor (ex: features da última vela)."""
+        for name, i in self.feature_index.items():
+            vector[i] = values[name]
+        return vector
+
+    # --- Inferência ---
+    def _leaves(self, x):
+        # O sklearn compara os valores em float32 com os thresholds em float64
+        x = np.asarray(x, dtype=np.float32).astype(np.float64)
+        nodes = self.roots.copy()
+        for _ in range(self.max_depth):
+            go_left = x[self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_one(self, vector):
+        """Retorna (classe, probabilidades) de uma única amostra, em uma travessia."""
+        proba = self.value[self._leaves(vector)].sum(axis=0) / self.n_trees
+        return self.classes_[np.argmax(proba)], proba
+
+    def predict_proba(self, X):
+        """Probabilidades de várias amostras (array 2D na ordem de feature_names_in_)."""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))
+        nodes = np.tile(self.roots, (len(X), 1))
+        for _ in range(self.max_depth):
+            go_left = X[rows[:, None], self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        # Soma árvore a árvore, na mesma ordem do sklearn (resultado idêntico)
+        proba = np.zeros((len(X), self.value.shape[1]))
+        for t in range(self.n_trees):
+            proba += self.value[nodes[:, t]]
+        return proba / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def is_supported(model):
+    """Verifica se o modelo pode ser convertido (floresta de árvores de classificação)."""
+    estimators = getattr(model, 'estimators_', None)
+    return (isinstance(estimators, list) and len(estimators) > 0
+            and all(hasattr(est, 'tree_') for est in estimators)
+            and hasattr(model, 'feature_names_in_'))
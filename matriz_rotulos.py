@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+# --- Configurações de Rotulagem ---
+# Horizontes (em velas) avaliados para cada esquema de alvo/stop
+HORIZONTES = [6, 12, 24, 48, 96]
+
+# Esquemas de Take Profit / Stop Loss
+# - 'pivot': alvo e stop em níveis de pivot (ex: alvo no R1, stop no S1 para compra)
+# - 'atr':   alvo e stop em múltiplos do ATR a partir do preço de entrada
+# - 'rr':    stop na mínima/máxima da vela -/+ 1 ATR e alvo pela relação risco/retorno,
+#            exatamente como o robo_trader.run_bot envia as ordens
+ESQUEMAS = [
+    {'nome': 'pivot1', 'tipo': 'pivot', 'alvo': 1, 'stop': 1},
+    {'nome': 'pivot2', 'tipo': 'pivot', 'alvo': 2, 'stop': 1},
+    {'nome': 'atr1x1', 'tipo': 'atr', 'alvo': 1.0, 'stop': 1.0},
+    {'nome': 'atr2x1', 'tipo': 'atr', 'alvo': 2.0, 'stop': 1.0},
+    {'nome': 'rr1.5', 'tipo': 'rr', 'rr': 1.5},
+    {'nome': 'rr2', 'tipo': 'rr', 'rr': 2.0},
+]
+
+LADOS = {'compra': 1, 'venda': -1}
+
+# Prefixo das colunas de rótulo, para que o treinamento consiga separá-las das features
+PREFIXO = 'y_'
+
+# Códigos dos rótulos (int8 para manter a matriz compacta)
+WIN, LOSS, UNRESOLVED = 1, 0, -1
+
+# Quantas linhas são processadas por vez (limita a memória das janelas)
+CHUNK_SIZE = 50_000
+
+def label_column(esquema, horizonte, lado):
+    """Nome da coluna de rótulo de uma configuração (ex: 'y_rr1.5_h24_compra')."""
+    return f"{PREFIXO}{esquema['nome']}_h{horizonte}_{lado}"
+
+def _levels(df, idx, esquema, side):
+    """Calcula os níveis de entrada, alvo e stop de um esquema para as linhas idx."""
+    entry = df['close'].to_numpy(dtype=float)[idx]
+
+    if esquema['tipo'] == 'pivot':
+        r_alvo = df[f"r{esquema['alvo']}"].to_numpy(dtype=float)[idx]
+        s_alvo = df[f"s{esquema['alvo']}"].to_numpy(dtype=float)[idx]
+        r_stop = df[f"r{esquema['stop']}"].to_numpy(dtype=float)[idx]
+        s_stop = df[f"s{esquema['stop']}"].to_numpy(dtype=float)[idx]
+        if side == 1:
+            return entry, r_alvo, s_stop
+        return entry, s_alvo, r_stop
+
+    atr = df['atr14'].to_numpy(dtype=float)[idx]
+    if esquema['tipo'] == 'atr':
+        return entry, entry + side * esquema['alvo'] * atr, entry - side * esquema['stop'] * atr
+
+    if esquema['tipo'] == 'rr':
+        if side == 1:
+            stop_loss = df['low'].to_numpy(dtype=float)[idx] - atr
+        else:
+            stop_loss = df['high'].to_numpy(dtype=float)[idx] + atr
+        return entry, entry + (entry - stop_loss) * esquema['rr'], stop_loss
+
+    raise ValueError(f"Tipo de esquema desconhecido: {esquema['tipo']}")
+
+def _first_hit(hits, max_horizon):
+    """Índice da primeira vela em que a condição ocorreu (max_horizon = nunca)."""
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), max_horizon)
+
+def build_label_matrix(df, idx=None, esquemas=ESQUEMAS, horizontes=HORIZONTES, lados=LADOS):
+    """
+    Calcula, em uma única passada, os rótulos de todas as combinações de
+    esquema de alvo/stop, horizonte e lado para as linhas idx do DataFrame.
+
+    As janelas de máxima/mínima são montadas uma vez (no maior horizonte) e
+    reutilizadas por todas as configurações; cada horizonte menor é derivado
+    do índice da primeira vela que atingiu o alvo ou o stop.
+
+    Retorna um DataFrame int8 (1 = vitória, 0 = derrota, -1 = inválido ou não
+    resolvido) indexado como df.index[idx].
+    """
+    if idx is None:
+        idx = np.arange(len(df))
+    idx = np.asarray(idx)
+    max_horizon = max(horizontes)
+
+    pad = np.full(max_horizon, np.nan)
+    high = np.concatenate([df['high'].to_numpy(dtype=float), pad])
+    low = np.concatenate([df['low'].to_numpy(dtype=float), pad])
+    high_view = np.lib.stride_tricks.sliding_window_view(high[1:], max_horizon)
+    low_view = np.lib.stride_tricks.sliding_window_view(low[1:], max_horizon)
+
+    columns = {}
+    for esquema in esquemas:
+        for lado, side in lados.items():
+            for h in horizontes:
+                columns[label_column(esquema, h, lado)] = np.full(len(idx), UNRESOLVED, dtype=np.int8)
+
+    for start in range(0, len(idx), CHUNK_SIZE):
+        chunk = idx[start:start + CHUNK_SIZE]
+        rows = slice(start, start + len(chunk))
+        # Janelas compartilhadas por todas as configurações deste bloco
+        high_win = high_view[chunk]
+        low_win = low_view[chunk]
+
+        for esquema in esquemas:
+            for lado, side in lados.items():
+                entry, take_profit, stop_loss = _levels(df, chunk, esquema, side)
+                with np.errstate(invalid='ignore'):
+                    if side == 1:
+                        invalid = (entry >= take_profit) | (entry <= stop_loss)
+                        first_tp = _first_hit(high_win >= take_profit[:, None], max_horizon)
+                        first_sl = _first_hit(low_win <= stop_loss[:, None], max_horizon)
+                    else:
+                        invalid = (entry <= take_profit) | (entry >= stop_loss)
+                        first_tp = _first_hit(low_win <= take_profit[:, None], max_horizon)
+                        first_sl = _first_hit(high_win >= stop_loss[:, None], max_horizon)
+
+                # Na mesma vela o alvo é verificado antes do stop (mesma regra do gerador)
+                won = first_tp <= first_sl
+                first = np.minimum(first_tp, first_sl)
+                for h in horizontes:
+                    labels = np.where(won, WIN, LOSS).astype(np.int8)
+                    labels[(first >= h) | invalid] = UNRESOLVED
+                    columns[label_column(esquema, h, lado)][rows] = labels
+
+    return pd.DataFrame(columns, index=df.index[idx])
+
+def add_signal_side_labels(labels, signal, esquemas=ESQUEMAS, horizontes=HORIZONTES):
+    """
+    Acrescenta as colunas '<config>_sinal', que usam o lado indicado pelo sinal
+    da estratégia (compra para 1, venda para -1).
+    """
+    signal = np.asarray(signal)
+    for esquema in esquemas:
+        for h in horizontes:
+            buy = labels[label_column(esquema, h, 'compra')].to_numpy()
+            sell = labels[label_column(esquema, h, 'venda')].to_numpy()
+            labels[label_column(esquema, h, 'sinal')] = np.where(
+                signal == 1, buy, np.where(signal == -1, sell, UNRESOLVED)
+            ).astype(np.int8)
+    return labels
+
+def label_columns(df):
+    """Lista as colunas de rótulo presentes em um DataFrame."""
+    return [c for c in df.columns if c.startswith(PREFIXO)]
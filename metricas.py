@@ -0,0 +1,212 @@
+"""
+Medição do tempo de cada etapa do robô e dos scripts do pipeline.
+
+    import metricas
+    with metricas.stage('mt5.rates'):
+        bar_cache.refresh()
+
+Cada etapa alimenta um histograma em memória (contagem, erros, soma, máximo e
+p50/p95/p99) que é exportado periodicamente, por uma thread, para um arquivo no
+formato texto do Prometheus (.prom, regravado a cada exportação) ou JSON lines
+(.jsonl, uma linha por exportação).
+
+A medição é ligada pela variável de ambiente ROBO_METRICAS=<arquivo> (ou por
+enable()). Desligada, stage() devolve um contexto vazio compartilhado, sem nenhum
+custo adicional.
+"""
+import argparse
+import atexit
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# --- Configuração ---
+METRICS_ENV = "ROBO_METRICAS"             # Arquivo de exportação (.prom ou .jsonl); ausente = desligado
+INTERVAL_ENV = "ROBO_METRICAS_INTERVALO"  # Segundos entre exportações
+EXPORT_INTERVAL = 60.0
+PREFIX = "robo_etapa"                     # Prefixo das métricas no formato Prometheus
+# Limites superiores dos buckets, em segundos: 4 por década, de 1 µs a 100 s
+BUCKETS = [10 ** (e / 4) for e in range(-24, 9)]
+
+class Histogram:
+    """Histograma de durações com buckets logarítmicos fixos."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # O último bucket é o +Inf
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Quantil estimado por interpolação linear dentro do bucket (limitado ao máximo observado)."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / n, self.max)
+            cumulative += n
+        return self.max
+
+    def snapshot(self):
+        return {'count': self.count, 'errors': self.errors, 'sum': self.total,
+                'mean': self.total / self.count if self.count else 0.0, 'max': self.max,
+                'p50': self.quantile(0.50), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99)}
+
+class Registry:
+    """Histogramas por etapa e exportação periódica para 'path'."""
+
+    def __init__(self, path, interval=EXPORT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds, error)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: h.snapshot() for name, h in sorted(self.histograms.items())}
+
+    def prometheus_text(self):
+        """Histogramas no formato texto do Prometheus, mais p50/p95/p99 e erros por etapa."""
+        with self._lock:
+            items = sorted(self.histograms.items())
+            lines = [f"# TYPE {PREFIX}_segundos histogram"]
+            for name, h in items:
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ['+Inf'], h.counts):
+                    cumulative += n
+                    le = bound if bound == '+Inf' else f"{bound:.6g}"
+                    lines.append(f'{PREFIX}_segundos_bucket{{etapa="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{PREFIX}_segundos_sum{{etapa="{name}"}} {h.total:.9g}')
+                lines.append(f'{PREFIX}_segundos_count{{etapa="{name}"}} {h.count}')
+            lines.append(f"# TYPE {PREFIX}_erros_total counter")
+            lines += [f'{PREFIX}_erros_total{{etapa="{name}"}} {h.errors}' for name, h in items]
+            lines.append(f"# TYPE {PREFIX}_quantil_segundos gauge")
+            for name, h in items:
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(f'{PREFIX}_quantil_segundos{{etapa="{name}",quantil="{q}"}} {h.quantile(q):.9g}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Grava o estado atual: .prom é regravado de forma atômica; .jsonl ganha uma linha."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.path.endswith(".jsonl"):
+            line = {'time': datetime.now().isoformat(timespec='seconds'), 'pid': os.getpid(),
+                    'stages': self.snapshot()}
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(line) + "\n")
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metricas", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.histograms:
+            self.export()
+
+# --- API ---
+_registry = None
+_NOOP = contextlib.nullcontext()
+
+class _Stage:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+def enable(path, interval=EXPORT_INTERVAL):
+    """Liga a medição, exportando para 'path' a cada 'interval' segundos e ao fim do processo."""
+    global _registry
+    disable()
+    _registry = Registry(path, interval)
+    _registry.start()
+    atexit.register(_registry.stop)
+    return _registry
+
+def disable():
+    """Desliga a medição (exporta o que já foi medido)."""
+    global _registry
+    if _registry is not None:
+        _registry.stop()
+        atexit.unregister(_registry.stop)
+    _registry = None
+
+def enabled():
+    return _registry is not None
+
+def stage(name):
+    """Contexto que mede a etapa 'name' (exceções contam como erro e são propagadas)."""
+    if _registry is None:
+        return _NOOP
+    return _Stage(_registry, name)
+
+def snapshot():
+    """Estado atual de todas as etapas ({} com a medição desligada)."""
+    return _registry.snapshot() if _registry is not None else {}
+
+def print_table(stages):
+    print(f"{'etapa':<24}{'n':>8}{'erros':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for name, s in stages.items():
+        print(f"{name:<24}{s['count']:>8}{s['errors']:>7}{s['p50'] * 1000:>10.3f}"
+              f"{s['p95'] * 1000:>10.3f}{s['p99'] * 1000:>10.3f}{s['max'] * 1000:>10.3f}")
+
+if os.environ.get(METRICS_ENV):
+    enable(os.environ[METRICS_ENV], float(os.environ.get(INTERVAL_ENV, EXPORT_INTERVAL)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra a última exportação de métricas (.jsonl) em tabela.")
+    parser.add_argument("arquivo", help="Arquivo .jsonl gerado com ROBO_METRICAS.")
+    args = parser.parse_args()
+
+    with open(args.arquivo, 'r') as f:
+        lines = f.read().splitlines()
+    if not lines:
+        raise SystemExit(f"{args.arquivo} está vazio.")
+    last = json.loads(lines[-1])
+    print(f"Exportação de {last['time']} (processo {last['pid']}):")
+    print_table(last['stages'])
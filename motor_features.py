@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+import talib as ta
+
+from padroes_candle import any_pattern, pattern_mask, scan_patterns
+
+# --- Declaração das Features ---
+# Cada feature é declarada como (nome, tipo, parâmetros). Os tipos com várias
+# colunas de saída ('pivots', 'time', 'sessions') usam o nome apenas como rótulo.
+FEATURES = [
+    ('pivots', 'pivots', {}),
+    ('ema50', 'ema', {'period': 50}),
+    ('ema200', 'ema', {'period': 200}),
+    ('atr14', 'atr', {'period': 14}),
+    ('engulfing', 'cdl', {'function': 'CDLENGULFING'}),
+    ('hammer', 'cdl', {'function': 'CDLHAMMER'}),
+    ('time', 'time', {}),
+    ('sessions', 'sessions', {}),
+]
+
+# Todos os padrões de vela do TA-Lib empacotados em duas máscaras uint64 por vela
+# ('cdl_bull' e 'cdl_bear', ver padroes_candle). Fora de FEATURES: quem precisa
+# acrescenta à lista (ex: FEATURES + PATTERN_FEATURES)
+PATTERN_FEATURES = [('candles', 'cdl_bits', {})]
+
+# Ordem das colunas que o modelo de IA recebe
+MODEL_FEATURES = [
+    'open', 'high', 'low', 'close', 'real_volume', # Dados do preço
+    'pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3', # Níveis de Pivot
+    'ema50', 'ema200', 'atr14', # Indicadores
+    'engulfing', 'hammer', # Sinais de vela
+    'hour', 'day_of_week', # Features de tempo
+    'signal', # O sinal que a estratégia deu
+]
+
+# Colunas dos Pivot Points diários (feature 'pivots')
+PIVOT_COLUMNS = ('pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3')
+
+# Sessões de negociação por hora (aproximado, GMT)
+SESSIONS = {
+    'session_asia': (0, 8),
+    'session_london': (7, 16),
+    'session_ny': (12, 21),
+}
+
+def feature_set(ema_short=50, ema_long=200, atr_period=14):
+    """
+    Lista de features com outros períodos de EMA/ATR. As colunas mantêm os nomes
+    ema50/ema200/atr14, que são as entradas esperadas pelo modelo.
+    """
+    periods = {'ema50': ema_short, 'ema200': ema_long, 'atr14': atr_period}
+    return [(name, kind, dict(params, period=periods[name]) if name in periods else params)
+            for name, kind, params in FEATURES]
+
+def output_columns(features=FEATURES):
+    """Colunas que compute_features(df, features) produz (real_volume só é criado se faltar)."""
+    columns = ['real_volume']
+    for name, kind, params in features:
+        if kind == 'pivots':
+            columns += PIVOT_COLUMNS
+        elif kind == 'cdl_bits':
+            columns += ['cdl_bull', 'cdl_bear']
+        elif kind == 'time':
+            columns += ['hour', 'day_of_week']
+        elif kind == 'sessions':
+            columns += list(SESSIONS)
+        else:
+            columns.append(name)
+    return columns
+
+def _times(df):
+    """Coluna 'time' como datetime64, aceitando também segundos desde a época (formato do MT5)."""
+    time = df['time']
+    if pd.api.types.is_datetime64_any_dtype(time):
+        return time.to_numpy(dtype='datetime64[ns]')
+    return pd.to_datetime(time, unit='s').to_numpy(dtype='datetime64[ns]')
+
+def daily_pivots(times, high, low, close):
+    """
+    Pivot Points clássicos do dia anterior para cada barra, sem resample/merge_asof.
+    Segue a mesma regra do cálculo original: usa o dia de calendário anterior, e as
+    barras cujo dia anterior não teve negociação (ex: segunda-feira) ficam com NaN.
+    """
+    n = len(times)
+    if n == 0:
+        return {name: np.empty(0) for name in PIVOT_COLUMNS}
+
+    day = times.astype('datetime64[D]').astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    day_high = np.maximum.reduceat(high, starts)
+    day_low = np.minimum.reduceat(low, starts)
+    day_close = close[ends]
+
+    unique_days = day[starts]
+    pos = np.searchsorted(unique_days, day - 1)
+    pos_clipped = np.minimum(pos, len(unique_days) - 1)
+    found = unique_days[pos_clipped] == day - 1
+
+    prev_high = np.where(found, day_high[pos_clipped], np.nan)
+    prev_low = np.where(found, day_low[pos_clipped], np.nan)
+    prev_close = np.where(found, day_close[pos_clipped], np.nan)
+
+    pivot = (prev_high + prev_low + prev_close) / 3
+    return {
+        'pivot': pivot,
+        'r1': 2 * pivot - prev_low,
+        's1': 2 * pivot - prev_high,
+        'r2': pivot + (prev_high - prev_low),
+        's2': pivot - (prev_high - prev_low),
+        'r3': prev_high + 2 * (pivot - prev_low),
+        # Mesma fórmula usada para gerar o dataset de treino do modelo atual
+        's3': prev_low - 2 * (prev_high - prev_low),
+    }
+
+def compute_features(df, features=FEATURES):
+    """
+    Calcula todas as features declaradas de forma vetorizada, em uma única passada
+    sobre os arrays OHLC. Usado pelo gerador de sinais, treinamento, backtest e robô,
+    para que todos vejam exatamente as mesmas features.
+
+    Não remove as linhas iniciais sem histórico suficiente (NaN); quem chama decide.
+    """
+    times = _times(df)
+    open_ = df['open'].to_numpy(dtype=float)
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+    hour = None
+
+    columns = {}
+    if 'real_volume' not in df.columns:
+        columns['real_volume'] = np.zeros(len(df), dtype=np.int64)
+
+    for name, kind, params in features:
+        if kind == 'pivots':
+            columns.update(daily_pivots(times, high, low, close))
+        elif kind == 'ema':
+            columns[name] = ta.EMA(close, timeperiod=params['period'])
+        elif kind == 'atr':
+            columns[name] = ta.ATR(high, low, close, timeperiod=params['period'])
+        elif kind == 'cdl':
+            columns[name] = getattr(ta, params['function'])(open_, high, low, close)
+        elif kind == 'cdl_bits':
+            columns['cdl_bull'], columns['cdl_bear'] = scan_patterns(open_, high, low, close)
+        elif kind in ('time', 'sessions'):
+            if hour is None:
+                hour = (times.astype('datetime64[h]').astype(np.int64) % 24).astype(np.int64)
+            if kind == 'time':
+                columns['hour'] = hour
+                # 1970-01-01 foi uma quinta-feira (dayofweek = 3)
+                columns['day_of_week'] = (times.astype('datetime64[D]').astype(np.int64) + 3) % 7
+            else:
+                for session, (start, end) in SESSIONS.items():
+                    columns[session] = ((hour >= start) & (hour <= end)).astype(np.int64)
+        else:
+            raise ValueError(f"Tipo de feature desconhecido: {kind}")
+
+    out = df.drop(columns=[c for c in columns if c in df.columns])
+    return pd.concat([out, pd.DataFrame(columns, index=df.index)], axis=1)
+
+def compute_signal(df, atr_factor=0.7, levels=(1, 2), patterns=None):
+    """
+    Sinal de confluência da estratégia (1 = compra, -1 = venda, 0 = sem sinal):
+    tendência pelas EMAs, padrão de vela e preço a menos de atr_factor * ATR de um
+    dos níveis de suporte/resistência indicados (S1/R1, S2/R2, ...).
+    Aceita um DataFrame ou um dict com valores escalares (uma única vela).
+
+    Por padrão os padrões de vela são engolfo ou martelo na compra e engolfo na
+    venda. Com patterns=(padrões de compra, padrões de venda), listas de nomes do
+    padroes_candle, usa as máscaras 'cdl_bull'/'cdl_bear' (ver PATTERN_FEATURES).
+    """
+    def column(name):
+        return np.atleast_1d(np.asarray(df[name], dtype=float))
+
+    atr = column('atr14')
+    ema50, ema200 = column('ema50'), column('ema200')
+    low, high = column('low'), column('high')
+    if patterns is None:
+        engulfing, hammer = column('engulfing'), column('hammer')
+        buy_pattern = (engulfing > 0) | (hammer > 0)
+        sell_pattern = engulfing < 0
+    else:
+        buy_pattern = any_pattern(np.atleast_1d(np.asarray(df['cdl_bull'], dtype=np.uint64)), pattern_mask(patterns[0]))
+        sell_pattern = any_pattern(np.atleast_1d(np.asarray(df['cdl_bear'], dtype=np.uint64)), pattern_mask(patterns[1]))
+
+    near_support = np.zeros(len(atr), dtype=bool)
+    near_resistance = np.zeros(len(atr), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for level in levels:
+            near_support |= np.abs(low - column(f's{level}')) < atr * atr_factor
+            near_resistance |= np.abs(high - column(f'r{level}')) < atr * atr_factor
+        buy = (ema50 > ema200) & buy_pattern & near_support
+        sell = (ema50 < ema200) & sell_pattern & near_resistance
+
+    signal = np.zeros(len(atr), dtype=np.int64)
+    signal[buy] = 1
+    signal[sell & ~buy] = -1
+    return signal
@@ -0,0 +1,331 @@
+"""
+Substituto local do módulo MetaTrader5, para rodar os scripts sem o terminal.
+
+Os preços vêm de um arquivo de barras já armazenado (por padrão xauusd_h1_data.csv)
+e o "agora" do terminal pode ser controlado com set_time(), o que permite simular
+a chegada de novas barras entre uma execução e outra.
+
+Também simula uma conta: ordens a mercado (order_send) são executadas no preço
+da vela em formação, as posições (positions_get) são fechadas pelo stop/alvo
+quando uma vela fechada os atinge, e as entradas e saídas ficam no histórico de
+deals (history_deals_get). O replay_robo.py usa isso para rodar o robo_trader
+sobre barras armazenadas com um relógio virtual.
+
+Uso:
+    import mt5_simulado
+    mt5_simulado.install("xauusd_h1_data.csv")
+    import coleta_dados  # passa a usar o módulo simulado
+"""
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# --- Constantes (mesmos valores do pacote MetaTrader5) ---
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+# Duração de cada timeframe em segundos
+TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60,
+    TIMEFRAME_M5: 300,
+    TIMEFRAME_M15: 900,
+    TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600,
+    TIMEFRAME_H4: 14400,
+    TIMEFRAME_D1: 86400,
+}
+
+# --- Constantes de Negociação ---
+TRADE_ACTION_DEAL = 1
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TIME_GTC = 0
+ORDER_FILLING_IOC = 1
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+
+# --- Parâmetros da Conta Simulada ---
+CONTRACT_SIZE = 100   # Onças por lote no XAUUSD (lucro = diferença de preço x volume x contrato)
+POINT = 0.01          # Tamanho do ponto; o spread das barras (em pontos) vira a diferença bid/ask
+DEFAULT_SPREAD = 0    # Spread (pontos) usado quando as barras não têm a coluna 'spread'
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+# --- Estado do terminal simulado ---
+_state = {
+    'rates': {},        # símbolo -> array estruturado ordenado por tempo
+    'now': None,        # "agora" do terminal em segundos (None = fim dos dados)
+    'connected': False,
+    'fail_initialize': 0, # quantas chamadas de initialize() ainda devem falhar
+    'calls': {},        # contagem de chamadas por função, útil para medir round-trips
+    'bar_seconds': {},  # símbolo -> duração das barras carregadas
+    'positions': {},    # ticket -> posição aberta (dict)
+    'deals': [],        # histórico de deals, em ordem de execução
+    'next_ticket': 1,
+}
+
+def _count(name):
+    _state['calls'][name] = _state['calls'].get(name, 0) + 1
+
+def _to_seconds(value):
+    """Converte datetime (ingênuo = UTC) ou número em segundos desde a época."""
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    return int(pd.Timestamp(value).value // 1_000_000_000)
+
+def load_rates(data, symbol="XAUUSD"):
+    """Carrega barras de um arquivo CSV ou DataFrame para o símbolo informado."""
+    df = pd.read_csv(data, parse_dates=['time']) if isinstance(data, str) else data.copy()
+    if pd.api.types.is_datetime64_any_dtype(df['time']):
+        seconds = df['time'].astype('datetime64[s]').astype('int64')
+    else:
+        seconds = df['time'].astype('int64')
+    rates = np.zeros(len(df), dtype=RATES_DTYPE)
+    rates['time'] = seconds
+    for col in ('open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume'):
+        if col in df.columns:
+            rates[col] = df[col].to_numpy()
+    if 'spread' not in df.columns:
+        rates['spread'] = DEFAULT_SPREAD
+    rates.sort(order='time')
+    _state['rates'][symbol] = rates
+    _state['bar_seconds'][symbol] = int(np.median(np.diff(rates['time']))) if len(rates) > 1 else 3600
+
+def reset_account():
+    """Apaga posições e deals da conta simulada."""
+    _state.update(positions={}, deals=[], next_ticket=1)
+
+def install(data="xauusd_h1_data.csv", symbol="XAUUSD"):
+    """Registra este módulo como 'MetaTrader5' em sys.modules e carrega os dados."""
+    load_rates(data, symbol)
+    sys.modules['MetaTrader5'] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+def set_time(now):
+    """Define o "agora" do terminal; barras posteriores ficam invisíveis."""
+    _state['now'] = None if now is None else _to_seconds(now)
+
+def disconnect():
+    """Simula a queda da conexão com o terminal."""
+    _state['connected'] = False
+
+def fail_next_initialize(times=1):
+    """Faz as próximas 'times' chamadas de initialize() falharem."""
+    _state['fail_initialize'] = times
+
+def call_counts():
+    """Retorna quantas vezes cada função do terminal foi chamada."""
+    return dict(_state['calls'])
+
+def _visible(symbol):
+    rates = _state['rates'].get(symbol)
+    if rates is None:
+        return None
+    if _state['now'] is None:
+        return rates
+    return rates[:np.searchsorted(rates['time'], _state['now'], side='right')]
+
+# --- API compatível com o pacote MetaTrader5 ---
+TerminalInfo = namedtuple('TerminalInfo', ['connected', 'trade_allowed', 'name'])
+
+def initialize(*args, **kwargs):
+    _count('initialize')
+    if _state['fail_initialize'] > 0:
+        _state['fail_initialize'] -= 1
+        return False
+    _state['connected'] = True
+    return True
+
+def terminal_info():
+    _count('terminal_info')
+    if not _state['connected']:
+        return None
+    return TerminalInfo(connected=True, trade_allowed=True, name="MetaTrader 5 (simulado)")
+
+def shutdown():
+    _count('shutdown')
+    _state['connected'] = False
+
+def version():
+    return (500, 4000, "01 Jan 2025")
+
+def last_error():
+    return (1, "Success")
+
+def copy_rates_range(symbol, timeframe, date_from, date_to):
+    """Barras com tempo entre date_from e date_to (inclusive)."""
+    _count('copy_rates_range')
+    rates = _visible(symbol)
+    if rates is None:
+        return None
+    start = np.searchsorted(rates['time'], _to_seconds(date_from), side='left')
+    end = np.searchsorted(rates['time'], _to_seconds(date_to), side='right')
+    return rates[start:end].copy()
+
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    """As 'count' barras mais recentes a partir da posição start_pos (0 = barra atual)."""
+    _count('copy_rates_from_pos')
+    rates = _visible(symbol)
+    if rates is None:
+        return None
+    end = len(rates) - start_pos
+    return rates[max(0, end - count):max(0, end)].copy()
+
+# --- Conta Simulada ---
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume'])
+OrderSendResult = namedtuple('OrderSendResult', ['retcode', 'deal', 'order', 'volume', 'price',
+                                                 'bid', 'ask', 'comment', 'request'])
+TradePosition = namedtuple('TradePosition', ['ticket', 'time', 'type', 'magic', 'identifier', 'volume',
+                                             'price_open', 'sl', 'tp', 'price_current', 'profit',
+                                             'symbol', 'comment'])
+TradeDeal = namedtuple('TradeDeal', ['ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic',
+                                     'position_id', 'volume', 'price', 'commission', 'swap', 'profit',
+                                     'fee', 'symbol', 'comment'])
+
+def _current_bar(symbol):
+    rates = _visible(symbol)
+    if rates is None or len(rates) == 0:
+        return None
+    return rates[-1]
+
+def _quote(symbol):
+    """(bid, ask) atuais: a abertura da vela em formação mais o spread."""
+    bar = _current_bar(symbol)
+    if bar is None:
+        return None
+    bid = float(bar['open'])
+    return bid, bid + int(bar['spread']) * POINT
+
+def _ticket():
+    ticket = _state['next_ticket']
+    _state['next_ticket'] += 1
+    return ticket
+
+def _add_deal(position, entry, price, time_, profit=0.0, comment=""):
+    buy = (position['type'] == POSITION_TYPE_BUY) == (entry == DEAL_ENTRY_IN)
+    deal = TradeDeal(ticket=_ticket(), order=position['ticket'], time=int(time_), time_msc=int(time_) * 1000,
+                     type=DEAL_TYPE_BUY if buy else DEAL_TYPE_SELL, entry=entry, magic=position['magic'],
+                     position_id=position['ticket'], volume=position['volume'], price=price,
+                     commission=0.0, swap=0.0, profit=profit, fee=0.0, symbol=position['symbol'],
+                     comment=comment)
+    _state['deals'].append(deal)
+    return deal
+
+def _profit(position, price):
+    direction = 1 if position['type'] == POSITION_TYPE_BUY else -1
+    return round(direction * (price - position['price_open']) * position['volume'] * CONTRACT_SIZE, 2)
+
+def _close(position, price, time_, comment):
+    del _state['positions'][position['ticket']]
+    _add_deal(position, DEAL_ENTRY_OUT, price, time_, _profit(position, price), comment)
+
+def _advance():
+    """
+    Fecha as posições cujo stop ou alvo foi atingido pelas velas que fecharam
+    desde a última verificação. O stop tem prioridade quando os dois cabem na
+    mesma vela e gaps são executados na abertura. Como só se sabe que a vela
+    atingiu o nível depois que ela fecha, o deal recebe o horário do fechamento
+    da vela (menos 1s).
+    """
+    for position in list(_state['positions'].values()):
+        rates = _visible(position['symbol'])
+        bar_seconds = _state['bar_seconds'][position['symbol']]
+        now = _state['now'] if _state['now'] is not None else int(rates['time'][-1]) + bar_seconds
+        start = np.searchsorted(rates['time'], position['checked'], side='left')
+        end = np.searchsorted(rates['time'], now - bar_seconds, side='right') # Só velas já fechadas
+        buy = position['type'] == POSITION_TYPE_BUY
+        for bar in rates[start:end]:
+            spread = int(bar['spread']) * POINT
+            # Compra fecha no bid; venda fecha no ask (bid + spread)
+            low, high, open_ = (bar['low'], bar['high'], bar['open']) if buy else \
+                (bar['low'] + spread, bar['high'] + spread, bar['open'] + spread)
+            close_time = int(bar['time']) + bar_seconds - 1
+            sl, tp = position['sl'], position['tp']
+            if sl and (low <= sl if buy else high >= sl):
+                price = min(open_, sl) if buy else max(open_, sl)
+                _close(position, float(price), close_time, "[sl]")
+                break
+            if tp and (high >= tp if buy else low <= tp):
+                price = max(open_, tp) if buy else min(open_, tp)
+                _close(position, float(price), close_time, "[tp]")
+                break
+        else:
+            if end > start:
+                position['checked'] = int(rates['time'][end - 1]) + bar_seconds
+
+def symbol_info_tick(symbol):
+    _count('symbol_info_tick')
+    quote = _quote(symbol)
+    if quote is None:
+        return None
+    bid, ask = quote
+    time_ = _state['now'] if _state['now'] is not None else int(_current_bar(symbol)['time'])
+    return Tick(time=time_, bid=bid, ask=ask, last=bid, volume=0)
+
+def order_send(request):
+    """Ordem a mercado (TRADE_ACTION_DEAL): abre uma posição no bid/ask atual, com stop e alvo."""
+    _count('order_send')
+    _advance()
+    symbol = request['symbol']
+    quote = _quote(symbol)
+    if quote is None:
+        return OrderSendResult(TRADE_RETCODE_MARKET_CLOSED, 0, 0, 0.0, 0.0, 0.0, 0.0, "Market closed", request)
+    bid, ask = quote
+    if request.get('action') != TRADE_ACTION_DEAL or request.get('type') not in (ORDER_TYPE_BUY, ORDER_TYPE_SELL):
+        return OrderSendResult(TRADE_RETCODE_INVALID, 0, 0, 0.0, 0.0, bid, ask, "Invalid request", request)
+
+    buy = request['type'] == ORDER_TYPE_BUY
+    price = ask if buy else bid
+    sl, tp = request.get('sl', 0.0), request.get('tp', 0.0)
+    if (sl and (sl >= price if buy else sl <= price)) or (tp and (tp <= price if buy else tp >= price)):
+        return OrderSendResult(TRADE_RETCODE_INVALID_STOPS, 0, 0, 0.0, 0.0, bid, ask, "Invalid stops", request)
+
+    now = _state['now'] if _state['now'] is not None else int(_current_bar(symbol)['time'])
+    bar_seconds = _state['bar_seconds'][symbol]
+    ticket = _ticket()
+    position = {'ticket': ticket, 'time': now, 'type': POSITION_TYPE_BUY if buy else POSITION_TYPE_SELL,
+                'magic': request.get('magic', 0), 'volume': request['volume'], 'price_open': price,
+                'sl': sl, 'tp': tp, 'symbol': symbol, 'comment': request.get('comment', ""),
+                'checked': now - now % bar_seconds} # Verifica stop/alvo a partir da vela em formação
+    _state['positions'][ticket] = position
+    deal = _add_deal(position, DEAL_ENTRY_IN, price, now, comment=position['comment'])
+    return OrderSendResult(TRADE_RETCODE_DONE, deal.ticket, ticket, request['volume'], price, bid, ask,
+                           "Request executed", request)
+
+def positions_get(symbol=None, ticket=None):
+    _count('positions_get')
+    _advance()
+    result = []
+    for p in _state['positions'].values():
+        if (symbol is None or p['symbol'] == symbol) and (ticket is None or p['ticket'] == ticket):
+            bid, ask = _quote(p['symbol'])
+            current = bid if p['type'] == POSITION_TYPE_BUY else ask
+            result.append(TradePosition(p['ticket'], p['time'], p['type'], p['magic'], p['ticket'], p['volume'],
+                                        p['price_open'], p['sl'], p['tp'], current, _profit(p, current),
+                                        p['symbol'], p['comment']))
+    return tuple(result)
+
+def history_deals_get(date_from, date_to, group=None):
+    """Deals com horário entre date_from e date_to (inclusive)."""
+    _count('history_deals_get')
+    _advance()
+    start, end = _to_seconds(date_from), _to_seconds(date_to)
+    return tuple(d for d in _state['deals'] if start <= d.time <= end)
@@ -0,0 +1,182 @@
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from armazenamento import append_table, exists, load_ohlc_frame, load_table
+from motor_features import FEATURES, compute_features
+from inferencia_rapida import FlatForest, is_supported
+from backtest_vetorizado import add_predictions, run_backtest
+
+# --- Arquivos ---
+INPUT_FILE = "dados_com_indicadores.parquet"
+MODEL_FILE = "modelo_ia_trade.joblib"
+RESULTS_FILE = "resultados_otimizacao.parquet"
+
+# --- Grade de Parâmetros ---
+# rr = 0 reproduz a EstrategiaIA (sem stop/alvo); rr > 0 usa o stop/alvo do robo_trader
+# (stop na mínima/máxima -/+ 1 ATR e alvo com a relação risco/retorno indicada)
+GRID = {
+    'ema_short': [20, 50, 100],
+    'ema_long': [100, 200, 300],
+    'atr_period': [10, 14, 20],
+    'atr_factor': [0.5, 0.7, 1.0],
+    'levels': ['1', '12', '123'], # Níveis de S/R usados no sinal ('12' = S1/R1 e S2/R2)
+    'rr': [0, 1.5, 2.0],
+}
+
+# --- Parâmetros da Execução ---
+MAX_WORKERS = os.cpu_count() or 1
+FLUSH_EVERY = 20 # Resultados acumulados antes de gravar na tabela (retomada após interrupção)
+METRICS = ['final_value', 'total_return', 'sharpe', 'max_drawdown', 'calmar', 'sqn',
+           'total_trades', 'win_rate', 'profit_factor', 'expectancy']
+
+# Colunas comuns a todas as combinações (não dependem dos períodos de EMA/ATR)
+BASE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'real_volume',
+                'pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3',
+                'engulfing', 'hammer', 'hour', 'day_of_week']
+
+def combo_key(params):
+    """Identificador estável de uma combinação (usado para retomar a varredura)."""
+    return "|".join(f"{name}={params[name]}" for name in GRID)
+
+def grid_combos(grid=GRID):
+    """Todas as combinações válidas da grade (EMA curta menor que a longa)."""
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        if params['ema_short'] < params['ema_long']:
+            yield params
+
+def random_combos(count, grid=GRID, seed=42):
+    """Amostra 'count' combinações distintas da grade, de forma reprodutível."""
+    combos = list(grid_combos(grid))
+    random.Random(seed).shuffle(combos)
+    return combos[:count]
+
+# --- Indicadores Compartilhados ---
+def build_indicator_matrix(df, grid=GRID):
+    """
+    Calcula uma única vez cada indicador usado pela grade (uma EMA por período,
+    um ATR por período, pivots, velas e tempo) e empilha tudo em uma matriz float64
+    (uma linha por coluna). Retorna a matriz e os nomes das linhas.
+    """
+    ema_periods = sorted(set(grid['ema_short']) | set(grid['ema_long']))
+    features = [f for f in FEATURES if f[1] not in ('ema', 'atr', 'sessions')]
+    features += [(f'ema_{p}', 'ema', {'period': p}) for p in ema_periods]
+    features += [(f'atr_{p}', 'atr', {'period': p}) for p in sorted(set(grid['atr_period']))]
+    df = compute_features(df, features)
+    # Tempo em segundos (exato em float64) para caber na mesma matriz
+    df['time'] = df['time'].astype('datetime64[s]').astype('int64')
+
+    names = BASE_COLUMNS + [name for name, _, _ in features if name.startswith(('ema_', 'atr_'))]
+    return np.vstack([df[name].to_numpy(dtype=np.float64) for name in names]), names
+
+# --- Worker ---
+_worker = {}
+
+def _init_worker(shm_name, shape, names, model_file):
+    # Só o processo principal apaga o bloco (unlink) ao fim da varredura
+    shm = shared_memory.SharedMemory(name=shm_name)
+    model = joblib.load(model_file)
+    _worker.update(
+        shm=shm, # Mantém a referência para o bloco não ser fechado
+        matrix=np.ndarray(shape, dtype=np.float64, buffer=shm.buf),
+        rows={name: i for i, name in enumerate(names)},
+        model=model,
+        forest=FlatForest(model) if is_supported(model) else None,
+    )
+
+def evaluate(params):
+    """Roda o backtest vetorizado de uma combinação com os indicadores compartilhados."""
+    start = time.perf_counter()
+    matrix, rows = _worker['matrix'], _worker['rows']
+    # Visões sem cópia das linhas da matriz compartilhada
+    columns = {name: matrix[rows[name]] for name in BASE_COLUMNS if name != 'time'}
+    columns['ema50'] = matrix[rows[f"ema_{params['ema_short']}"]]
+    columns['ema200'] = matrix[rows[f"ema_{params['ema_long']}"]]
+    columns['atr14'] = matrix[rows[f"atr_{params['atr_period']}"]]
+    df = pd.DataFrame(columns, copy=False)
+    df['time'] = pd.to_datetime(matrix[rows['time']].astype(np.int64), unit='s')
+
+    levels = tuple(int(level) for level in str(params['levels']))
+    df = add_predictions(df, _worker['model'], atr_factor=params['atr_factor'], levels=levels,
+                         forest=_worker['forest'])
+    esquema = {'nome': f"rr{params['rr']}", 'tipo': 'rr', 'rr': params['rr']} if params['rr'] else None
+    metrics = run_backtest(df, esquema=esquema)['metrics']
+
+    result = dict(params, key=combo_key(params))
+    result.update({name: metrics[name] for name in METRICS})
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+# --- Varredura ---
+def run_sweep(combos, results_file=RESULTS_FILE, max_workers=MAX_WORKERS):
+    """
+    Avalia as combinações em um pool de processos. Combinações já presentes em
+    results_file são puladas, e os resultados são gravados em lotes, de modo que
+    uma varredura interrompida continua de onde parou.
+    """
+    combos = list(combos)
+    done = set()
+    if exists(results_file):
+        done = set(load_table(results_file, columns=['key'])['key'])
+    pending = [params for params in combos if combo_key(params) not in done]
+    print(f"{len(combos)} combinações; {len(combos) - len(pending)} já avaliadas em {results_file}; "
+          f"{len(pending)} a avaliar com {max_workers} processo(s).")
+    if not pending:
+        return load_table(results_file)
+
+    print(f"Calculando indicadores compartilhados a partir de {INPUT_FILE}...")
+    matrix, names = build_indicator_matrix(load_ohlc_frame(INPUT_FILE, columns=['time', 'open', 'high', 'low', 'close']))
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)[:] = matrix
+    print(f"{len(names)} séries ({matrix.nbytes / 1e6:.1f} MB) em memória compartilhada.")
+
+    buffer = []
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(shm.name, matrix.shape, names, MODEL_FILE)) as pool:
+            futures = [pool.submit(evaluate, params) for params in pending]
+            for count, future in enumerate(as_completed(futures), 1):
+                buffer.append(future.result())
+                if len(buffer) >= FLUSH_EVERY:
+                    append_table(pd.DataFrame(buffer), results_file)
+                    buffer = []
+                    print(f"{count}/{len(pending)} combinações avaliadas "
+                          f"({time.perf_counter() - start:.1f}s)")
+    finally:
+        # Grava o que já terminou mesmo se a varredura for interrompida
+        if buffer:
+            append_table(pd.DataFrame(buffer), results_file)
+        shm.close()
+        shm.unlink()
+
+    print(f"Varredura concluída em {time.perf_counter() - start:.1f}s.")
+    return load_table(results_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Otimização de parâmetros da estratégia em paralelo.")
+    parser.add_argument("--aleatorio", type=int, default=None,
+                        help="Avalia N combinações sorteadas da grade em vez da grade completa.")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do sorteio (--aleatorio).")
+    parser.add_argument("--processos", type=int, default=MAX_WORKERS, help="Número de processos.")
+    parser.add_argument("--saida", default=RESULTS_FILE, help="Tabela de resultados (retomada automática).")
+    parser.add_argument("--ordenar", default="sharpe", choices=METRICS, help="Métrica usada no ranking final.")
+    args = parser.parse_args()
+
+    combos = random_combos(args.aleatorio, seed=args.semente) if args.aleatorio else grid_combos()
+    results = run_sweep(combos, results_file=args.saida, max_workers=args.processos)
+
+    print(f"\n--- 10 melhores combinações por {args.ordenar} ---")
+    columns = list(GRID) + ['sharpe', 'total_return', 'max_drawdown', 'total_trades', 'profit_factor']
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(results.sort_values(args.ordenar, ascending=False).head(10)[columns].to_string(index=False))
@@ -0,0 +1,398 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from armazenamento import import_csv
+
+# --- Arquivos ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNS_DIR = "execucoes_pipeline"       # Manifestos das execuções, logs das etapas e estado do cache
+STATE_FILE = "estado.json"            # Hash das entradas/saídas da última execução bem-sucedida de cada etapa
+CONFIG_FILE = "config_ativos.json"    # Ativos do runtime multiativos (um ramo de coleta por ativo)
+JOURNAL_FILE = "diario_trades.db"
+
+# --- Ativo Principal (o das etapas de features, sinais e treino) ---
+MAIN_SYMBOL = "XAUUSD"
+MAIN_TIMEFRAME = "H1"
+DATA_FILE = "xauusd_h1_data.parquet"
+
+# --- Execução ---
+MAX_WORKERS = 2      # Etapas independentes executadas ao mesmo tempo
+HASH_CHUNK = 1 << 20
+
+class Stage:
+    """
+    Etapa do pipeline: um script Python executado em um processo próprio.
+    'inputs' e 'outputs' são arquivos ou diretórios; uma etapa depende das que
+    produzem as suas entradas. 'params' entra no hash da etapa (valores chamáveis
+    são avaliados na hora da execução). Etapas 'volatile' dependem de algo externo
+    (o MT5) e sempre são executadas.
+    """
+
+    def __init__(self, name, args, inputs=(), outputs=(), params=None, volatile=False):
+        self.name = name
+        self.args = list(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.volatile = volatile
+
+    @property
+    def command(self):
+        return [sys.executable] + self.args
+
+    def resolved_params(self):
+        return {k: v() if callable(v) else v for k, v in self.params.items()}
+
+def closed_trades():
+    """Trades reais fechados no diário (o retreino só muda se aumentarem)."""
+    if not os.path.exists(JOURNAL_FILE):
+        return 0
+    from diario_trades import TradeJournal
+    journal = TradeJournal(JOURNAL_FILE)
+    try:
+        return journal.closed_count()
+    finally:
+        journal.close()
+
+def collection_branches(config_file=CONFIG_FILE):
+    """(símbolo, timeframe) de cada ativo da configuração, com o ativo principal primeiro."""
+    branches = [(MAIN_SYMBOL, MAIN_TIMEFRAME)]
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            for item in json.load(f).get('instruments', []):
+                branch = (item['symbol'], item.get('timeframe', MAIN_TIMEFRAME))
+                if branch not in branches:
+                    branches.append(branch)
+    return branches
+
+def _imported_modules(tree, entry):
+    """Nomes importados na árvore; fora do script executado, só os importados ao carregar o módulo."""
+    def lazy(node):
+        # Funções e o bloco __main__ só rodam no script da etapa
+        return isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or (
+            isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == '__name__')
+
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop()
+        if not entry and lazy(node):
+            continue
+        if isinstance(node, ast.Import):
+            yield from (alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            yield node.module
+        nodes.extend(ast.iter_child_nodes(node))
+
+def script_modules(script):
+    """
+    O script de uma etapa e os módulos do projeto que ele usa, direta ou
+    indiretamente, em ordem alfabética: as entradas de código da etapa.
+    """
+    modules, pending = set(), [script]
+    while pending:
+        path = pending.pop()
+        if path in modules:
+            continue
+        modules.add(path)
+        with open(os.path.join(BASE_DIR, path), 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for name in _imported_modules(tree, entry=path == script):
+            module = name.split('.')[0] + ".py"
+            if os.path.isfile(os.path.join(BASE_DIR, module)):
+                pending.append(module)
+    return sorted(modules)
+
+def default_stages(config_file=CONFIG_FILE):
+    """
+    DAG padrão: coleta incremental de cada ativo (em paralelo) -> indicadores ->
+    sinais -> treino -> backtest, com a validação walk-forward em paralelo ao
+    treino (ela só precisa das velas).
+    """
+    stages = []
+    for symbol, timeframe in collection_branches(config_file):
+        main = (symbol, timeframe) == (MAIN_SYMBOL, MAIN_TIMEFRAME)
+        store = os.path.join("dados_mercado", symbol, timeframe)
+        stages.append(Stage(
+            f"coleta_{symbol}_{timeframe}",
+            ["coleta_dados.py", "--incremental", "--simbolos", symbol, "--timeframe", timeframe]
+            + (["--consolidar"] if main else []),
+            inputs=script_modules("coleta_dados.py"), outputs=[store] + ([DATA_FILE] if main else []), volatile=True))
+
+    # Além dos dados, cada etapa depende do código do seu script e dos módulos importados por ele
+    stages += [
+        Stage("indicadores", ["calcula_indicadores.py"],
+              inputs=[DATA_FILE] + script_modules("calcula_indicadores.py"),
+              outputs=["dados_com_indicadores.parquet"]),
+        Stage("sinais", ["gerador_de_sinais.py"],
+              inputs=["dados_com_indicadores.parquet"] + script_modules("gerador_de_sinais.py"),
+              outputs=["dataset_final_para_ia.parquet", "dataset_rotulos_ia.parquet"]),
+        Stage("treino", ["treinamento_ia.py", "--modo", "auto"],
+              inputs=["dataset_final_para_ia.parquet", "dataset_rotulos_ia.parquet"]
+              + script_modules("treinamento_ia.py"),
+              outputs=["modelo_ia_trade.joblib", "modelo_ia_trade.json"],
+              params={'trades_fechados': closed_trades}),
+        Stage("walk_forward", ["validacao_walk_forward.py"],
+              inputs=[DATA_FILE] + script_modules("validacao_walk_forward.py"),
+              outputs=["walk_forward_folds.parquet", "walk_forward_equity.parquet"]),
+        Stage("backtest", ["backtest_vetorizado.py"],
+              inputs=["dados_com_indicadores.parquet", "modelo_ia_trade.joblib"]
+              + script_modules("backtest_vetorizado.py")),
+    ]
+    return stages
+
+# --- Hash de Conteúdo ---
+def _file_hash(path, cache):
+    """SHA-256 do arquivo; reaproveita o hash anterior se tamanho e data de modificação não mudaram."""
+    stat = os.stat(path)
+    key = os.path.relpath(path, BASE_DIR)
+    cached = cache.get(key)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    cache[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+def content_hash(path, cache):
+    """Hash do arquivo, ou de todos os arquivos de um diretório (caminho e conteúdo); None se não existir."""
+    if os.path.isfile(path):
+        return _file_hash(path, cache)
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode())
+            digest.update(_file_hash(file_path, cache).encode())
+    return digest.hexdigest()
+
+# --- Pipeline ---
+class Pipeline:
+    """
+    Executa as etapas na ordem das dependências, com as independentes em paralelo.
+    Uma etapa é pulada quando o hash das suas entradas, do comando e dos
+    parâmetros é o mesmo da última execução bem-sucedida e as suas saídas ainda
+    estão iguais ao que ela produziu. Cada execução grava um manifesto com o
+    tempo, o hash e os artefatos de cada etapa.
+    """
+
+    def __init__(self, stages, runs_dir=RUNS_DIR, max_workers=MAX_WORKERS):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Nomes de etapa repetidos.")
+        self.runs_dir = os.path.join(BASE_DIR, runs_dir)
+        self.max_workers = max_workers
+        self.dependencies = self._dependencies()
+        self.order = self._topological_order()
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+
+    def _dependencies(self):
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"'{output}' é produzido por '{producers[output]}' e '{stage.name}'.")
+                producers[output] = stage.name
+        return {stage.name: sorted({producers[i] for i in stage.inputs if i in producers} - {stage.name})
+                for stage in self.stages.values()}
+
+    def _topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError("Ciclo entre as etapas: " + " -> ".join(path + [name]))
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency, path + [name])
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def _load_state(self):
+        path = os.path.join(self.runs_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {'stages': {}, 'files': {}}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _save_state(self):
+        path = os.path.join(self.runs_dir, STATE_FILE)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _path(self, relative):
+        return os.path.join(BASE_DIR, relative)
+
+    def _hashes(self, paths):
+        with self._lock:
+            return {p: content_hash(self._path(p), self.state['files']) for p in paths}
+
+    def stage_key(self, stage):
+        """Hash do comando, dos parâmetros e do conteúdo das entradas da etapa. Retorna (hash, entradas, parâmetros)."""
+        with self._lock:
+            # Tabela só em CSV, ou com o CSV mais novo (ex: xauusd_h1_data.csv do repositório):
+            # importa antes do hash, como o load_table faria na etapa, para o hash não mudar
+            # na execução seguinte
+            for path in stage.inputs:
+                import_csv(self._path(path))
+        inputs = self._hashes(stage.inputs)
+        params = stage.resolved_params()
+        payload = json.dumps({'command': stage.args, 'params': params, 'inputs': inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest(), inputs, params
+
+    def up_to_date(self, stage, key):
+        previous = self.state['stages'].get(stage.name)
+        if stage.volatile or previous is None or previous['key'] != key:
+            return False
+        return self._hashes(stage.outputs) == previous['outputs']
+
+    def _run_stage(self, stage, log_path):
+        start = time.perf_counter()
+        env = dict(os.environ, PYTHONIOENCODING="utf-8")
+        with open(log_path, 'w', encoding='utf-8') as log:
+            process = subprocess.run(stage.command, cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT, env=env)
+        return process.returncode, time.perf_counter() - start
+
+    def _log(self, message):
+        with self._lock:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", flush=True)
+
+    def _execute(self, name, run_dir, force):
+        """Executa (ou pula) uma etapa e devolve o registro dela para o manifesto."""
+        stage = self.stages[name]
+        key, inputs, params = self.stage_key(stage)
+        record = {'command': stage.args, 'params': params, 'key': key, 'inputs': inputs}
+        if not force and self.up_to_date(stage, key):
+            self._log(f"{name}: pulada (entradas e saídas inalteradas)")
+            return dict(record, status='pulada', seconds=0.0, outputs=self.state['stages'][name]['outputs'])
+
+        self._log(f"{name}: executando {' '.join(stage.args)}")
+        log_path = os.path.join(run_dir, f"{name}.log")
+        returncode, seconds = self._run_stage(stage, log_path)
+        outputs = self._hashes(stage.outputs)
+        missing = [p for p, h in outputs.items() if h is None]
+        record.update(seconds=seconds, outputs=outputs, log=os.path.relpath(log_path, BASE_DIR),
+                      returncode=returncode)
+        if returncode != 0 or missing:
+            reason = f"código {returncode}" if returncode != 0 else "saídas ausentes: " + ", ".join(missing)
+            self._log(f"{name}: FALHOU em {seconds:.1f}s ({reason}; veja {record['log']})")
+            return dict(record, status='falhou')
+
+        self._log(f"{name}: concluída em {seconds:.1f}s")
+        with self._lock:
+            self.state['stages'][name] = {'key': key, 'outputs': outputs,
+                                          'finished': datetime.now().isoformat(timespec='seconds')}
+            self._save_state()
+        return dict(record, status='executada')
+
+    def run(self, selected=None, force=False):
+        """
+        Executa as etapas 'selected' (todas por padrão); as demais são consideradas
+        prontas e as suas saídas usadas como estão. Retorna o manifesto da execução.
+        """
+        selected = list(self.order) if selected is None else [n for n in self.order if n in selected]
+        run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        run_dir = os.path.join(self.runs_dir, run_id)
+        os.makedirs(run_dir, exist_ok=True)
+
+        manifest = {'run': run_id, 'started': datetime.now().isoformat(timespec='seconds'),
+                    'python': sys.executable, 'stages': {}}
+        pending = set(selected)
+        running = {}
+        failed = set()
+        wall = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in [n for n in self.order if n in pending]:
+                    dependencies = [d for d in self.dependencies[name] if d in selected]
+                    if any(d in failed for d in dependencies):
+                        pending.discard(name)
+                        failed.add(name)
+                        manifest['stages'][name] = {'status': 'bloqueada',
+                                                    'blocked_by': [d for d in dependencies if d in failed]}
+                        self._log(f"{name}: bloqueada (falha em {', '.join(manifest['stages'][name]['blocked_by'])})")
+                    elif all(d in manifest['stages'] for d in dependencies):
+                        pending.discard(name)
+                        running[pool.submit(self._execute, name, run_dir, force)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    record = future.result()
+                    manifest['stages'][name] = record
+                    if record['status'] == 'falhou':
+                        failed.add(name)
+
+        manifest['finished'] = datetime.now().isoformat(timespec='seconds')
+        manifest['seconds'] = time.perf_counter() - wall
+        manifest['stages'] = {n: manifest['stages'][n] for n in self.order if n in manifest['stages']}
+        with open(os.path.join(self.runs_dir, f"{run_id}.json"), 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        return manifest
+
+    def describe(self):
+        """Imprime a ordem das etapas, as dependências e se cada uma está em dia."""
+        for name in self.order:
+            stage = self.stages[name]
+            key = self.stage_key(stage)[0]
+            status = "sempre executa" if stage.volatile else ("em dia" if self.up_to_date(stage, key) else "desatualizada")
+            after = ", ".join(self.dependencies[name]) or "-"
+            print(f"{name:<22} depende de: {after:<40} {status}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline de dados, treino e backtest com cache por hash de conteúdo.")
+    parser.add_argument("--etapas", nargs="+", default=None,
+                        help="Executa só estas etapas (as demais usam as saídas já existentes).")
+    parser.add_argument("--sem-coleta", action="store_true",
+                        help="Não executa as etapas de coleta (sem o terminal MT5).")
+    parser.add_argument("--forcar", action="store_true", help="Executa as etapas mesmo se estiverem em dia.")
+    parser.add_argument("--paralelo", type=int, default=MAX_WORKERS, help="Etapas executadas ao mesmo tempo.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Ativos com ramo de coleta próprio.")
+    parser.add_argument("--listar", action="store_true", help="Mostra as etapas e o estado do cache, sem executar.")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(default_stages(args.config), max_workers=args.paralelo)
+    if args.listar:
+        pipeline.describe()
+        raise SystemExit(0)
+
+    selected = args.etapas or list(pipeline.order)
+    unknown = sorted(set(selected) - set(pipeline.stages))
+    if unknown:
+        raise SystemExit(f"Etapas desconhecidas: {', '.join(unknown)}")
+    if args.sem_coleta:
+        selected = [n for n in selected if not pipeline.stages[n].volatile]
+
+    manifest = pipeline.run(selected, force=args.forcar)
+    counts = {}
+    for record in manifest['stages'].values():
+        counts[record['status']] = counts.get(record['status'], 0) + 1
+    print(f"\nPipeline concluído em {manifest['seconds']:.1f}s: "
+          + ", ".join(f"{n} {status}" for status, n in counts.items())
+          + f". Manifesto: {os.path.join(RUNS_DIR, manifest['run'] + '.json')}")
+    if counts.get('falhou') or counts.get('bloqueada'):
+        raise SystemExit(1)
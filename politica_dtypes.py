@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+
+# --- Esquema de Tipos ---
+# Tipo de cada coluna das tabelas do pipeline. Os preços brutos continuam em
+# float64: calcular os indicadores a partir de preços em float32 muda sinais (ver
+# check_precision). Os indicadores já calculados cabem em float32 sem mudar sinais,
+# rótulos nem previsões. 'int' = menor inteiro com sinal que comporta os valores.
+SCHEMA = {
+    'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64',
+    'pivot': 'float32', 'r1': 'float32', 's1': 'float32', 'r2': 'float32', 's2': 'float32',
+    'r3': 'float32', 's3': 'float32',
+    'engulfing': 'int8', 'hammer': 'int8', 'hour': 'int8', 'day_of_week': 'int8',
+    'signal': 'int8', 'prediction': 'int8', 'target': 'int8',
+    'tick_volume': 'int32', 'real_volume': 'int', 'spread': 'int',
+    'symbol': 'category',
+}
+# Regras por prefixo, para as colunas com nome variável
+PREFIX_SCHEMA = [
+    ('ema', 'float32'), ('atr', 'float32'),
+    ('session_', 'int8'),
+    ('y_', 'int8'), # Matriz de rótulos (-1/0/1)
+]
+# Matrizes de treino/previsão: os modelos de árvore do scikit-learn já convertem X
+# para float32 internamente, então guardar as matrizes assim não muda o modelo
+MODEL_MATRIX_DTYPE = np.float32
+
+INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+def column_dtype(name):
+    """Tipo do esquema para a coluna 'name' (None se ela não estiver no esquema)."""
+    if name in SCHEMA:
+        return SCHEMA[name]
+    for prefix, dtype in PREFIX_SCHEMA:
+        if name.startswith(prefix):
+            return dtype
+    return None
+
+def _smallest_int(values, start=np.int8):
+    low, high = values.min(), values.max()
+    for dtype in INT_TYPES[INT_TYPES.index(start):]:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+def _cast(series, dtype):
+    """Converte uma coluna para o tipo do esquema, ou a devolve como está se ele não couber."""
+    kind = series.dtype.kind
+    if dtype == 'category':
+        return series.astype('category') if kind in 'OU' else series
+    if dtype.startswith('float'):
+        return series.astype(dtype) if kind == 'f' else series
+    if kind not in 'iubf' or series.empty:
+        return series
+    values = series.to_numpy()
+    if kind == 'f' and (np.isnan(values).any() or not np.array_equal(values, np.round(values))):
+        return series # Inteiros com NaN (ex: alvo antes da filtragem) continuam em float
+    target = _smallest_int(values, np.int8 if dtype == 'int' else np.dtype(dtype).type)
+    return series.astype(target) if target is not None else series
+
+def apply_policy(df):
+    """
+    Aplica o esquema de tipos a um DataFrame: indicadores em float32; flags,
+    padrões, hora/dia e rótulos em int8 (ou o menor inteiro que comporte os
+    valores); textos repetidos como category. Colunas fora do esquema não mudam.
+    """
+    casts = {}
+    for column in df.columns:
+        dtype = column_dtype(column)
+        if dtype is None:
+            continue
+        cast = _cast(df[column], dtype)
+        if cast.dtype != df[column].dtype:
+            casts[column] = cast
+    return df.assign(**casts) if casts else df
+
+def model_matrix(X):
+    """Matriz de features para treino/previsão no tipo MODEL_MATRIX_DTYPE (DataFrame ou array)."""
+    if isinstance(X, pd.DataFrame):
+        return X.astype(MODEL_MATRIX_DTYPE)
+    return np.asarray(X, dtype=MODEL_MATRIX_DTYPE)
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+# --- Verificação de Precisão ---
+def check_precision(raw, model=None):
+    """
+    Roda features, sinais, rótulos e previsões com os tipos originais e com a
+    política aplicada onde ela entra no pipeline (tabelas lidas com load_table e
+    matrizes do modelo), e compara. Também mede o caso dos preços brutos em float32,
+    que o esquema evita. Retorna um dict de contagens de diferenças e memória.
+    """
+    from motor_features import FEATURES, PATTERN_FEATURES, MODEL_FEATURES, compute_features
+    from gerador_de_sinais import compute_signals, get_trade_outcomes
+    from matriz_rotulos import build_label_matrix
+    from treinamento_ia import build_model
+
+    def labeled(features):
+        df = compute_signals(features)
+        df['target'] = get_trade_outcomes(df)
+        labels = build_label_matrix(df, np.flatnonzero(df['signal'] != 0))
+        return df, labels
+
+    # Referência: tudo em float64/int64
+    reference, reference_labels = labeled(compute_features(raw, FEATURES + PATTERN_FEATURES))
+    # Política: barras brutas e tabela de features lidas com o esquema (como o gerador_de_sinais)
+    lean_raw = apply_policy(raw)
+    lean, lean_labels = labeled(apply_policy(compute_features(lean_raw, FEATURES + PATTERN_FEATURES)))
+    # Preços brutos em float32 antes dos indicadores (o que o esquema não faz)
+    raw32 = raw.astype({c: np.float32 for c in ('open', 'high', 'low', 'close')})
+    price32, _ = labeled(compute_features(raw32, FEATURES + PATTERN_FEATURES))
+
+    resolved = reference['target'].notna()
+    report = {
+        'signals': int((reference['signal'] != lean['signal']).sum()),
+        'targets': int((reference['target'][resolved] != lean['target'][resolved]).sum()
+                       + (resolved != lean['target'].notna()).sum()),
+        'label_matrix': int((reference_labels.to_numpy() != lean_labels.to_numpy()).sum())
+                        if reference_labels.shape == lean_labels.shape else -1,
+        'signals_float32_prices': int((reference['signal'] != price32['signal']).sum()),
+        'memory_raw_mb': (memory_mb(raw), memory_mb(lean_raw)),
+        'memory_features_mb': (memory_mb(reference), memory_mb(lean)),
+    }
+
+    # Modelo: o mesmo treino com a matriz em float64 e em float32 e, se houver, o modelo ativo
+    rows = reference['target'].notna() & (reference['signal'] != 0)
+    X64 = reference.loc[rows, MODEL_FEATURES].to_numpy(dtype=np.float64)
+    X32 = model_matrix(lean.loc[rows, MODEL_FEATURES])
+    y = reference.loc[rows, 'target'].astype(int)
+    fitted64, fitted32 = build_model().fit(X64, y), build_model().fit(X32, y)
+    report['train_predictions'] = int((fitted64.predict(X64) != fitted32.predict(X32)).sum())
+    report['train_probability_max_diff'] = float(np.abs(fitted64.predict_proba(X64) - fitted32.predict_proba(X32)).max())
+    if model is not None:
+        features = list(model.feature_names_in_)
+        candidates = (reference['signal'] != 0) & reference[features].notna().all(axis=1)
+        P64 = model.predict_proba(reference.loc[candidates, features].astype(np.float64))
+        P32 = model.predict_proba(model_matrix(lean.loc[candidates, features]))
+        report['model_predictions'] = int((P64.argmax(axis=1) != P32.argmax(axis=1)).sum())
+        report['model_probability_max_diff'] = float(np.abs(P64 - P32).max())
+    report['model_matrix_mb'] = (X64.nbytes / 2**20, X32.to_numpy().nbytes / 2**20)
+    return report
+
+if __name__ == "__main__":
+    import os
+    import warnings
+    import joblib
+    from armazenamento import exists, load_table
+
+    # Tabelas do pipeline comparadas com e sem a política
+    TABLES = ["xauusd_h1_data.parquet", "dados_com_indicadores.parquet",
+              "dataset_final_para_ia.parquet", "dataset_rotulos_ia.parquet"]
+
+    raw = load_table("xauusd_h1_data.parquet", policy=False)
+    model = None
+    if os.path.exists("modelo_ia_trade.joblib"):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore") # Aviso de versão do scikit-learn ao carregar o modelo
+            model = joblib.load("modelo_ia_trade.joblib")
+    print(f"Verificando a política de tipos em {len(raw)} velas...")
+    report = check_precision(raw, model)
+
+    print("\n--- Diferenças com a política aplicada ---")
+    print(f"Sinais: {report['signals']} | alvos: {report['targets']} | matriz de rótulos: {report['label_matrix']}")
+    print(f"Treino com matriz float32: {report['train_predictions']} previsões diferentes "
+          f"(maior diferença de probabilidade: {report['train_probability_max_diff']:.2e})")
+    if 'model_predictions' in report:
+        print(f"Modelo ativo: {report['model_predictions']} previsões diferentes "
+              f"(maior diferença de probabilidade: {report['model_probability_max_diff']:.2e})")
+    print(f"Sinais diferentes se os preços brutos fossem float32 (evitado pelo esquema): "
+          f"{report['signals_float32_prices']}")
+
+    print("\n--- Memória (original -> política) ---")
+    sizes = [('Barras brutas', report['memory_raw_mb']), ('Features', report['memory_features_mb']),
+             ('Matriz do modelo', report['model_matrix_mb'])]
+    sizes += [(table, (memory_mb(load_table(table, policy=False)), memory_mb(load_table(table))))
+              for table in TABLES if exists(table)]
+    for name, (before, after) in sizes:
+        print(f"{name:<32} {before:>8.2f} MB -> {after:>8.2f} MB ({before / after:.1f}x)")
+
+    changed = report['signals'] + report['targets'] + report['label_matrix'] + report['train_predictions'] \
+        + report.get('model_predictions', 0)
+    if changed:
+        raise SystemExit("A política de tipos mudou resultados do pipeline.")
+    print("\nSinais, rótulos e previsões idênticos com a política de tipos.")
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timezone
+
+from diario_trades import server_time
+
+# --- Parâmetros ---
+INITIAL_LOOKBACK = 7 * 86400   # Sem cursor salvo: começa 7 dias atrás (o alcance da busca antiga)
+CATCH_UP_WINDOW = 86400        # Tamanho (s) de cada janela pedida ao MT5 durante a recuperação
+MAX_WINDOWS_PER_CALL = 7       # Janelas processadas por chamada (limita o custo após uma parada longa)
+SETTLE_SECONDS = 60            # Deals mais novos que isso ainda podem chegar: o cursor não passa deles
+DEAL_ENTRY_OUT = 1             # deal.entry de saída (fechamento de posição)
+
+def _utc(epoch):
+    # O MT5 interpreta datetimes como UTC (sem o fuso do servidor)
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+class DealReconciler:
+    """
+    Detecta trades fechados a partir dos deals do MT5 com um cursor (horário e
+    ticket do último deal processado) salvo no diário de trades. Cada chamada de
+    reconcile() pede ao MT5 só os deals posteriores ao cursor e os casa com os
+    trades abertos por um índice em dict (position_id -> features), então o custo
+    por iteração não cresce com o histórico da conta. Depois de uma parada longa,
+    o atraso é recuperado em janelas de CATCH_UP_WINDOW, no máximo
+    MAX_WINDOWS_PER_CALL por chamada.
+    """
+
+    def __init__(self, session, journal, magic, time_offset=0.0, clock=time.time,
+                 window=CATCH_UP_WINDOW, max_windows=MAX_WINDOWS_PER_CALL, settle=SETTLE_SECONDS):
+        self.session = session
+        self.journal = journal
+        self.magic = magic
+        # Diferença entre o horário do servidor (usado nos deals) e o relógio local
+        self.time_offset = time_offset
+        self.clock = clock
+        self.window = window
+        self.max_windows = max_windows
+        self.settle = settle
+        self.fetches = 0
+
+    def now(self):
+        """Horário atual no fuso do servidor, em segundos desde a época."""
+        return self.clock() + self.time_offset
+
+    def cursor(self):
+        """(horário, ticket) do último deal processado; sem cursor, INITIAL_LOOKBACK atrás."""
+        saved = self.journal.get_cursor()
+        if saved is None:
+            return int(self.now() - INITIAL_LOOKBACK), 0
+        return int(saved['time']), int(saved['ticket'])
+
+    def lag(self):
+        """Atraso do cursor em relação ao horário atual, em segundos."""
+        return self.now() - self.cursor()[0]
+
+    def reconcile(self, on_closed=None):
+        """
+        Processa os deals novos e fecha no diário os trades encontrados (chama
+        on_closed(ticket, deal) para cada um). Retorna quantos trades foram fechados.
+        """
+        open_trades = self.journal.open_trades()
+        cursor_time, cursor_ticket = self.cursor()
+        horizon = int(self.now()) - self.settle
+        if not open_trades:
+            # Nada pode fechar: o cursor só acompanha o relógio, sem consultar o MT5
+            if horizon > cursor_time:
+                self.journal.set_cursor({'time': horizon, 'ticket': 0})
+            return 0
+
+        closed = 0
+        for _ in range(self.max_windows):
+            window_end = cursor_time + self.window
+            # A última janela vai até um dia à frente (relógios do servidor e local podem divergir)
+            live = window_end >= horizon
+            to_time = int(self.now()) + 86400 if live else window_end
+            deals = self.session.history_deals_get(_utc(cursor_time), _utc(to_time))
+            self.fetches += 1
+
+            new_deals = sorted((d for d in deals or () if (d.time, d.ticket) > (cursor_time, cursor_ticket)),
+                               key=lambda d: (d.time, d.ticket))
+            for deal in new_deals:
+                # Deals depois do horizonte são processados, mas o cursor não passa deles: um deal
+                # com horário anterior ainda pode chegar e é buscado de novo na próxima chamada
+                if deal.time <= horizon:
+                    cursor_time, cursor_ticket = int(deal.time), int(deal.ticket)
+                if deal.entry == DEAL_ENTRY_OUT and deal.magic == self.magic and deal.position_id in open_trades:
+                    # Fechamento e avanço do cursor na mesma transação
+                    self.journal.close_trade(deal.position_id, target=1 if deal.profit > 0 else 0,
+                                             profit=deal.profit, closed_at=server_time(deal.time),
+                                             cursor={'time': cursor_time, 'ticket': cursor_ticket})
+                    del open_trades[deal.position_id]
+                    closed += 1
+                    if on_closed is not None:
+                        on_closed(deal.position_id, deal)
+
+            # Janela processada: o cursor avança até o fim dela (ou até o horizonte de assentamento)
+            settled = min(window_end, horizon)
+            if settled > cursor_time:
+                cursor_time, cursor_ticket = settled, 0
+            self.journal.set_cursor({'time': cursor_time, 'ticket': cursor_ticket})
+            if live or not open_trades:
+                break
+        return closed
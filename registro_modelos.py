@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+import joblib
+
+# --- Arquivos ---
+REGISTRY_DIR = "modelos"                               # Uma cópia de cada versão do modelo
+REGISTRY_FILE = os.path.join(REGISTRY_DIR, "registro.json")
+MODEL_FILE = "modelo_ia_trade.joblib"                  # Versão ativa, lida pelo robô e pelo backtest
+MODEL_INFO_FILE = "modelo_ia_trade.json"               # Metadados da versão ativa, lidos pelo robô
+
+def load_registry(path=REGISTRY_FILE):
+    """Lê o registro de versões ({'versions': [...], 'active': n}); vazio se não existir."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'versions': [], 'active': None}
+
+def _write_json(registry, path=REGISTRY_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(registry, f, indent=4, default=str)
+    os.replace(tmp_path, path)
+
+def _publish(entry, model_file=MODEL_FILE, info_file=MODEL_INFO_FILE):
+    """
+    Copia uma versão para o arquivo ativo de forma atômica (o robô nunca lê um arquivo
+    pela metade) e grava ao lado os metadados dela (sem as faixas de referência do PSI).
+    """
+    tmp_path = model_file + ".tmp"
+    shutil.copyfile(entry['file'], tmp_path)
+    os.replace(tmp_path, model_file)
+    info = {key: value for key, value in entry.items() if key != 'reference'}
+    _write_json(info, info_file)
+
+def load_model_info(path=MODEL_INFO_FILE):
+    """Metadados do modelo ativo (versão, família, hiperparâmetros, resultado da busca); {} se não houver."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def latest(registry, kind=None):
+    """Última versão registrada (opcionalmente só de um tipo: 'completo' ou 'incremental')."""
+    versions = [v for v in registry['versions'] if kind is None or v['kind'] == kind]
+    return versions[-1] if versions else None
+
+def active(registry):
+    """Versão ativa (a que está em MODEL_FILE)."""
+    return next((v for v in registry['versions'] if v['version'] == registry['active']), None)
+
+def register_model(model, info, registry_dir=REGISTRY_DIR, model_file=MODEL_FILE):
+    """
+    Salva o modelo como uma nova versão (modelos/modelo_vNNNN.joblib), registra seus
+    metadados e o publica como modelo ativo. Retorna a entrada do registro.
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    registry_file = os.path.join(registry_dir, os.path.basename(REGISTRY_FILE))
+    registry = load_registry(registry_file)
+
+    version = max((v['version'] for v in registry['versions']), default=0) + 1
+    path = os.path.join(registry_dir, f"modelo_v{version:04d}.joblib")
+    joblib.dump(model, path)
+
+    entry = dict(info, version=version, file=path, created=datetime.now().isoformat(timespec='seconds'),
+                 n_estimators=len(model.estimators_) if hasattr(model, 'estimators_')
+                 else int(getattr(model, 'n_iter_', 0)))
+    registry['versions'].append(entry)
+    registry['active'] = version
+    _publish(entry, model_file)
+    _write_json(registry, registry_file)
+    return entry
+
+def activate(version, registry_dir=REGISTRY_DIR, model_file=MODEL_FILE):
+    """Volta o modelo ativo para uma versão anterior do registro."""
+    registry_file = os.path.join(registry_dir, os.path.basename(REGISTRY_FILE))
+    registry = load_registry(registry_file)
+    entry = next((v for v in registry['versions'] if v['version'] == version), None)
+    if entry is None:
+        raise KeyError(f"Versão {version} não existe no registro.")
+    _publish(entry, model_file)
+    registry['active'] = version
+    _write_json(registry, registry_file)
+    return entry
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro de versões do modelo de IA.")
+    parser.add_argument("--ativar", type=int, default=None, help="Torna ativa uma versão anterior.")
+    args = parser.parse_args()
+
+    if args.ativar is not None:
+        entry = activate(args.ativar)
+        print(f"Versão {entry['version']} ({entry['kind']}, {entry['created']}) ativada em {MODEL_FILE}.")
+
+    registry = load_registry()
+    if not registry['versions']:
+        print("Nenhuma versão registrada. Rode 'python treinamento_ia.py' para criar a primeira.")
+    for v in registry['versions']:
+        marker = '*' if v['version'] == registry['active'] else ' '
+        accuracy = v.get('accuracy')
+        print(f"{marker} v{v['version']:04d}  {v['created']}  {v['kind']:<11} {v.get('family', 'random_forest'):<17} "
+              f"{v['n_estimators']:>4} árvores  "
+              f"amostras: {v.get('samples', 0):>6}  trades reais: {v.get('trades_used', 0):>5}  "
+              f"acurácia: {'N/A' if accuracy is None else f'{accuracy:.2%}'}")
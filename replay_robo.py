@@ -0,0 +1,137 @@
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import mt5_simulado
+
+# --- Parâmetros do Replay ---
+DATA_FILE = "xauusd_h1_data.csv"
+REPLAY_DIR = "replay"   # Diário e estado dos indicadores do replay (separados dos reais)
+MONTHS = 3              # Período reproduzido por padrão: os últimos MONTHS meses das barras
+SPEED = 0.0             # Segundos virtuais por segundo real (0 = o mais rápido possível)
+
+class ReplayFinished(BaseException):
+    """Fim do período virtual. Herda de BaseException para atravessar o 'except Exception' do loop do robô."""
+
+class VirtualClock:
+    """
+    Relógio virtual do replay: sleep() avança o tempo do terminal simulado em vez
+    de esperar (ou espera 1/speed do tempo, se speed > 0). Mede também o tempo
+    real gasto pelo robô entre uma espera e a seguinte: as iterações que começam
+    no fechamento de uma vela ficam em 'busy' e as verificações leves entre velas
+    em 'polls'.
+    """
+
+    def __init__(self, start, end, speed=SPEED, bar_seconds=3600, offset=0):
+        self.now = float(start)
+        self.end = end
+        self.speed = speed
+        self.bar_seconds = bar_seconds
+        self.offset = offset
+        self.busy = []  # Segundos reais de cada iteração iniciada no fechamento de uma vela
+        self.polls = [] # Segundos reais de cada verificação entre velas
+        self._resumed = time.perf_counter()
+        mt5_simulado.set_time(self.now)
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        elapsed = time.perf_counter() - self._resumed
+        at_bar_close = (self.now - self.offset) % self.bar_seconds == 0
+        (self.busy if at_bar_close else self.polls).append(elapsed)
+        if self.speed > 0:
+            time.sleep(seconds / self.speed)
+        self.now += seconds
+        if self.now >= self.end:
+            raise ReplayFinished()
+        mt5_simulado.set_time(self.now)
+        self._resumed = time.perf_counter()
+
+def run_replay(data=DATA_FILE, start=None, end=None, months=MONTHS, speed=SPEED, replay_dir=REPLAY_DIR,
+               symbol="XAUUSD"):
+    """
+    Roda o robo_trader.run_bot de verdade sobre as barras de 'data', com o
+    mt5_simulado no lugar do MetaTrader5 e um relógio virtual de 'start' a 'end'.
+    O diário e o estado dos indicadores ficam em replay_dir (recriado a cada execução).
+    Retorna um resumo com os trades e a latência das iterações.
+    """
+    mt5_simulado.install(data, symbol)
+    mt5_simulado.reset_account()
+    import robo_trader as robo # Só depois do install: o robô passa a usar o terminal simulado
+    from diario_trades import TradeJournal
+
+    times = mt5_simulado._state['rates'][symbol]['time']
+    end = int(pd.Timestamp(end).timestamp()) if end else int(times[-1])
+    start = int(pd.Timestamp(start).timestamp()) if start else \
+        int((pd.Timestamp(end, unit='s') - pd.DateOffset(months=months)).timestamp())
+    # Começa logo depois do fechamento de uma vela, como o agendador faria
+    start = start - start % robo.BAR_SECONDS + robo.BAR_CLOSE_OFFSET
+
+    shutil.rmtree(replay_dir, ignore_errors=True)
+    os.makedirs(replay_dir)
+    journal = TradeJournal(os.path.join(replay_dir, robo.JOURNAL_FILE))
+    journal.set_state('migrated_at', 'replay') # Não importa os arquivos reais de trades
+    robo.journal = robo.reconciler.journal = journal
+    robo.INDICATOR_STATE_FILE = os.path.join(replay_dir, robo.INDICATOR_STATE_FILE)
+    robo.SYMBOL = symbol
+
+    clock = VirtualClock(start, end, speed, robo.BAR_SECONDS, robo.BAR_CLOSE_OFFSET)
+    wall = time.perf_counter()
+    try:
+        robo.run_bot(clock=clock.clock, sleep=clock.sleep)
+    except ReplayFinished:
+        pass
+    wall = time.perf_counter() - wall
+
+    history = journal.history_frame()
+    busy = np.asarray(clock.busy) * 1000
+    summary = {
+        'start': pd.Timestamp(start, unit='s'), 'end': pd.Timestamp(end, unit='s'),
+        'wall_seconds': wall, 'speedup': (end - start) / wall if wall else float('inf'),
+        'iterations': len(busy), 'polls': len(clock.polls), 'deals': len(mt5_simulado._state['deals']),
+        'closed_trades': len(history), 'open_trades': len(journal.open_trades()),
+        'won_trades': int(history['target'].sum()) if len(history) else 0,
+        'profit': sum(d.profit for d in mt5_simulado._state['deals']),
+        'latency_p50_ms': float(np.percentile(busy, 50)) if len(busy) else 0.0,
+        'latency_p95_ms': float(np.percentile(busy, 95)) if len(busy) else 0.0,
+        'latency_max_ms': float(busy.max()) if len(busy) else 0.0,
+        'mt5_calls': mt5_simulado.call_counts(),
+    }
+    journal.close()
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay do robô trader sobre barras armazenadas, com relógio virtual.")
+    parser.add_argument("--dados", default=DATA_FILE, help="Barras reproduzidas (CSV).")
+    parser.add_argument("--inicio", default=None, help="Início do replay (padrão: --meses antes do fim).")
+    parser.add_argument("--fim", default=None, help="Fim do replay (padrão: última barra).")
+    parser.add_argument("--meses", type=int, default=MONTHS, help="Meses reproduzidos quando --inicio não é dado.")
+    parser.add_argument("--velocidade", type=float, default=SPEED,
+                        help="Segundos virtuais por segundo real (0 = o mais rápido possível).")
+    parser.add_argument("--perfil", default=None, help="Grava um perfil do cProfile do replay neste arquivo.")
+    args = parser.parse_args()
+
+    if args.perfil:
+        import cProfile
+        profiler = cProfile.Profile()
+        summary = profiler.runcall(run_replay, args.dados, args.inicio, args.fim, args.meses, args.velocidade)
+        profiler.dump_stats(args.perfil)
+    else:
+        summary = run_replay(args.dados, args.inicio, args.fim, args.meses, args.velocidade)
+
+    print("\n--- Resumo do Replay ---")
+    print(f"Período virtual: {summary['start']} a {summary['end']} | "
+          f"tempo real: {summary['wall_seconds']:.1f}s ({summary['speedup']:,.0f}x)")
+    print(f"Trades fechados: {summary['closed_trades']} (vencedores: {summary['won_trades']}) | "
+          f"abertos no fim: {summary['open_trades']} | lucro: {summary['profit']:.2f}")
+    print(f"Iterações do loop (fechamento de vela): {summary['iterations']} | "
+          f"verificações entre velas: {summary['polls']} | latência p50 {summary['latency_p50_ms']:.2f} ms, "
+          f"p95 {summary['latency_p95_ms']:.2f} ms, máx {summary['latency_max_ms']:.2f} ms")
+    print(f"Chamadas ao terminal: {summary['mt5_calls']}")
+    if args.perfil:
+        print(f"Perfil salvo em {args.perfil} (python -m pstats {args.perfil}).")
@@ -6,8 +6,9 @@ echo "--- INICIANDO RETREINAMENTO AUTOMATIZADO DA IA ---"
 REM Navega para o diretório onde o script está localizado
 cd /d "%~dp0"
 
-REM Executa o script de treinamento do Python
-python treinamento_ia.py
+REM Executa o pipeline: coleta, indicadores, sinais, treino (modo auto) e backtest.
+REM Etapas cujas entradas não mudaram desde a última execução são puladas.
+python pipeline.py
 
 echo "--- RETREINAMENTO CONCLUÍDO ---"
 pause
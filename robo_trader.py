@@ -1,61 +1,131 @@
 import MetaTrader5 as mt5
 import pandas as pd
-import numpy as np
-import talib as ta
 import joblib
 import time
-from datetime import datetime, timedelta
-import os
-import json
+from datetime import datetime
+
+from motor_features import compute_signal
+from estado_indicadores import IndicatorState
+from cache_barras import BarRingBuffer
+from agendador import BarCloseScheduler
+from sessao_mt5 import MT5Session
+from inferencia_rapida import FlatForest, is_supported
+from registro_modelos import load_model_info
+from diario_trades import TradeJournal, server_time
+from reconciliador_deals import CATCH_UP_WINDOW, DealReconciler
+import metricas
 
 # --- PARÂMETROS GLOBAIS ---
 SYMBOL = "XAUUSD"
 TIMEFRAME = mt5.TIMEFRAME_H1
+BAR_SECONDS = 3600 # Duração de uma vela do TIMEFRAME, em segundos
 VOLUME = 0.01  # Volume do lote. CUIDADO AO MUDAR!
 MAGIC_NUMBER = 123456 # ID único para as ordens deste robô
 MODEL_FILE = "modelo_ia_trade.joblib"
 
-# --- ARQUIVOS DE HISTÓRICO PARA APRENDIZADO CONTÍNUO ---
-HISTORICO_FILE = "historico_trades_executados.csv"
-OPEN_TRADES_FILE = "trades_abertos.json"
+# --- Parâmetros do Sinal ---
+# Distância máxima (em ATRs) até um nível de suporte/resistência e níveis considerados
+SIGNAL_ATR_FACTOR = 0.7
+SIGNAL_LEVELS = (1, 2)
+
+# --- SESSÃO COM O MT5 ---
+# Uma única conexão, compartilhada por dados, ordens e histórico de deals
+session = MT5Session(mt5)
+
+# --- DIÁRIO DE TRADES PARA APRENDIZADO CONTÍNUO ---
+# Trades abertos, trades fechados (features + resultado) e cursor de deals, em SQLite
+JOURNAL_FILE = "diario_trades.db"
+journal = TradeJournal(JOURNAL_FILE)
+
+# --- ESTADO INCREMENTAL DOS INDICADORES ---
+INDICATOR_STATE_FILE = "estado_indicadores.json"
+WARMUP_BARS = 1000 # Velas usadas para aquecer o estado quando não há estado salvo
+CACHE_BARS = 300 # Velas fechadas mantidas no cache em memória
+
+# --- AGENDAMENTO ---
+BAR_CLOSE_OFFSET = 2 # Segundos após o fechamento da vela para acordar (tempo do servidor gerar a vela)
+POSITION_POLL_SECONDS = 30 # Intervalo da verificação leve de trades fechados entre velas
+RETRY_SECONDS = 60 # Espera após falha de conexão ou erro inesperado
+SERVER_TIME_OFFSET = 0 # Diferença (s) entre o horário do servidor MT5 e o relógio local
+
+# --- RECONCILIAÇÃO DE DEALS ---
+# Cursor (último deal processado) salvo no diário: só os deals novos são pedidos ao MT5
+reconciler = DealReconciler(session, journal, MAGIC_NUMBER, time_offset=SERVER_TIME_OFFSET)
 
 # --- FUNÇÕES AUXILIARES ---
-def calculate_features(df):
-    """Calcula todos os indicadores e features necessários para a IA."""
-    df['time_dt'] = pd.to_datetime(df['time'], unit='s')
-    df.set_index('time_dt', inplace=True)
-
-    # Pivots
-    daily_df = df.resample('D').agg({'high': 'max', 'low': 'min', 'close': 'last'})
-    prev_day = daily_df.shift(1)
-    pivot = (prev_day['high'] + prev_day['low'] + prev_day['close']) / 3
-    r1 = 2 * pivot - prev_day['low']
-    s1 = 2 * pivot - prev_day['high']
-    r2 = pivot + (prev_day['high'] - prev_day['low'])
-    s2 = pivot - (prev_day['high'] - prev_day['low'])
-    r3 = prev_day['high'] + 2 * (pivot - prev_day['low'])
-    s3 = prev_day['low'] - 2 * (prev_day['high'] - prev_day['low'])
-    pivots_df = pd.DataFrame({'pivot': pivot, 'r1': r1, 's1': s1, 'r2': r2, 's2': s2, 'r3': r3, 's3': s3})
-    df = pd.merge_asof(df, pivots_df, left_index=True, right_index=True)
-    df.reset_index(inplace=True)
-
-    # Indicadores TA-Lib
-    df['ema50'] = ta.EMA(df['close'], timeperiod=50)
-    df['ema200'] = ta.EMA(df['close'], timeperiod=200)
-    df['atr14'] = ta.ATR(df['high'], df['low'], df['close'], timeperiod=14)
-    df['engulfing'] = ta.CDLENGULFING(df['open'], df['high'], df['low'], df['close'])
-    df['hammer'] = ta.CDLHAMMER(df['open'], df['high'], df['low'], df['close'])
-    
-    # Features de tempo
-    df['hour'] = df['time_dt'].dt.hour
-    df['day_of_week'] = df['time_dt'].dt.dayofweek
-    
-    # Features de sessão (aproximado, GMT)
-    df['session_asia'] = ((df['hour'] >= 0) & (df['hour'] <= 8)).astype(int)
-    df['session_london'] = ((df['hour'] >= 7) & (df['hour'] <= 16)).astype(int)
-    df['session_ny'] = ((df['hour'] >= 12) & (df['hour'] <= 21)).astype(int)
-    
-    return df.dropna()
+def sync_indicator_state(state, closed, symbol=None, timeframe=None):
+    """
+    Aplica ao estado incremental as velas fechadas de 'closed' que ele ainda não viu.
+    Se não houver estado, ou se ele estiver defasado além do que 'closed' cobre,
+    refaz o aquecimento com o histórico do MT5 ('symbol'/'timeframe'; por padrão,
+    SYMBOL e TIMEFRAME no momento da chamada).
+    Retorna (estado, número de velas novas aplicadas).
+    """
+    if len(closed) == 0:
+        return state, 0
+    symbol = SYMBOL if symbol is None else symbol
+    timeframe = TIMEFRAME if timeframe is None else timeframe
+
+    first_time = pd.Timestamp(int(closed['time'][0]), unit='s')
+    if state is None or state.last_time is None or state.last_time < first_time:
+        print(f"Aquecendo o estado dos indicadores com as últimas {WARMUP_BARS} velas...")
+        history = session.copy_rates_from_pos(symbol, timeframe, 1, WARMUP_BARS)
+        state = IndicatorState()
+        state.warm_up(pd.DataFrame(history))
+        return state, 1
+
+    last_epoch = state.last_time.value // 1_000_000_000
+    new_bars = closed[closed['time'] > last_epoch]
+    with metricas.stage('features.update'):
+        for bar in new_bars:
+            state.update(bar)
+    return state, len(new_bars)
+
+def bar_pending(scheduler, state, bar_seconds=None):
+    """
+    True se a vela que fechou no último despertar do 'scheduler' ainda não chegou ao
+    estado (o terminal ainda não a mostra como fechada). Quem chama deve tentar de
+    novo com scheduler.wait_for_new_bar() em vez de esperar o próximo fechamento,
+    que aplicaria duas velas e só avaliaria a última.
+    """
+    if state is None or state.last_time is None:
+        return False
+    return scheduler.bar_pending(state.last_time.value // 1_000_000_000, bar_seconds)
+
+def evaluate_signal(last_candle, model, forest=None, feature_vector=None):
+    """
+    Sinal da estratégia na última vela fechada e, se houver sinal, a decisão da IA.
+    Retorna (sinal, previsão, probabilidades, features); previsão é None sem sinal.
+    """
+    with metricas.stage('signal'):
+        signal = int(compute_signal(last_candle, atr_factor=SIGNAL_ATR_FACTOR, levels=SIGNAL_LEVELS)[0])
+    if signal == 0:
+        return signal, None, None, None
+
+    live_features_dict = dict(last_candle)
+    live_features_dict['signal'] = signal
+    with metricas.stage('ia.predict'):
+        if forest is not None:
+            prediction, probability = forest.predict_one(forest.fill_vector(feature_vector, live_features_dict))
+        else:
+            features_df = pd.DataFrame([live_features_dict])[model.feature_names_in_]
+            prediction = model.predict(features_df)[0]
+            probability = model.predict_proba(features_df)[0]
+    # Só as colunas usadas pelo modelo são guardadas no diário
+    features_to_save = {k: v for k, v in live_features_dict.items() if k in model.feature_names_in_}
+    return signal, prediction, probability, features_to_save
+
+def open_trade(symbol, signal, last_candle, volume=VOLUME):
+    """Envia a ordem do sinal com stop além da vela (1 ATR) e alvo com risco/retorno 1:1.5."""
+    price_info = session.symbol_info_tick(symbol)
+    atr = last_candle['atr14']
+    if signal == 1: # Compra
+        sl = last_candle['low'] - atr
+        tp = price_info.ask + (price_info.ask - sl) * 1.5 # Risco/Retorno 1:1.5
+        return place_order(symbol, mt5.ORDER_TYPE_BUY, volume, sl, tp)
+    sl = last_candle['high'] + atr # Venda
+    tp = price_info.bid - (sl - price_info.bid) * 1.5 # Risco/Retorno 1:1.5
+    return place_order(symbol, mt5.ORDER_TYPE_SELL, volume, sl, tp)
 
 def place_order(symbol, order_type, volume, sl, tp):
     """Envia uma ordem de mercado para o MT5."""
@@ -64,7 +134,7 @@ def place_order(symbol, order_type, volume, sl, tp):
         "symbol": symbol,
         "volume": volume,
         "type": order_type,
-        "price": mt5.symbol_info_tick(symbol).ask if order_type == mt5.ORDER_TYPE_BUY else mt5.symbol_info_tick(symbol).bid,
+        "price": session.symbol_info_tick(symbol).ask if order_type == mt5.ORDER_TYPE_BUY else session.symbol_info_tick(symbol).bid,
         "sl": sl,
         "tp": tp,
         "magic": MAGIC_NUMBER,
@@ -72,7 +142,8 @@ def place_order(symbol, order_type, volume, sl, tp):
         "type_time": mt5.ORDER_TIME_GTC,
         "type_filling": mt5.ORDER_FILLING_IOC,
     }
-    result = mt5.order_send(request)
+    with metricas.stage('order.send'):
+        result = session.order_send(request)
     if result.retcode != mt5.TRADE_RETCODE_DONE:
         print(f"Falha ao enviar ordem: {result.comment}")
         return None
@@ -80,169 +151,138 @@ def place_order(symbol, order_type, volume, sl, tp):
         print(f"Ordem enviada com sucesso: Ticket #{result.order}")
         return result
 
-def check_and_save_closed_trades():
-    """Verifica trades fechados e salva seus dados para retreinamento."""
-    if not os.path.exists(OPEN_TRADES_FILE):
-        return
+def report_closed_trade(ticket_id, deal):
+    print(f"TRADE FECHADO DETECTADO: Ticket #{ticket_id} ({'lucro' if deal.profit > 0 else 'prejuízo'} "
+          f"de {deal.profit:.2f}). Resultado salvo em {JOURNAL_FILE}")
 
-    try:
-        with open(OPEN_TRADES_FILE, 'r') as f:
-            open_trades = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        open_trades = {}
+def check_and_save_closed_trades():
+    """Verifica trades fechados (só os deals novos desde o cursor) e salva seus dados para retreinamento."""
+    with metricas.stage('deals.reconcile'):
+        closed = reconciler.reconcile(on_closed=report_closed_trade)
+    lag = reconciler.lag()
+    if lag > CATCH_UP_WINDOW:
+        print(f"Recuperando deals após parada: cursor {lag / 86400:.1f} dia(s) atrás.")
+    return closed
 
-    if not open_trades:
-        return
+# --- LÓGICA PRINCIPAL DO ROBÔ ---
+def has_open_trades():
+    """Verifica, sem acessar o MT5, se há trades abertos sendo rastreados."""
+    return journal.has_open_trades()
 
-    # Busca por transações (deals) no histórico recente
-    from_date = datetime.now() - timedelta(days=7) # Busca na última semana
-    deals = mt5.history_deals_get(from_date, datetime.now())
-    
-    if deals is None or len(deals) == 0:
+def poll_positions():
+    """Verificação leve entre fechamentos de vela: só consulta o MT5 se há trades rastreados."""
+    if not has_open_trades():
         return
+    if session.ensure_connected():
+        check_and_save_closed_trades()
 
-    closed_tickets = set()
-    for deal in deals:
-        # entry=1 significa uma transação de saída (fechamento de posição)
-        if deal.entry == 1 and deal.magic == MAGIC_NUMBER:
-            ticket_id = str(deal.position_id)
-            if ticket_id in open_trades:
-                print(f"TRADE FECHADO DETECTADO: Ticket #{ticket_id}. Salvando resultado...")
-                
-                trade_data = open_trades[ticket_id]
-                # Adiciona o resultado real: 1 para lucro, 0 para prejuízo/breakeven
-                trade_data['target'] = 1 if deal.profit > 0 else 0
-                
-                # Converte para DataFrame para salvar no CSV
-                df_historico = pd.DataFrame([trade_data])
-                
-                # Garante que o arquivo de histórico tenha cabeçalho apenas na primeira vez
-                file_exists = os.path.exists(HISTORICO_FILE)
-                df_historico.to_csv(HISTORICO_FILE, mode='a', header=not file_exists, index=False)
-                
-                print(f"Resultado do trade #{ticket_id} salvo em {HISTORICO_FILE}")
-                closed_tickets.add(ticket_id)
-
-    # Limpa o JSON, removendo os trades que já foram processados
-    remaining_trades = {k: v for k, v in open_trades.items() if k not in closed_tickets}
-    with open(OPEN_TRADES_FILE, 'w') as f:
-        json.dump(remaining_trades, f, indent=4)
-
-# --- LÓGICA PRINCIPAL DO ROBÔ ---
-def run_bot():
+def run_bot(clock=time.time, sleep=time.sleep):
     print("Iniciando Robô Trader com IA (v2 - Aprendizado Contínuo)...")
+    # Importa trades_abertos.json / histórico antigo para o diário na primeira execução
+    n_open, n_closed = journal.migrate()
+    if n_open or n_closed:
+        print(f"Diário de trades: {n_open} trade(s) aberto(s) e {n_closed} fechado(s) importados dos arquivos antigos.")
     print(f"Carregando modelo de IA de '{MODEL_FILE}'...")
     try:
         model = joblib.load(MODEL_FILE)
     except FileNotFoundError:
         print(f"ERRO: Modelo '{MODEL_FILE}' não encontrado. Treine o modelo primeiro.")
         return
+    model_info = load_model_info()
+    if model_info:
+        search = model_info.get('search') or {}
+        print(f"Modelo versão {model_info['version']} ({model_info['kind']}, {model_info.get('family', type(model).__name__)}, "
+              f"{model_info['created']})" + (f"; busca: {search['objective']} = {search['score']:.4f}" if search else ""))
 
-    features_order = model.feature_names_in_
+    # Floresta "achatada" em arrays NumPy: uma travessia por previsão, sem DataFrame
+    forest = FlatForest(model) if is_supported(model) else None
+    feature_vector = forest.new_vector() if forest is not None else None
+    # Retoma o estado dos indicadores salvo na última execução, se existir
+    state = IndicatorState.load(INDICATOR_STATE_FILE)
+    # Cache das velas: após a carga inicial, só as velas novas são pedidas ao MT5
+    bar_cache = BarRingBuffer(session, SYMBOL, TIMEFRAME, capacity=CACHE_BARS)
+    # Acorda logo após cada fechamento de vela em vez de a cada 60s/300s
+    scheduler = BarCloseScheduler(BAR_SECONDS, offset=BAR_CLOSE_OFFSET, poll_interval=POSITION_POLL_SECONDS,
+                                  time_offset=SERVER_TIME_OFFSET, clock=clock, sleep=sleep)
+    reconciler.clock = clock
 
-    while True:
-        try:
-            if not mt5.initialize():
-                print("Falha na conexão com MT5. Tentando novamente em 1 min...")
-                time.sleep(60)
-                continue
+    session.sleep = sleep
+    try:
+        while True:
+            try:
+                # Verificação barata da sessão; só reconecta (com espera exponencial) se ela caiu
+                if not session.ensure_connected():
+                    print("Falha na conexão com MT5. Tentando novamente em 1 min...")
+                    sleep(RETRY_SECONDS)
+                    continue
             
-            # --- APRENDIZADO CONTÍNUO: VERIFICAR TRADES FECHADOS ---
-            check_and_save_closed_trades()
-
-            # 1. Verificar se já existe uma posição aberta por este robô
-            positions = mt5.positions_get(symbol=SYMBOL)
-            my_positions = [p for p in positions if p.magic == MAGIC_NUMBER] if positions else []
-            if my_positions:
-                print(f"Já existe uma posição aberta para {SYMBOL} (Ticket: {my_positions[0].ticket}). Aguardando...")
-                mt5.shutdown()
-                time.sleep(300) # Espera 5 minutos se já tem trade aberto
-                continue
-
-            # 2. Obter e processar dados
-            rates = mt5.copy_rates_from_pos(SYMBOL, TIMEFRAME, 0, 300)
-            df = pd.DataFrame(rates)
-            df_features = calculate_features(df)
-
-            if df_features.empty:
-                print("Não há dados suficientes para calcular features. Aguardando...")
-                mt5.shutdown()
-                time.sleep(60)
-                continue
-
-            # 3. Verificar o sinal na última vela completa
-            last_candle = df_features.iloc[-2] # Usamos a penúltima vela (a última fechada)
-            signal = 0
-            atr = last_candle['atr14']
-
-            # Condições de Compra
-            if (last_candle['ema50'] > last_candle['ema200'] and
-               ((last_candle['engulfing'] > 0) or (last_candle['hammer'] > 0)) and
-               ((abs(last_candle['low'] - last_candle['s1']) < atr * 0.7) or
-                (abs(last_candle['low'] - last_candle['s2']) < atr * 0.7))):
-                signal = 1
-
-            # Condições de Venda
-            elif (last_candle['ema50'] < last_candle['ema200'] and
-                  (last_candle['engulfing'] < 0) and
-                  ((abs(last_candle['high'] - last_candle['r1']) < atr * 0.7) or
-                   (abs(last_candle['high'] - last_candle['r2']) < atr * 0.7))):
-                signal = -1
-
-            # 4. Se houver sinal, consultar a IA
-            if signal != 0:
-                print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sinal de {'COMPRA' if signal == 1 else 'VENDA'} detectado!")
-                
-                live_features_dict = last_candle.to_dict()
-                features_df = pd.DataFrame([live_features_dict])[features_order]
-
-                prediction = model.predict(features_df)[0]
-                probability = model.predict_proba(features_df)[0]
-
-                print(f"IA prevê: {'SUCESSO' if prediction == 1 else 'FALHA'} com probabilidade de {max(probability)*100:.2f}%")
-
-                # 5. Se a IA aprovar, enviar a ordem
-                if prediction == 1:
-                    price_info = mt5.symbol_info_tick(SYMBOL)
-                    if signal == 1: # Compra
-                        sl = last_candle['low'] - atr
-                        tp = price_info.ask + (price_info.ask - sl) * 1.5 # Risco/Retorno 1:1.5
-                        result = place_order(SYMBOL, mt5.ORDER_TYPE_BUY, VOLUME, sl, tp)
-                    elif signal == -1: # Venda
-                        sl = last_candle['high'] + atr
-                        tp = price_info.bid - (sl - price_info.bid) * 1.5 # Risco/Retorno 1:1.5
-                        result = place_order(SYMBOL, mt5.ORDER_TYPE_SELL, VOLUME, sl, tp)
+                # --- APRENDIZADO CONTÍNUO: VERIFICAR TRADES FECHADOS ---
+                check_and_save_closed_trades()
+
+                # 1. Verificar se já existe uma posição aberta por este robô
+                with metricas.stage('mt5.positions'):
+                    positions = session.positions_get(symbol=SYMBOL)
+                my_positions = [p for p in positions if p.magic == MAGIC_NUMBER] if positions else []
+                if my_positions:
+                    print(f"Já existe uma posição aberta para {SYMBOL} (Ticket: {my_positions[0].ticket}). Aguardando...")
+                    scheduler.wait_for_bar_close(on_poll=poll_positions) # Espera a próxima vela
+                    continue
+
+                # 2. Obter e processar dados
+                with metricas.stage('mt5.rates'):
+                    bar_cache.refresh()
+                state, new_bars = sync_indicator_state(state, bar_cache.closed(), SYMBOL, TIMEFRAME)
+                if new_bars:
+                    with metricas.stage('state.save'):
+                        state.save(INDICATOR_STATE_FILE)
+
+                if not new_bars and bar_pending(scheduler, state):
+                    # A vela que acabou de fechar ainda não chegou: tenta de novo em instantes
+                    scheduler.wait_for_new_bar(on_poll=poll_positions)
+                    continue
+
+                if not new_bars or not state.ready:
+                    if state is not None and not state.ready:
+                        print("Não há dados suficientes para calcular features. Aguardando...")
+                    scheduler.wait_for_bar_close(on_poll=poll_positions)
+                    continue
+
+                # 3. Verificar o sinal na última vela completa (já aplicada ao estado)
+                last_candle = state.values
+                signal, prediction, probability, features_to_save = evaluate_signal(
+                    last_candle, model, forest, feature_vector)
+
+                # 4. Se houver sinal, consultar a IA
+                if signal != 0:
+                    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sinal de {'COMPRA' if signal == 1 else 'VENDA'} detectado!")
+                    print(f"IA prevê: {'SUCESSO' if prediction == 1 else 'FALHA'} com probabilidade de {max(probability)*100:.2f}%")
+
+                    # 5. Se a IA aprovar, enviar a ordem
+                    if prediction == 1:
+                        result = open_trade(SYMBOL, signal, last_candle)
                     
-                    # --- APRENDIZADO CONTÍNUO: SALVAR TRADE ABERTO ---
-                    if result:
-                        try:
-                            with open(OPEN_TRADES_FILE, 'r') as f:
-                                open_trades = json.load(f)
-                        except (json.JSONDecodeError, FileNotFoundError):
-                            open_trades = {}
-                        
-                        ticket_id = str(result.order)
-                        # Remove colunas que não são features para salvar
-                        features_to_save = {k: v for k, v in live_features_dict.items() if k in features_order}
-                        open_trades[ticket_id] = features_to_save
-                        
-                        with open(OPEN_TRADES_FILE, 'w') as f:
-                            json.dump(open_trades, f, indent=4)
-                        print(f"Trade #{ticket_id} salvo em {OPEN_TRADES_FILE} para futuro rastreamento.")
+                        # --- APRENDIZADO CONTÍNUO: SALVAR TRADE ABERTO ---
+                        if result:
+                            ticket_id = result.order
+                            with metricas.stage('journal.write'):
+                                journal.add_open_trade(ticket_id, features_to_save, symbol=SYMBOL,
+                                                       opened_at=server_time(scheduler.now()))
+                            print(f"Trade #{ticket_id} salvo em {JOURNAL_FILE} para futuro rastreamento.")
 
+                    else:
+                        print("Decisão da IA: Não operar.")
                 else:
-                    print("Decisão da IA: Não operar.")
-            else:
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sem sinal. Aguardando...", end='\r')
-
-            mt5.shutdown()
-            time.sleep(60)
-
-        except Exception as e:
-            print(f"\nOcorreu um erro inesperado: {e}")
-            import traceback
-            traceback.print_exc()
-            time.sleep(60)
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sem sinal. Aguardando...", end='\r')
+
+                scheduler.wait_for_bar_close(on_poll=poll_positions)
+
+            except Exception as e:
+                print(f"\nOcorreu um erro inesperado: {e}")
+                import traceback
+                traceback.print_exc()
+                sleep(RETRY_SECONDS)
+    finally:
+        session.shutdown()
 
 if __name__ == "__main__":
     run_bot()
\ No newline at end of file
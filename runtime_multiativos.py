@@ -0,0 +1,257 @@
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import reduce
+
+import joblib
+
+import metricas
+import robo_trader as robo
+from robo_trader import mt5, session, journal
+from diario_trades import server_time
+from estado_indicadores import IndicatorState
+from cache_barras import BarRingBuffer
+from agendador import BarCloseScheduler
+from inferencia_rapida import FlatForest, is_supported
+
+# --- Arquivos ---
+CONFIG_FILE = "config_ativos.json"
+STATE_DIR = "estado_ativos" # Estado dos indicadores de cada símbolo/timeframe
+
+# --- Parâmetros Padrão de Cada Ativo ---
+DEFAULTS = {
+    'timeframe': 'H1',
+    'model': robo.MODEL_FILE,
+    'volume': robo.VOLUME,
+    'max_positions': 1, # Posições abertas simultâneas deste símbolo
+}
+MAX_WORKERS = 4 # Threads que processam os ativos de um mesmo fechamento de vela
+PENDING = 'pendente' # Retorno de Instrument.step quando a vela que fechou ainda não chegou
+
+# Timeframes aceitos: minutos, horas e D1, cujas velas fecham em múltiplos exatos da
+# duração (contada da época, no horário do servidor). W1 e MN1 não: a semana do
+# servidor não começa na quinta-feira da época e os meses têm durações diferentes.
+TIMEFRAME_UNITS = {'M': 60, 'H': 3600, 'D': 86400}
+_print_lock = threading.Lock() # Mensagens de ativos processados em paralelo não se misturam
+
+def timeframe_seconds(name):
+    """
+    Duração em segundos de um timeframe no formato do MT5 ('M15', 'H1', 'D1'...).
+    Lança ValueError para timeframes não suportados (ver TIMEFRAME_UNITS).
+    """
+    unit, count = name[:1], name[1:]
+    if unit not in TIMEFRAME_UNITS or not count.isdigit() or int(count) <= 0 or (unit == 'D' and count != '1'):
+        raise ValueError(f"Timeframe '{name}' não suportado: use M<n>, H<n> ou D1.")
+    return TIMEFRAME_UNITS[unit] * int(count)
+
+def load_config(path=CONFIG_FILE):
+    """
+    Lê a configuração: {"instruments": [{"symbol", "timeframe", "model", "volume",
+    "max_positions"}, ...], "max_total_positions": n}. Campos ausentes usam DEFAULTS.
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    config['instruments'] = [dict(DEFAULTS, **item) for item in config['instruments']]
+    for item in config['instruments']:
+        timeframe_seconds(item['timeframe'])
+        if not hasattr(mt5, f"TIMEFRAME_{item['timeframe']}"):
+            raise ValueError(f"{item['symbol']}: o MT5 não tem o timeframe '{item['timeframe']}'.")
+    return config
+
+class ModelCache:
+    """
+    Modelos carregados uma única vez por arquivo e compartilhados entre os ativos
+    (o FlatForest não guarda estado entre previsões; cada ativo tem o seu vetor).
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        with self._lock:
+            if key not in self._models:
+                model = joblib.load(path)
+                self._models[key] = (model, FlatForest(model) if is_supported(model) else None)
+            return self._models[key]
+
+    def __len__(self):
+        return len(self._models)
+
+class Instrument:
+    """Estado de um símbolo/timeframe: cache de velas, indicadores incrementais e modelo."""
+
+    def __init__(self, symbol, timeframe, model, volume, max_positions, models, state_dir=STATE_DIR):
+        self.symbol = symbol
+        self.timeframe_name = timeframe
+        self.timeframe = getattr(mt5, f"TIMEFRAME_{timeframe}")
+        self.bar_seconds = timeframe_seconds(timeframe)
+        self.volume = volume
+        self.max_positions = max_positions
+        self.model, self.forest = models.get(model)
+        self.feature_vector = self.forest.new_vector() if self.forest is not None else None
+        self.state_file = os.path.join(state_dir, f"{symbol}_{timeframe}.json")
+        self.state = IndicatorState.load(self.state_file)
+        self.bar_cache = BarRingBuffer(session, symbol, self.timeframe, capacity=robo.CACHE_BARS)
+
+    def log(self, message):
+        with _print_lock:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [{self.symbol} {self.timeframe_name}] {message}")
+
+    def open_positions(self):
+        positions = session.positions_get(symbol=self.symbol)
+        return sum(1 for p in positions or () if p.magic == robo.MAGIC_NUMBER)
+
+    def step(self, slots, scheduler):
+        """
+        Processa a vela que acabou de fechar. 'slots' reserva vagas do limite global
+        de posições. Retorna (ticket, features) do trade aberto, PENDING se a vela que
+        fechou no último despertar do 'scheduler' ainda não chegou ao terminal, ou
+        None; o registro no diário fica com a thread principal. O cache e os
+        indicadores são atualizados mesmo com posição aberta (só a ordem é
+        bloqueada), para não reaquecer o estado depois de um trade longo.
+        """
+        with metricas.stage('mt5.rates'):
+            self.bar_cache.refresh()
+        self.state, new_bars = robo.sync_indicator_state(self.state, self.bar_cache.closed(),
+                                                         self.symbol, self.timeframe)
+        if new_bars:
+            with metricas.stage('state.save'):
+                self.state.save(self.state_file)
+        if not new_bars and robo.bar_pending(scheduler, self.state, self.bar_seconds):
+            return PENDING
+        if not new_bars or not self.state.ready:
+            return None
+
+        last_candle = self.state.values
+        signal, prediction, probability, features = robo.evaluate_signal(
+            last_candle, self.model, self.forest, self.feature_vector)
+        if signal == 0:
+            return None
+        self.log(f"Sinal de {'COMPRA' if signal == 1 else 'VENDA'}; IA prevê "
+                 f"{'SUCESSO' if prediction == 1 else 'FALHA'} ({max(probability) * 100:.2f}%)")
+        if prediction != 1:
+            return None
+        if self.open_positions() >= self.max_positions:
+            self.log(f"Já há {self.max_positions} posição(ões) aberta(s) neste símbolo. Ordem não enviada.")
+            return None
+        if not slots.acquire(blocking=False):
+            self.log("Limite global de posições atingido. Ordem não enviada.")
+            return None
+
+        result = robo.open_trade(self.symbol, signal, last_candle, self.volume)
+        if not result:
+            slots.release()
+            return None
+        return result.order, features
+
+class MultiAssetRuntime:
+    """
+    Roda vários símbolos/timeframes em um único processo, com uma sessão MT5
+    (chamadas serializadas pelo lock da MT5Session), um diário de trades e um
+    reconciliador de deals. O agendador acorda no máximo divisor comum dos
+    timeframes e, a cada fechamento, os ativos cuja vela fechou são processados
+    em paralelo por um pool de threads.
+    """
+
+    def __init__(self, config, clock=time.time, sleep=time.sleep, max_workers=MAX_WORKERS):
+        self.models = ModelCache()
+        self.instruments = [
+            Instrument(item['symbol'], item['timeframe'], item['model'], item['volume'],
+                       item['max_positions'], self.models)
+            for item in config['instruments']]
+        self.max_total_positions = config.get('max_total_positions', len(self.instruments))
+        base = reduce(math.gcd, (inst.bar_seconds for inst in self.instruments))
+        self.scheduler = BarCloseScheduler(base, offset=robo.BAR_CLOSE_OFFSET,
+                                           poll_interval=robo.POSITION_POLL_SECONDS,
+                                           time_offset=robo.SERVER_TIME_OFFSET, clock=clock, sleep=sleep)
+        self.sleep = sleep
+        self.max_workers = max_workers
+        robo.reconciler.clock = clock
+        session.sleep = sleep
+
+    def due(self, closed_at, pending=()):
+        """
+        Ativos cuja vela fechou no horário 'closed_at' (segundos desde a época), mais
+        os de 'pending', que ainda esperam a vela do fechamento anterior.
+        """
+        return [inst for inst in self.instruments if inst in pending or closed_at % inst.bar_seconds == 0]
+
+    def run_once(self, instruments, pool):
+        """
+        Processa 'instruments' no pool e registra no diário os trades abertos.
+        Retorna os ativos cuja vela fechada ainda não chegou ao terminal.
+        """
+        robo.check_and_save_closed_trades()
+        # Vagas do limite global: as posições já rastreadas no diário ocupam as suas
+        slots = threading.Semaphore(max(0, self.max_total_positions - len(journal.open_trades())))
+        futures = [(inst, pool.submit(inst.step, slots, self.scheduler)) for inst in instruments]
+        pending = []
+        for inst, future in futures:
+            try:
+                opened = future.result()
+            except Exception as e:
+                inst.log(f"Erro ao processar: {e}")
+                continue
+            if opened is PENDING:
+                pending.append(inst)
+            elif opened:
+                ticket_id, features = opened
+                with metricas.stage('journal.write'):
+                    journal.add_open_trade(ticket_id, features, symbol=inst.symbol,
+                                           opened_at=server_time(self.scheduler.now()))
+                inst.log(f"Trade #{ticket_id} salvo em {robo.JOURNAL_FILE} para futuro rastreamento.")
+        return pending
+
+    def run(self, max_bars=None):
+        os.makedirs(STATE_DIR, exist_ok=True)
+        print(f"{len(self.instruments)} ativo(s), {len(self.models)} modelo(s) carregado(s); "
+              f"agendador a cada {self.scheduler.bar_seconds}s.")
+        n_open, n_closed = journal.migrate()
+        if n_open or n_closed:
+            print(f"Diário de trades: {n_open} aberto(s) e {n_closed} fechado(s) importados dos arquivos antigos.")
+
+        instruments = self.instruments # Na partida, todos os ativos são processados
+        bars = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.instruments))) as pool:
+            try:
+                while max_bars is None or bars < max_bars:
+                    if not session.ensure_connected():
+                        print("Falha na conexão com MT5. Tentando novamente em 1 min...")
+                        self.sleep(robo.RETRY_SECONDS)
+                        continue
+                    pending = []
+                    try:
+                        pending = self.run_once(instruments, pool)
+                    except Exception as e:
+                        print(f"\nOcorreu um erro inesperado: {e}")
+                        import traceback
+                        traceback.print_exc()
+                        self.sleep(robo.RETRY_SECONDS)
+                    if pending:
+                        # Vela fechada que ainda não chegou: só esses ativos são processados de novo
+                        # em instantes (ou junto com os do próximo fechamento, se a espera chegar nele)
+                        closed_at = self.scheduler.wait_for_new_bar(on_poll=robo.poll_positions)
+                    else:
+                        closed_at = self.scheduler.wait_for_bar_close(on_poll=robo.poll_positions)
+                    if closed_at is None:
+                        instruments = pending
+                        continue
+                    instruments = self.due(closed_at, pending)
+                    bars += 1
+            finally:
+                session.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robô trader com vários símbolos/timeframes em um processo.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Arquivo JSON com os ativos.")
+    parser.add_argument("--threads", type=int, default=MAX_WORKERS, help="Threads de processamento dos ativos.")
+    args = parser.parse_args()
+
+    MultiAssetRuntime(load_config(args.config), max_workers=args.threads).run()
@@ -0,0 +1,98 @@
+import threading
+import time
+
+class MT5Session:
+    """
+    Sessão persistente com o terminal MetaTrader 5.
+
+    A conexão é aberta uma vez e reaproveitada por todas as partes do robô (dados,
+    ordens e histórico de deals). ensure_connected() faz uma verificação barata
+    (terminal_info) e só reconecta quando ela falha, com espera exponencial entre as
+    tentativas. As chamadas ao terminal passam por um lock, de modo que a sessão
+    pode ser compartilhada entre threads.
+
+    Qualquer função do módulo MetaTrader5 pode ser chamada pela sessão
+    (ex: session.copy_rates_from_pos(...)).
+    """
+
+    def __init__(self, terminal=None, base_backoff=1.0, max_backoff=300.0, max_attempts=5,
+                 sleep=time.sleep, **init_kwargs):
+        if terminal is None:
+            import MetaTrader5 as terminal
+        self.terminal = terminal
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.init_kwargs = init_kwargs
+        self.connected = False
+        self.failures = 0 # Falhas consecutivas (define a próxima espera)
+        self.reconnects = 0
+        self._lock = threading.RLock()
+
+    def _healthy(self):
+        try:
+            info = self.terminal.terminal_info()
+        except Exception:
+            return False
+        return info is not None and getattr(info, 'connected', True)
+
+    def _backoff(self):
+        return min(self.max_backoff, self.base_backoff * 2 ** (self.failures - 1))
+
+    def connect(self):
+        """Abre a conexão com o terminal. Retorna True em caso de sucesso."""
+        with self._lock:
+            if self.terminal.initialize(**self.init_kwargs):
+                if self.failures or self.reconnects:
+                    print(f"Conexão com o MT5 restabelecida após {self.failures} falha(s).")
+                self.connected = True
+                self.failures = 0
+                return True
+            self.connected = False
+            self.failures += 1
+            return False
+
+    def ensure_connected(self):
+        """
+        Garante uma sessão ativa. Com a conexão saudável custa apenas um terminal_info();
+        caso contrário tenta reconectar até max_attempts vezes, dobrando a espera a cada
+        falha (limitada a max_backoff). Retorna False se não conseguir.
+        """
+        with self._lock:
+            if self.connected and self._healthy():
+                return True
+
+            if self.connected:
+                print("Conexão com o MT5 perdida. Reconectando...")
+                self.terminal.shutdown()
+                self.connected = False
+                self.reconnects += 1
+
+            for attempt in range(self.max_attempts):
+                if self.connect():
+                    return True
+                if attempt + 1 == self.max_attempts:
+                    break
+                delay = self._backoff()
+                print(f"Falha na conexão com MT5 (tentativa {attempt + 1}/{self.max_attempts}). "
+                      f"Nova tentativa em {delay:.0f}s...")
+                self.sleep(delay)
+            return False
+
+    def shutdown(self):
+        """Encerra a sessão (apenas ao finalizar o robô)."""
+        with self._lock:
+            if self.connected:
+                self.terminal.shutdown()
+            self.connected = False
+
+    def __getattr__(self, name):
+        attr = getattr(self.terminal, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_FILE = os.path.join(ROOT, "xauusd_h1_data.csv")
+FIXTURE_BARS = 8000 # Velas usadas nos testes de equivalência (inferência e backtest)
+
+@pytest.fixture(scope="session")
+def features():
+    """Features e sinal das primeiras FIXTURE_BARS velas do histórico."""
+    from motor_features import compute_features, compute_signal
+    from backtest_vetorizado import SIGNAL_ATR_FACTOR, SIGNAL_LEVELS
+    df = compute_features(pd.read_csv(DATA_FILE, parse_dates=['time']).head(FIXTURE_BARS))
+    df['signal'] = compute_signal(df, atr_factor=SIGNAL_ATR_FACTOR, levels=SIGNAL_LEVELS)
+    return df
+
+@pytest.fixture(scope="session")
+def model(features):
+    """Floresta pequena treinada nas velas com sinal (alvo: a vela seguinte fecha a favor do sinal)."""
+    from sklearn.ensemble import RandomForestClassifier
+    from motor_features import MODEL_FEATURES
+    rows = features[(features['signal'] != 0) & features[MODEL_FEATURES].notna().all(axis=1)]
+    target = (features['close'].shift(-1) - features['close']).loc[rows.index] * rows['signal'] > 0
+    forest = RandomForestClassifier(n_estimators=25, max_depth=8, class_weight='balanced', random_state=42)
+    return forest.fit(rows[MODEL_FEATURES], target.astype(int))
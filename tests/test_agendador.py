@@ -0,0 +1,99 @@
+from agendador import BarCloseScheduler
+
+HOUR = 3600
+
+class FakeClock:
+    """Relógio que só anda quando o agendador dorme."""
+
+    def __init__(self, now):
+        self.now = float(now)
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def make_scheduler(now, poll_interval=30.0):
+    fake = FakeClock(now)
+    return BarCloseScheduler(HOUR, offset=2.0, poll_interval=poll_interval,
+                             clock=fake.clock, sleep=fake.sleep), fake
+
+def test_wakes_just_after_bar_close_and_polls_in_between():
+    scheduler, fake = make_scheduler(10 * HOUR + 100)
+    polls = []
+    closed_at = scheduler.wait_for_bar_close(on_poll=lambda: polls.append(fake.now))
+    assert closed_at == 11 * HOUR == scheduler.last_close
+    assert fake.now == 11 * HOUR + 2
+    assert len(polls) == scheduler.polls == int((HOUR - 100 + 2) // 30)
+
+def test_seconds_until_next_run_counts_the_offset():
+    scheduler, _ = make_scheduler(0)
+    assert scheduler.seconds_until_next_run(now=10 * HOUR + 1) == 1
+    assert scheduler.seconds_until_next_run(now=10 * HOUR + 2) == HOUR
+
+def test_pending_bar_is_retried_with_backoff_capped_at_next_run():
+    scheduler, fake = make_scheduler(10 * HOUR + 100)
+    assert not scheduler.bar_pending(9 * HOUR) # Sem despertar ainda: nada é esperado
+    scheduler.wait_for_bar_close()
+    fake.sleeps.clear()
+
+    # A vela das 10h fechou às 11h, mas o terminal só tem até a das 9h
+    assert scheduler.bar_pending(9 * HOUR)
+    assert not scheduler.bar_pending(10 * HOUR)
+
+    for _ in range(8):
+        scheduler.wait_for_new_bar()
+    assert fake.sleeps[:5] == [30, 60, 120, 240, 480]
+    # Nenhuma espera passa do próximo despertar (fechamento + offset): depois dele, uma por vela
+    assert sum(fake.sleeps[:7]) == HOUR and fake.sleeps[7] == HOUR
+    assert scheduler.retries == 8
+
+    scheduler.wait_for_bar_close()
+    assert scheduler.pending_retries == 0
+
+def test_late_first_tick_does_not_skip_the_bar():
+    """
+    Loop do robo_trader com o primeiro tick depois das 11h chegando só às 11:00:40
+    (depois do despertar): a vela das 10h tem que ser avaliada sozinha, e não junto
+    com a das 11h no despertar seguinte.
+    """
+    scheduler, fake = make_scheduler(10 * HOUR + 2)
+    first_tick = {11 * HOUR: 40} # Atraso do primeiro tick de cada vela (padrão: imediato)
+    last_applied = 9 * HOUR      # Abertura da última vela fechada já aplicada
+    evaluated = []
+
+    def closed_bars():
+        # O terminal só mostra a vela como fechada quando chega o tick da seguinte
+        return [t for t in range(last_applied + HOUR, int(fake.now), HOUR)
+                if fake.now >= t + HOUR + first_tick.get(t + HOUR, 0)]
+
+    while fake.now < 15 * HOUR:
+        new_bars = closed_bars()
+        if new_bars:
+            last_applied = new_bars[-1]
+            evaluated.append(new_bars) # O robô avalia o sinal só da última vela aplicada
+        elif scheduler.bar_pending(last_applied):
+            scheduler.wait_for_new_bar()
+            continue
+        scheduler.wait_for_bar_close()
+
+    assert evaluated == [[t] for t in range(9 * HOUR + HOUR, 14 * HOUR, HOUR)]
+    assert scheduler.retries == 2 # 11:00:02 + 30s = 11:00:32 ainda sem o tick; 11:01:32 já com ele
+
+def test_retry_reaching_the_next_wakeup_reports_the_new_close():
+    scheduler, fake = make_scheduler(10 * HOUR + 2, poll_interval=HOUR)
+    scheduler.wait_for_bar_close()
+    assert scheduler.wait_for_new_bar() == 12 * HOUR == scheduler.last_close
+    assert fake.now == 12 * HOUR + 2
+    assert scheduler.pending_retries == 1 # Continua a mesma espera crescente
+
+def test_pending_bar_of_a_longer_timeframe():
+    scheduler, _ = make_scheduler(10 * HOUR + 15 * 60 + 2)
+    scheduler.bar_seconds = 15 * 60 # Agendador de M15 com um ativo H1
+    scheduler.wait_for_bar_close()
+    assert scheduler.last_close == 10 * HOUR + 30 * 60
+    assert not scheduler.bar_pending(9 * HOUR, HOUR) # A vela das 9h fechou às 10h e já chegou
+    assert scheduler.bar_pending(8 * HOUR, HOUR)
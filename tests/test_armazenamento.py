@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+
+from armazenamento import export_csv, load_table, save_table
+
+def test_newer_csv_replaces_the_imported_table(tmp_path):
+    csv_path, path = str(tmp_path / "dados.csv"), str(tmp_path / "dados.parquet")
+    pd.DataFrame({'close': [1.0, 2.0]}).to_csv(csv_path, index=False)
+    assert list(load_table(path)['close']) == [1.0, 2.0]
+    assert os.path.exists(path)
+
+    pd.DataFrame({'close': [3.0]}).to_csv(csv_path, index=False) # CSV substituído depois da importação
+    later = os.path.getmtime(path) + 10
+    os.utime(csv_path, (later, later))
+    assert list(load_table(path)['close']) == [3.0]
+
+    save_table(pd.DataFrame({'close': [4.0]}), path)
+    export_csv(path) # O CSV exportado não é tomado por uma versão mais nova
+    assert os.path.getmtime(csv_path) == os.path.getmtime(path)
+    assert list(load_table(path)['close']) == [4.0]
@@ -0,0 +1,16 @@
+import math
+
+import numpy as np
+
+from backtest_vetorizado import add_predictions, run_backtest, run_backtrader
+
+def test_vectorized_backtest_matches_backtrader(features, model):
+    df = add_predictions(features.copy(), model)
+    result = run_backtest(df)
+    bt_trades, bt_metrics = run_backtrader(df)
+
+    assert len(result['trades']) == len(bt_trades) > 0
+    assert np.allclose(result['trades']['pnlcomm'].to_numpy(), np.array(bt_trades), rtol=1e-9)
+    for name, expected in bt_metrics.items():
+        value = result['metrics'][name]
+        assert (value is None and expected is None) or math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-9), name
@@ -0,0 +1,66 @@
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import mt5_simulado
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xauusd_h1_data.csv")
+mt5_simulado.install(DATA_FILE)
+import coleta_dados # noqa: E402 (só depois do install: usa o terminal simulado)
+from armazenamento import load_table, save_table # noqa: E402
+
+BARS = pd.read_csv(DATA_FILE, parse_dates=['time'])
+
+def update(store_dir, now, server_lag=timedelta(0)):
+    mt5_simulado.set_time(now - server_lag) # O terminal usa o horário do servidor
+    return coleta_dados.update_store('XAUUSD', 'H1', store_dir=str(store_dir), now=now.to_pydatetime())
+
+def test_incremental_update_appends_only_new_closed_bars(tmp_path):
+    first = BARS['time'].iloc[20000] + timedelta(minutes=30)
+    added = update(tmp_path, first)
+    assert added == 20000 # A vela das 20000 ainda está em formação
+
+    later = BARS['time'].iloc[20500] + timedelta(minutes=30)
+    assert update(tmp_path, later) == 500
+    assert update(tmp_path, later) == 0
+
+    stored = coleta_dados.load_store('XAUUSD', 'H1', store_dir=str(tmp_path), policy=False)
+    expected = BARS.iloc[:20500].reset_index(drop=True)
+    pd.testing.assert_series_equal(stored['time'], expected['time'], check_dtype=False)
+    pd.testing.assert_frame_equal(stored[['open', 'high', 'low', 'close']], expected[['open', 'high', 'low', 'close']])
+
+def test_forming_bar_is_not_stored_when_the_server_clock_is_behind(tmp_path):
+    lag = timedelta(hours=3) # Relógio local 3h à frente do servidor
+    assert update(tmp_path, BARS['time'].iloc[20000] + timedelta(minutes=30) + lag, lag) == 20000
+    last = coleta_dados.last_stored_bar('XAUUSD', 'H1', store_dir=str(tmp_path))
+    assert last['time'] == BARS['time'].iloc[19999] # A vela das 20000 ainda estava em formação no servidor
+    assert update(tmp_path, BARS['time'].iloc[20500] + timedelta(minutes=30) + lag, lag) == 500
+
+def test_unconfirmed_overlap_fails_without_writing(tmp_path):
+    update(tmp_path, BARS['time'].iloc[20000] + timedelta(minutes=30))
+    last = coleta_dados.list_partitions('XAUUSD', 'H1', str(tmp_path))[-1]
+    part = load_table(last, policy=False)
+    part.loc[part.index[-1], 'close'] += 1.0 # O terminal "revisou" a última barra armazenada
+    save_table(part, last)
+    before = [os.path.getmtime(p) for p in coleta_dados.list_partitions('XAUUSD', 'H1', str(tmp_path))]
+
+    with pytest.raises(coleta_dados.OverlapError):
+        update(tmp_path, BARS['time'].iloc[20500] + timedelta(minutes=30))
+    after = [os.path.getmtime(p) for p in coleta_dados.list_partitions('XAUUSD', 'H1', str(tmp_path))]
+    assert before == after
+    assert mt5_simulado.call_counts()['copy_rates_range'] >= 2 # Buscou de novo antes de desistir
+
+def test_gaps_ignore_weekends_but_not_intraday_holes():
+    hour = timedelta(hours=1)
+    week = pd.Series(pd.date_range(datetime(2024, 3, 4), datetime(2024, 3, 15, 23), freq='h'))
+    week = week[week.dt.dayofweek < 5].reset_index(drop=True) # Seg-sex, sem o fim de semana
+    assert coleta_dados.find_gaps(week, hour) == []
+
+    hole = week[(week < datetime(2024, 3, 5, 12)) | (week >= datetime(2024, 3, 8, 12))] # 3 dias sem barras
+    assert coleta_dados.find_gaps(hole, hour) == [(pd.Timestamp(2024, 3, 5, 11), pd.Timestamp(2024, 3, 8, 12))]
+    short = week.drop(week.index[10:13]) # 3 velas: até GAP_BARS é aceito
+    assert coleta_dados.find_gaps(short, hour) == []
+    daily = pd.Series(pd.date_range(datetime(2024, 3, 4), periods=10, freq='B'))
+    assert coleta_dados.find_gaps(daily, timedelta(days=1)) == []
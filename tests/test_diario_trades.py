@@ -0,0 +1,46 @@
+import json
+
+import pandas as pd
+import pytest
+
+from armazenamento import save_table
+from diario_trades import TradeJournal
+
+FEATURES = {'rsi': 55.0, 'atr14': 3.2, 'signal': 1}
+
+def make_journal(tmp_path):
+    return TradeJournal(str(tmp_path / "diario_trades.db"))
+
+def test_migration_runs_only_once(tmp_path):
+    open_file, history_file = tmp_path / "trades_abertos.json", str(tmp_path / "historico.parquet")
+    open_file.write_text(json.dumps({'101': FEATURES, '102': FEATURES}))
+    save_table(pd.DataFrame([dict(FEATURES, target=1), dict(FEATURES, target=0)]), history_file)
+
+    journal = make_journal(tmp_path)
+    assert journal.migrate(str(open_file), history_file) == (2, 2)
+    assert journal.migrate(str(open_file), history_file) == (0, 0)
+    journal.close()
+
+    reopened = make_journal(tmp_path) # Outro processo (ex: o robô reiniciado)
+    assert reopened.migrate(str(open_file), history_file) == (0, 0)
+    assert sorted(reopened.open_trades()) == [101, 102]
+    history = reopened.history_frame()
+    assert list(history.index) == [1, 2] and list(history['target']) == [1, 0]
+    reopened.close()
+
+def test_close_trade_and_cursor_roll_back_together(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.add_open_trade(7, FEATURES, symbol="XAUUSD", opened_at="2024-01-09T10:00:02+00:00")
+    journal.set_cursor({'time': 100, 'ticket': 1})
+
+    with pytest.raises(TypeError): # O cursor não é serializável: falha depois do INSERT e do DELETE
+        journal.close_trade(7, target=1, profit=5.0, cursor={'time': object(), 'ticket': 2})
+    assert journal.get_open_trade(7) == FEATURES
+    assert journal.closed_count() == 0
+    assert journal.get_cursor() == {'time': 100, 'ticket': 1}
+
+    assert journal.close_trade(7, target=1, profit=5.0, cursor={'time': 200, 'ticket': 2})
+    assert journal.get_open_trade(7) is None and journal.closed_count() == 1
+    assert journal.get_cursor() == {'time': 200, 'ticket': 2}
+    assert not journal.close_trade(7, target=1) # Já fechado
+    journal.close()
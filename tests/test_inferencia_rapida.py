@@ -0,0 +1,21 @@
+import numpy as np
+
+from inferencia_rapida import FlatForest, is_supported
+from motor_features import MODEL_FEATURES
+from politica_dtypes import model_matrix
+
+def test_flat_forest_matches_sklearn(features, model):
+    X = features.loc[features[MODEL_FEATURES].notna().all(axis=1), MODEL_FEATURES]
+    assert is_supported(model)
+    forest = FlatForest(model)
+
+    expected = model.predict_proba(X)
+    assert np.array_equal(forest.predict_proba(X.to_numpy()), expected)
+    assert np.array_equal(forest.predict(X.to_numpy()), model.predict(X))
+    assert np.array_equal(forest.predict_proba(model_matrix(X)), model.predict_proba(model_matrix(X)))
+
+    vector = forest.new_vector()
+    for i in range(0, len(X), 97): # Caminho de uma amostra do robô
+        prediction, probability = forest.predict_one(forest.fill_vector(vector, X.iloc[i].to_dict()))
+        assert np.array_equal(probability, expected[i])
+        assert prediction == model.classes_[np.argmax(expected[i])]
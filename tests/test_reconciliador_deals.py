@@ -0,0 +1,61 @@
+import pandas as pd
+
+from diario_trades import TradeJournal
+from mt5_simulado import TradeDeal
+from reconciliador_deals import DEAL_ENTRY_OUT, DealReconciler
+
+MAGIC = 123456
+NOW = int(pd.Timestamp('2024-01-09 12:00').timestamp())
+
+class FakeTerminal:
+    """Histórico de deals da conta; 'deals' pode ganhar deals entre uma chamada e outra."""
+
+    def __init__(self):
+        self.deals = []
+
+    def history_deals_get(self, date_from, date_to):
+        start, end = date_from.timestamp(), date_to.timestamp()
+        return [d for d in reversed(self.deals) if start <= d.time <= end] # Fora de ordem, como no MT5
+
+def closing_deal(ticket, position_id, time_, profit=10.0):
+    return TradeDeal(ticket=ticket, order=ticket, time=time_, time_msc=time_ * 1000, type=1,
+                     entry=DEAL_ENTRY_OUT, magic=MAGIC, position_id=position_id, volume=0.01, price=2000.0,
+                     commission=0.0, swap=0.0, profit=profit, fee=0.0, symbol="XAUUSD", comment="")
+
+def make_reconciler(tmp_path, positions):
+    journal = TradeJournal(str(tmp_path / "diario_trades.db"))
+    for position_id in positions:
+        journal.add_open_trade(position_id, {'signal': 1})
+    journal.set_cursor({'time': NOW - 3600, 'ticket': 0})
+    terminal = FakeTerminal()
+    clock = {'now': NOW}
+    reconciler = DealReconciler(terminal, journal, MAGIC, clock=lambda: clock['now'])
+    return reconciler, terminal, journal, clock
+
+def test_deals_with_the_same_time_are_all_processed(tmp_path):
+    reconciler, terminal, journal, clock = make_reconciler(tmp_path, [1, 2, 3])
+    terminal.deals += [closing_deal(11, 1, NOW - 20), closing_deal(12, 2, NOW - 20)]
+    assert reconciler.reconcile() == 2
+    # Mais um deal no mesmo segundo, com ticket maior, registrado depois pelo servidor
+    terminal.deals.append(closing_deal(13, 3, NOW - 20, profit=-5.0))
+    clock['now'] += 30
+    assert reconciler.reconcile() == 1
+    assert journal.open_trades() == {}
+    assert list(journal.history_frame()['target']) == [1, 1, 0]
+    journal.close()
+
+def test_late_deal_inside_the_settle_window_is_not_skipped(tmp_path):
+    reconciler, terminal, journal, clock = make_reconciler(tmp_path, [1, 2])
+    terminal.deals.append(closing_deal(21, 1, NOW - 10))
+    assert reconciler.reconcile() == 1
+    assert reconciler.cursor()[0] <= NOW - reconciler.settle # O cursor não passa do horizonte
+
+    # Deal com horário anterior ao já processado, que só chegou agora
+    terminal.deals.append(closing_deal(22, 2, NOW - 30))
+    clock['now'] += 5
+    assert reconciler.reconcile() == 1
+    assert journal.open_trades() == {}
+    clock['now'] += 120
+    assert reconciler.reconcile() == 0
+    assert reconciler.cursor()[0] == clock['now'] - reconciler.settle
+    journal.close()
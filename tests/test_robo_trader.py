@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+import mt5_simulado
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xauusd_h1_data.csv")
+mt5_simulado.install(DATA_FILE)
+import robo_trader as robo # noqa: E402 (só depois do install: usa o terminal simulado)
+
+def test_warm_up_uses_the_symbol_set_at_run_time(monkeypatch):
+    # O replay troca robo.SYMBOL depois do import; o aquecimento tem que usar o novo símbolo
+    mt5_simulado.load_rates(DATA_FILE, "XAUEUR")
+    mt5_simulado.set_time(pd.Timestamp('2024-01-09 10:00:02'))
+    monkeypatch.setattr(robo, 'SYMBOL', "XAUEUR")
+    requested = []
+    fetch = robo.session.copy_rates_from_pos
+    monkeypatch.setattr(robo.session, 'copy_rates_from_pos',
+                        lambda symbol, *args: requested.append(symbol) or fetch(symbol, *args))
+
+    closed = mt5_simulado.copy_rates_from_pos("XAUEUR", robo.TIMEFRAME, 1, 10)
+    state, new_bars = robo.sync_indicator_state(None, closed)
+    assert requested == ["XAUEUR"] and new_bars == 1
+    assert state.last_time == pd.Timestamp('2024-01-09 09:00')
@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+
+import mt5_simulado
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+mt5_simulado.install(os.path.join(ROOT, "xauusd_h1_data.csv"))
+import robo_trader as robo # noqa: E402 (só depois do install: usa o terminal simulado)
+import runtime_multiativos as runtime # noqa: E402
+from diario_trades import TradeJournal # noqa: E402
+
+HOUR = 3600
+
+class LaggingTerminal:
+    """
+    Relógio do runtime em que o terminal simulado atrasa o primeiro tick de algumas
+    velas: até lá, a vela anterior continua sendo a vela em formação.
+    """
+
+    def __init__(self, now, first_tick):
+        self.now = float(now)
+        self.first_tick = first_tick # abertura da vela -> segundos até o primeiro tick
+        self.sleeps = []
+        self._sync()
+
+    def _sync(self):
+        opened = int(self.now) // HOUR * HOUR
+        late = self.now < opened + self.first_tick.get(opened, 0)
+        mt5_simulado.set_time(opened - 1 if late else self.now)
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        self._sync()
+
+def test_late_bar_is_retried_for_the_instrument(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # estado_ativos/ do runtime
+    journal = TradeJournal(str(tmp_path / robo.JOURNAL_FILE))
+    journal.set_state('migrated_at', 'teste')
+    for module in (robo, runtime, robo.reconciler):
+        monkeypatch.setattr(module, 'journal', journal)
+    evaluated = []
+    def evaluate_signal(last_candle, *args):
+        evaluated.append(pd.Timestamp(int(last_candle['time']), unit='s'))
+        return 0, None, None, None
+    monkeypatch.setattr(robo, 'evaluate_signal', evaluate_signal)
+
+    start = int(pd.Timestamp('2024-01-09 10:00').timestamp())
+    fake = LaggingTerminal(start + 2, first_tick={start + HOUR: 40}) # O tick das 11h só chega 11:00:40
+    config = {'instruments': [dict(runtime.DEFAULTS, symbol='XAUUSD',
+                                   model=os.path.join(ROOT, robo.MODEL_FILE))]}
+    app = runtime.MultiAssetRuntime(config, clock=fake.clock, sleep=fake.sleep, max_workers=1)
+    app.run(max_bars=4)
+    journal.close()
+
+    # Na partida, a vela das 9h; depois cada vela é avaliada sozinha, inclusive a das 10h
+    assert evaluated == list(pd.date_range('2024-01-09 09:00', '2024-01-09 12:00', freq='h'))
+    assert app.scheduler.retries == 2
@@ -1,41 +1,261 @@
 import pandas as pd
+import numpy as np
+from datetime import datetime
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+from sklearn.utils.class_weight import compute_sample_weight
 import joblib
+import argparse
 import os
 
+from armazenamento import load_table, exists
+from matriz_rotulos import label_columns
+from registro_modelos import load_registry, latest, active, register_model
+from diario_trades import TradeJournal
+from politica_dtypes import model_matrix
+import metricas
+
 # --- Arquivos ---
-DATASET_SIMULADO = "dataset_final_para_ia.csv"
-DATASET_REAL = "historico_trades_executados.csv"
+DATASET_SIMULADO = "dataset_final_para_ia.parquet"
+DATASET_REAL = "historico_trades_executados.parquet"  # Formato antigo, usado se não houver diário
+JOURNAL_FILE = "diario_trades.db"                      # Diário de trades do robô (SQLite)
 MODEL_FILE = "modelo_ia_trade.joblib"
+# Matriz de rótulos gerada pelo gerador_de_sinais (uma coluna por horizonte/esquema/lado)
+DATASET_ROTULOS = "dataset_rotulos_ia.parquet"
+
+# Coluna usada como alvo. 'target' é o rótulo padrão (R1/S1 em 24 velas);
+# qualquer coluna 'y_...' da matriz de rótulos também pode ser escolhida.
+TARGET_COLUMN = "target"
+
+# --- Parâmetros do Modelo ---
+MODEL_PARAMS = {'n_estimators': 150, 'random_state': 42, 'class_weight': 'balanced', 'max_depth': 10}
+MODEL_FAMILY = 'random_forest'
+# Famílias de modelo aceitas (o busca_hiperparametros.py escolhe a família e os parâmetros)
+MODEL_FAMILIES = {
+    'random_forest': RandomForestClassifier,
+    'gradient_boosting': HistGradientBoostingClassifier,
+}
+
+# --- Atualização Incremental ---
+MIN_NEW_TRADES = 10           # Trades reais novos necessários para uma atualização incremental
+TREES_PER_UPDATE = 10         # Árvores adicionadas (warm start) a cada atualização
+MAX_INCREMENTAL_TREES = 100   # Acima disso (árvores acumuladas desde o último completo) retreina do zero
+FULL_RETRAIN_DAYS = 30        # Retreino completo agendado
+ACCURACY_DROP = 0.15          # Queda de acurácia nos trades novos que caracteriza drift
+PSI_THRESHOLD = 0.25          # Population Stability Index acima disso = distribuição das features mudou
+PSI_BINS = 10
+
+def build_model(family=MODEL_FAMILY, params=None, n_jobs=-1):
+    """Cria o classificador da família indicada (params=None usa MODEL_PARAMS na família padrão)."""
+    if params is None:
+        params = MODEL_PARAMS if family == MODEL_FAMILY else {}
+    if family == 'random_forest':
+        params = dict(params, n_jobs=n_jobs)
+    return MODEL_FAMILIES[family](**params)
+
+def load_simulated_dataset(target_column=TARGET_COLUMN):
+    """
+    Carrega o dataset simulado com a coluna de alvo escolhida renomeada para 'target'.
+    Para colunas da matriz de rótulos, descarta as linhas inválidas/não resolvidas (-1).
+    """
+    if target_column == "target":
+        return load_table(DATASET_SIMULADO)
+
+    df = load_table(DATASET_ROTULOS)
+    if target_column not in df.columns:
+        raise KeyError(f"Coluna de alvo '{target_column}' não existe em '{DATASET_ROTULOS}'.")
+    y = df[target_column]
+    df = df.drop(columns=label_columns(df) + ['target', 'time'], errors='ignore')
+    df['target'] = y
+    return df[df['target'] >= 0].reset_index(drop=True)
+
+def load_real_dataset():
+    """
+    Histórico de trades reais salvo pelo robô, lido do diário de trades (ou do
+    arquivo antigo, se o diário ainda não existir ou ainda não o importou). None se
+    não existir ou estiver vazio. O índice é o id do trade no diário (no arquivo
+    antigo, a posição a partir de 1). O treino só lê: a migração fica com o robô.
+    """
+    if os.path.exists(JOURNAL_FILE):
+        journal = TradeJournal(JOURNAL_FILE)
+        try:
+            pending = journal.get_state('migrated_at') is None and exists(DATASET_REAL)
+            df_real = None if pending else journal.history_frame()
+        finally:
+            journal.close()
+        if not pending:
+            return df_real if not df_real.empty else None
+        print(f"Aviso: '{JOURNAL_FILE}' ainda não importou '{DATASET_REAL}' (python diario_trades.py --migrar); "
+              f"usando o arquivo antigo.")
+    if not exists(DATASET_REAL):
+        return None
+    try:
+        df_real = load_table(DATASET_REAL)
+    except pd.errors.EmptyDataError:
+        print(f"Aviso: O arquivo de histórico '{DATASET_REAL}' está vazio.")
+        return None
+    df_real.index = pd.RangeIndex(1, len(df_real) + 1, name='id')
+    return df_real if not df_real.empty else None
+
+def last_trade_id(entry, df_real):
+    """
+    Id do último trade real usado pela versão 'entry' do registro. Versões antigas
+    só guardavam a contagem ('trades_used'): o id é o do trade nessa posição.
+    """
+    if 'last_trade_id' in entry:
+        return entry['last_trade_id']
+    used = entry.get('trades_used', 0)
+    return int(df_real.index[used - 1]) if used and df_real is not None and len(df_real) >= used else 0
 
-def train_model():
+# --- Drift ---
+def reference_bins(X, bins=PSI_BINS):
+    """Faixas (quantis) e proporções de cada feature no treino, guardadas no registro para o PSI."""
+    reference = {}
+    for column in X.columns:
+        values = X[column].to_numpy(dtype=float)
+        values = values[~np.isnan(values)]
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1))) if len(values) else np.array([])
+        if len(edges) < 2:
+            continue # Feature constante: não há distribuição a comparar
+        counts = np.histogram(np.clip(values, edges[0], edges[-1]), edges)[0]
+        reference[column] = {'edges': edges.tolist(), 'share': (counts / counts.sum()).tolist()}
+    return reference
+
+def population_stability(reference, X, eps=1e-4):
+    """Maior PSI entre as features de X e a referência do treino, com o nome da feature."""
+    worst, worst_feature = 0.0, None
+    for column, ref in reference.items():
+        if column not in X.columns:
+            continue
+        edges = np.asarray(ref['edges'])
+        values = np.clip(X[column].to_numpy(dtype=float), edges[0], edges[-1])
+        actual = np.histogram(values[~np.isnan(values)], edges)[0]
+        if actual.sum() == 0:
+            continue
+        expected = np.maximum(np.asarray(ref['share']), eps)
+        actual = np.maximum(actual / actual.sum(), eps)
+        psi = float(np.sum((actual - expected) * np.log(actual / expected)))
+        if psi > worst:
+            worst, worst_feature = psi, column
+    return worst, worst_feature
+
+def full_retrain_reasons(registry, model, X_new, y_new):
+    """Motivos para trocar a atualização incremental por um retreino completo (lista vazia = nenhum)."""
+    base = latest(registry, kind='completo')
+    reasons = []
+    if base is None:
+        return ["nenhum modelo completo registrado"]
+    age = (datetime.now() - datetime.fromisoformat(base['created'])).days
+    if age >= FULL_RETRAIN_DAYS:
+        reasons.append(f"último retreino completo há {age} dias")
+    if len(model.estimators_) + TREES_PER_UPDATE - base['n_estimators'] > MAX_INCREMENTAL_TREES:
+        reasons.append(f"mais de {MAX_INCREMENTAL_TREES} árvores incrementais")
+    if base.get('accuracy') is not None:
+        accuracy = accuracy_score(y_new, model.predict(X_new))
+        if base['accuracy'] - accuracy > ACCURACY_DROP:
+            reasons.append(f"acurácia nos trades novos caiu para {accuracy:.2%} (base {base['accuracy']:.2%})")
+    psi, feature = population_stability(base.get('reference', {}), X_new)
+    if psi > PSI_THRESHOLD:
+        reasons.append(f"drift na feature '{feature}' (PSI {psi:.2f})")
+    return reasons
+
+def update_model(target_column=TARGET_COLUMN, check_drift=True):
+    """
+    Atualização incremental: acrescenta ao modelo ativo TREES_PER_UPDATE árvores
+    treinadas só com os trades reais fechados desde a última versão (warm start), de
+    modo que o custo cresce com os dados novos e não com o histórico inteiro.
+    Faz um retreino completo quando não há versão registrada, pelo agendamento
+    (FULL_RETRAIN_DAYS), por excesso de árvores incrementais ou quando detecta drift
+    (queda de acurácia nos trades novos ou PSI das features); check_drift=False
+    desliga essas verificações e força o incremental.
+    """
+    print("--- ATUALIZAÇÃO INCREMENTAL DA IA ---")
+    registry = load_registry()
+    current = active(registry)
+    if current is None:
+        print("Nenhuma versão ativa no registro: executando retreino completo.")
+        return train_model(target_column)
+
+    df_real = load_real_dataset()
+    trades_used = current.get('trades_used', 0)
+    last_id = last_trade_id(current, df_real)
+    if last_id and (df_real is None or df_real.index.max() < last_id):
+        # Os ids recomeçaram (diário recriado ou migrado de novo): não há como saber o que é novo
+        print(f"O diário não tem mais o trade {last_id} usado pela versão {current['version']}: "
+              f"executando retreino completo.")
+        return train_model(target_column)
+    # Trades novos pelo id no diário, não pela posição: linhas apagadas ou reimportadas não deslocam a seleção
+    df_new = df_real[df_real.index > last_id] if df_real is not None else pd.DataFrame()
+    if len(df_new) < MIN_NEW_TRADES:
+        print(f"Apenas {len(df_new)} trade(s) real(is) novo(s) desde a versão {current['version']} "
+              f"(mínimo {MIN_NEW_TRADES}). Modelo mantido.")
+        return
+
+    model = joblib.load(current['file'])
+    if not isinstance(model, RandomForestClassifier):
+        print(f"O modelo ativo ({type(model).__name__}) não aceita novas árvores: executando retreino completo.")
+        return train_model(target_column)
+    features = list(model.feature_names_in_)
+    X_new = model_matrix(df_new.reindex(columns=features, fill_value=0))
+    y_new = df_new['target'].astype(int)
+    print(f"{len(df_new)} trades reais novos desde a versão {current['version']}.")
+
+    reasons = full_retrain_reasons(registry, model, X_new, y_new) if check_drift else []
+    if reasons:
+        print("Retreino completo necessário: " + "; ".join(reasons) + ".")
+        return train_model(target_column)
+
+    if y_new.nunique() < 2:
+        print("Os trades novos têm uma única classe; aguardando mais resultados para atualizar.")
+        return
+
+    # Warm start: as árvores existentes são mantidas e só as novas são treinadas.
+    # O balanceamento entra como peso das amostras (class_weight não combina com warm start)
+    accuracy_before = accuracy_score(y_new, model.predict(X_new))
+    model.set_params(warm_start=True, class_weight=None, n_jobs=-1,
+                     n_estimators=len(model.estimators_) + TREES_PER_UPDATE)
+    with metricas.stage('treino.fit_incremental'):
+        model.fit(X_new, y_new, sample_weight=compute_sample_weight('balanced', y_new))
+    model.feature_names_in_ = features
+
+    entry = register_model(model, {
+        'kind': 'incremental', 'parent': current['version'], 'target_column': target_column,
+        'family': current.get('family', MODEL_FAMILY), 'params': current.get('params'),
+        'samples': current.get('samples', 0) + len(df_new), 'new_samples': len(df_new),
+        'trades_used': trades_used + len(df_new), 'last_trade_id': int(df_new.index.max()),
+        'accuracy_new_before': accuracy_before,
+        'accuracy': current.get('accuracy'),
+    })
+    print(f"Versão {entry['version']} registrada: {entry['n_estimators']} árvores "
+          f"(+{TREES_PER_UPDATE}); acurácia nos trades novos antes da atualização: {accuracy_before:.2%}.")
+
+def train_model(target_column=TARGET_COLUMN, family=None, params=None, info=None):
     """
     Carrega o dataset simulado e o histórico de trades reais, combina-os,
     treina um novo modelo de IA e o salva, substituindo a versão antiga.
+    Sem family/params, mantém a família e os hiperparâmetros da versão ativa
+    (os escolhidos pela última busca); 'info' vai para os metadados da versão.
     """
     print("--- INICIANDO PROCESSO DE RETREINAMENTO DA IA ---")
+    if family is None:
+        current = active(load_registry()) or {}
+        family, params = current.get('family', MODEL_FAMILY), current.get('params')
 
     # --- 1. Carregar Datasets ---
     try:
-        df_simulado = pd.read_csv(DATASET_SIMULADO)
-        print(f"Dataset simulado '{DATASET_SIMULADO}' carregado com {len(df_simulado)} amostras.")
+        with metricas.stage('treino.load'):
+            df_simulado = load_simulated_dataset(target_column)
+        print(f"Dataset simulado carregado com {len(df_simulado)} amostras (alvo: '{target_column}').")
     except FileNotFoundError:
-        print(f"ERRO: Arquivo de simulação '{DATASET_SIMULADO}' não encontrado. Execute os scripts de geração de dados primeiro.")
+        missing = DATASET_SIMULADO if target_column == "target" else DATASET_ROTULOS
+        print(f"ERRO: Arquivo de simulação '{missing}' não encontrado. Execute os scripts de geração de dados primeiro.")
         return
 
-    df_real = None
-    if os.path.exists(DATASET_REAL):
-        try:
-            df_real = pd.read_csv(DATASET_REAL)
-            if not df_real.empty:
-                print(f"Histórico de trades reais '{DATASET_REAL}' carregado com {len(df_real)} amostras.")
-            else:
-                df_real = None # Trata como se não existisse se estiver vazio
-        except pd.errors.EmptyDataError:
-            print(f"Aviso: O arquivo de histórico '{DATASET_REAL}' está vazio.")
-            df_real = None
+    with metricas.stage('treino.load'):
+        df_real = load_real_dataset()
+    if df_real is not None:
+        print(f"Histórico de trades reais carregado com {len(df_real)} amostras.")
     else:
         print("Nenhum histórico de trades reais encontrado. Usando apenas dados simulados.")
 
@@ -60,7 +280,8 @@ def train_model():
     # --- 3. Preparação dos Dados ---
     # Remove colunas que não devem ser usadas como features
     features_to_drop = ['time', 'time_dt', 'target']
-    X = df_combinado.drop(columns=features_to_drop, errors='ignore')
+    # Matriz em float32: as árvores do scikit-learn já convertem X para float32 no fit
+    X = model_matrix(df_combinado.drop(columns=features_to_drop, errors='ignore'))
     y = df_combinado['target']
 
     # Guarda a ordem das colunas para o robô usar
@@ -73,16 +294,18 @@ def train_model():
     print(f"Dados divididos em {len(X_train)} para treino e {len(X_test)} para teste.")
 
     # --- 5. Treinamento do Modelo ---
-    print("\nTreinando o novo modelo RandomForestClassifier...")
-    model = RandomForestClassifier(n_estimators=150, random_state=42, class_weight='balanced', n_jobs=-1, max_depth=10)
-    model.fit(X_train, y_train)
+    model = build_model(family, params)
+    print(f"\nTreinando o novo modelo {type(model).__name__}...")
+    with metricas.stage('treino.fit'):
+        model.fit(X_train, y_train)
     # Adiciona os nomes das features ao modelo, para referência no robô
     model.feature_names_in_ = model_features
     print("Treinamento concluído.")
 
     # --- 6. Avaliação do Modelo ---
     print("\nAvaliando a performance do novo modelo...")
-    y_pred = model.predict(X_test)
+    with metricas.stage('treino.evaluate'):
+        y_pred = model.predict(X_test)
     accuracy = accuracy_score(y_test, y_pred)
     print(f"Acurácia: {accuracy:.2%}")
     print("\nMatriz de Confusão:")
@@ -90,12 +313,29 @@ def train_model():
     print("\nRelatório de Classificação:")
     print(classification_report(y_test, y_pred, target_names=['Loss/BreakEven (0)', 'Win (1)']))
 
-    # --- 7. Salvando o Modelo Treinado ---
+    # --- 7. Salvando o Modelo Treinado (nova versão no registro + modelo ativo) ---
     try:
-        joblib.dump(model, MODEL_FILE)
-        print(f"\nModelo atualizado e salvo com sucesso em: {MODEL_FILE}")
+        with metricas.stage('treino.save'):
+            entry = register_model(model, {
+                **(info or {}),
+                'kind': 'completo', 'target_column': target_column, 'samples': len(df_combinado),
+                'trades_used': len(df_real) if df_real is not None else 0,
+                'last_trade_id': int(df_real.index.max()) if df_real is not None else 0, 'accuracy': accuracy,
+                'family': family, 'params': params, 'reference': reference_bins(X_train),
+            })
+        print(f"\nModelo atualizado e salvo com sucesso em: {MODEL_FILE} (versão {entry['version']})")
     except Exception as e:
         print(f"Ocorreu um erro ao salvar o modelo: {e}")
 
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Treina o modelo de IA do robô trader.")
+    parser.add_argument("--alvo", default=TARGET_COLUMN,
+                        help="Coluna de alvo: 'target' ou uma coluna 'y_...' da matriz de rótulos.")
+    parser.add_argument("--modo", default="completo", choices=["completo", "incremental", "auto"],
+                        help="'completo' retreina do zero; 'incremental' acrescenta árvores com os trades novos; "
+                             "'auto' faz o incremental e retreina do zero por agendamento ou drift.")
+    args = parser.parse_args()
+    if args.modo == "completo":
+        train_model(args.alvo)
+    else:
+        update_model(args.alvo, check_drift=args.modo == "auto")
\ No newline at end of file
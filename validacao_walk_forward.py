@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, precision_score
+
+from armazenamento import load_ohlc_frame, save_table
+from motor_features import MODEL_FEATURES, compute_features, compute_signal
+from gerador_de_sinais import LOOK_FORWARD_BARS, compute_signals, get_trade_outcomes
+from backtest_vetorizado import SIGNAL_ATR_FACTOR, SIGNAL_LEVELS, run_backtest
+from treinamento_ia import MODEL_FAMILY, build_model
+from politica_dtypes import MODEL_MATRIX_DTYPE
+
+# --- Arquivos ---
+INPUT_FILE = "xauusd_h1_data.parquet"
+FOLDS_FILE = "walk_forward_folds.parquet"     # Métricas de cada fold
+EQUITY_FILE = "walk_forward_equity.parquet"   # Curva de patrimônio fora da amostra (folds emendados)
+CACHE_DIR = "cache_walk_forward"              # Matrizes de features de cada fold (.npy)
+
+# --- Parâmetros dos Folds ---
+TRAIN_MONTHS = 24   # Tamanho da janela de treino (modo 'rolling') / treino mínimo (modo 'expanding')
+TEST_MONTHS = 6     # Tamanho de cada janela fora da amostra
+MODE = 'expanding'  # 'expanding' = treino desde o início; 'rolling' = últimos TRAIN_MONTHS meses
+MAX_WORKERS = os.cpu_count() or 1
+
+# --- Preparação ---
+def prepare_frames(df):
+    """
+    Calcula as features uma vez para todo o histórico e retorna:
+    - bars: todas as velas com o sinal da estratégia operada (o mesmo do backtest/robô);
+    - labeled: as velas com sinal do gerador_de_sinais e resultado definido (dataset de treino).
+    """
+    bars = compute_features(df)
+    labeled = compute_signals(bars.copy())
+    labeled['target'] = get_trade_outcomes(labeled)
+    labeled = labeled[labeled['target'].notna()]
+    bars['signal'] = compute_signal(bars, atr_factor=SIGNAL_ATR_FACTOR, levels=SIGNAL_LEVELS)
+    return bars, labeled
+
+def make_folds(times, train_months=TRAIN_MONTHS, test_months=TEST_MONTHS, mode=MODE):
+    """
+    Divide o histórico em janelas de teste consecutivas de test_months meses, a
+    primeira começando train_months meses após o início dos dados. Retorna, para
+    cada fold, os índices (em velas) do início do treino e do início/fim do teste.
+    """
+    times = pd.DatetimeIndex(times)
+    folds = []
+    test_start = times[0] + pd.DateOffset(months=train_months)
+    while test_start < times[-1]:
+        test_end = test_start + pd.DateOffset(months=test_months)
+        train_start = times[0] if mode == 'expanding' else test_start - pd.DateOffset(months=train_months)
+        folds.append({
+            'fold': len(folds),
+            'train_start': int(times.searchsorted(train_start)),
+            'test_start': int(times.searchsorted(test_start)),
+            'test_end': int(times.searchsorted(test_end)),
+        })
+        test_start = test_end
+    return folds
+
+def _cache_key(bars, params):
+    """Hash dos preços e da configuração: muda quando os dados ou os folds mudam."""
+    digest = hashlib.sha1(bars[['open', 'high', 'low', 'close']].to_numpy().tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+def cache_fold_matrices(bars, labeled, folds, cache_dir):
+    """
+    Grava em cache_dir as matrizes de cada fold (treino, avaliação e candidatos fora
+    da amostra) como .npy, que os processos abrem com memory-map. Folds já gravados
+    (mesmo hash de dados e configuração) são reaproveitados.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    position = bars.index.get_indexer(labeled.index) # Vela de cada amostra rotulada
+    X_all = labeled[MODEL_FEATURES].to_numpy(dtype=MODEL_MATRIX_DTYPE)
+    y_all = labeled['target'].to_numpy(dtype=np.int64)
+    candidates = np.flatnonzero(bars['signal'].to_numpy() != 0)
+    X_candidates = bars[MODEL_FEATURES].to_numpy(dtype=MODEL_MATRIX_DTYPE)
+
+    specs = []
+    for fold in folds:
+        paths = {name: os.path.join(cache_dir, f"fold{fold['fold']}_{name}.npy")
+                 for name in ('X_train', 'y_train', 'X_eval', 'y_eval', 'X_test', 'test_rows')}
+        if not all(os.path.exists(p) for p in paths.values()):
+            # Purga: só entram no treino rótulos resolvidos antes do início do teste
+            train = (position >= fold['train_start']) & (position + LOOK_FORWARD_BARS < fold['test_start'])
+            evaluation = (position >= fold['test_start']) & (position < fold['test_end'])
+            rows = candidates[(candidates >= fold['test_start']) & (candidates < fold['test_end'])]
+            rows = rows[~np.isnan(X_candidates[rows]).any(axis=1)]
+            arrays = {'X_train': X_all[train], 'y_train': y_all[train],
+                      'X_eval': X_all[evaluation], 'y_eval': y_all[evaluation],
+                      'X_test': X_candidates[rows], 'test_rows': rows}
+            for name, array in arrays.items():
+                np.save(paths[name], array)
+        specs.append(dict(fold, paths=paths))
+    return specs
+
+def prepare_folds(train_months=TRAIN_MONTHS, test_months=TEST_MONTHS, mode=MODE, cache_dir=CACHE_DIR):
+    """
+    Lê o histórico, calcula as features e grava (ou reaproveita) as matrizes dos
+    folds. Retorna as velas e a especificação de cada fold ([] se o histórico for curto).
+    """
+    print(f"Lendo dados de {INPUT_FILE} e calculando features...")
+    bars, labeled = prepare_frames(load_ohlc_frame(INPUT_FILE, columns=['time', 'open', 'high', 'low', 'close']))
+    folds = make_folds(bars['time'], train_months, test_months, mode)
+    if not folds:
+        return bars, []
+
+    params = {'train_months': train_months, 'test_months': test_months, 'mode': mode,
+              'look_forward': LOOK_FORWARD_BARS, 'features': MODEL_FEATURES,
+              'signal': [SIGNAL_ATR_FACTOR, list(SIGNAL_LEVELS)], 'dtype': np.dtype(MODEL_MATRIX_DTYPE).name}
+    fold_dir = os.path.join(cache_dir, _cache_key(bars, params))
+    specs = cache_fold_matrices(bars, labeled, folds, fold_dir)
+    print(f"{len(specs)} folds ({mode}, teste de {test_months} meses); matrizes em {fold_dir}.")
+    return bars, specs
+
+# --- Worker ---
+def train_fold(spec):
+    """
+    Treina o modelo do fold e prevê os sinais fora da amostra (roda em um processo do
+    pool). spec['family'] e spec['params'] escolhem o modelo (padrão: o do treinamento_ia).
+    """
+    start = time.perf_counter()
+    arrays = {name: np.load(path, mmap_mode='r') for name, path in spec['paths'].items()}
+    result = {'fold': spec['fold'], 'n_train': len(arrays['y_train']), 'n_eval': len(arrays['y_eval']),
+              'accuracy': np.nan, 'precision': np.nan}
+
+    if len(np.unique(arrays['y_train'])) < 2:
+        # Sem as duas classes no treino não há modelo: nenhum sinal é aprovado
+        result['predictions'] = np.zeros(len(arrays['test_rows']), dtype=np.int64)
+    else:
+        model = build_model(spec.get('family', MODEL_FAMILY), spec.get('params'), n_jobs=1)
+        model.fit(pd.DataFrame(arrays['X_train'], columns=MODEL_FEATURES), arrays['y_train'])
+        if len(arrays['y_eval']):
+            y_pred = model.predict(pd.DataFrame(arrays['X_eval'], columns=MODEL_FEATURES))
+            result['accuracy'] = accuracy_score(arrays['y_eval'], y_pred)
+            result['precision'] = precision_score(arrays['y_eval'], y_pred, zero_division=0)
+        result['predictions'] = (model.predict(pd.DataFrame(arrays['X_test'], columns=MODEL_FEATURES))
+                                 if len(arrays['test_rows']) else np.zeros(0, dtype=np.int64))
+    result['test_rows'] = np.asarray(arrays['test_rows'])
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+# --- Walk-Forward ---
+def run_walk_forward(train_months=TRAIN_MONTHS, test_months=TEST_MONTHS, mode=MODE,
+                     max_workers=MAX_WORKERS, cache_dir=CACHE_DIR):
+    """
+    Validação walk-forward: para cada janela de teste, treina o modelo só com o
+    passado, prevê os sinais da janela e faz o backtest fora da amostra. Os folds
+    rodam em paralelo. Salva a tabela de métricas por fold e a curva de patrimônio
+    emendada (um único backtest sobre todas as janelas de teste, com as previsões
+    de cada fold).
+    """
+    bars, specs = prepare_folds(train_months, test_months, mode, cache_dir)
+    if not specs:
+        print("Histórico curto demais para a configuração de folds escolhida.")
+        return None, None
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(train_fold, specs))
+    print(f"Treino dos folds concluído em {time.perf_counter() - start:.1f}s com {max_workers} processo(s).")
+
+    # --- Backtest fora da amostra ---
+    prediction = np.zeros(len(bars), dtype=np.int64)
+    rows = []
+    for spec, result in zip(specs, results):
+        prediction[result['test_rows']] = result['predictions']
+        window = bars.iloc[spec['test_start']:spec['test_end']].assign(
+            prediction=prediction[spec['test_start']:spec['test_end']])
+        metrics = run_backtest(window)['metrics'] if len(window) > 1 else {}
+        rows.append({
+            'fold': spec['fold'],
+            'train_start': bars['time'].iloc[spec['train_start']],
+            'test_start': bars['time'].iloc[spec['test_start']],
+            'test_end': bars['time'].iloc[min(spec['test_end'], len(bars)) - 1],
+            'n_train': result['n_train'], 'n_eval': result['n_eval'],
+            'accuracy': result['accuracy'], 'precision': result['precision'],
+            'signals': len(result['test_rows']), 'approved': int(np.sum(result['predictions'] == 1)),
+            **{name: np.nan if metrics.get(name) is None else metrics[name] for name in
+               ('total_return', 'sharpe', 'max_drawdown', 'total_trades', 'profit_factor', 'expectancy')},
+            'seconds': result['seconds'],
+        })
+    fold_table = pd.DataFrame(rows)
+
+    oos = bars.iloc[specs[0]['test_start']:].assign(prediction=prediction[specs[0]['test_start']:])
+    stitched = run_backtest(oos)
+    equity = stitched['equity'].rename_axis('time').reset_index()
+
+    save_table(fold_table, FOLDS_FILE)
+    save_table(equity, EQUITY_FILE)
+    return fold_table, stitched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validação walk-forward do modelo de IA.")
+    parser.add_argument("--modo", default=MODE, choices=['expanding', 'rolling'], help="Tipo de janela de treino.")
+    parser.add_argument("--treino", type=int, default=TRAIN_MONTHS, help="Meses de treino (mínimo no modo expanding).")
+    parser.add_argument("--teste", type=int, default=TEST_MONTHS, help="Meses de cada janela de teste.")
+    parser.add_argument("--processos", type=int, default=MAX_WORKERS, help="Número de processos.")
+    args = parser.parse_args()
+
+    fold_table, stitched = run_walk_forward(args.treino, args.teste, args.modo, args.processos)
+    if fold_table is not None:
+        print("\n--- Métricas por Fold (fora da amostra) ---")
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(fold_table.drop(columns=['seconds']).to_string(index=False))
+        metrics = stitched['metrics']
+        print("\n--- Curva Emendada (todos os folds) ---")
+        print(f"Retorno Total: {metrics['total_return'] * 100:.2f}% | Sharpe: {metrics['sharpe']} | "
+              f"Drawdown Máximo: {metrics['max_drawdown']:.2f}% | Trades: {metrics['total_trades']}")
+        print(f"Métricas salvas em {FOLDS_FILE} e curva de patrimônio em {EQUITY_FILE}.")